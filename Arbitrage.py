@@ -0,0 +1,263 @@
+"""
+Cross-region arbitrage: items whose sell orders in one place are cheaper than buy orders somewhere else.
+
+The order books of all regions are held as columns, sell orders sorted by (type, price) and buy orders by
+(type, -price).  For each type the cheapest sells are matched against the highest buys by walking both sides' depth
+together, so a trade can combine many orders, and it stops where the margin drops below the minimum.  The matched
+fills are summed per (type, source, destination) and scored by profit per m^3 and per jump.
+"""
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+import numpy as np
+
+from AssetValuation import VolumeTable
+from DataTypes import ArbitrageOpportunity
+
+_Orders = namedtuple('_Orders', 'type_id price volume location_id system_id')
+
+
+def _order_columns(orders: List[dict]) -> tuple:
+    n = len(orders)
+    return (np.fromiter((o['type_id'] for o in orders), dtype=np.int64, count=n),
+            np.fromiter((o['is_buy_order'] for o in orders), dtype=bool, count=n),
+            np.fromiter((o['price'] for o in orders), dtype=np.float64, count=n),
+            np.fromiter((o['volume_remain'] for o in orders), dtype=np.int64, count=n),
+            np.fromiter((o['location_id'] for o in orders), dtype=np.int64, count=n),
+            np.fromiter((o['system_id'] for o in orders), dtype=np.int64, count=n))
+
+
+class OrderBook:
+    """ market orders of any number of regions as sorted columns, split into sell and buy sides """
+
+    def __init__(self, type_id: np.ndarray, is_buy: np.ndarray, price: np.ndarray, volume: np.ndarray,
+                 location_id: np.ndarray, system_id: np.ndarray):
+        columns = (type_id, price, volume, location_id, system_id)
+        sells = ~is_buy
+        order = np.lexsort((price[sells], type_id[sells]))
+        self.sell = _Orders(*(c[sells][order] for c in columns))
+        order = np.lexsort((-price[is_buy], type_id[is_buy]))
+        self.buy = _Orders(*(c[is_buy][order] for c in columns))
+
+    def __len__(self):
+        return len(self.sell.type_id) + len(self.buy.type_id)
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[List[dict]]) -> 'OrderBook':
+        """ from pages of ESI market order records, each page is turned into columns as it arrives """
+        columns = [_order_columns(page) for page in pages]
+        if not columns:
+            columns = [_order_columns([])]
+        return cls(*(np.concatenate(c) for c in zip(*columns)))
+
+    @classmethod
+    def load(cls, api, region_ids: Iterable[int], max_workers=4) -> 'OrderBook':
+        """ the order books of the regions, the regions are downloaded concurrently (and their pages too) """
+        def region_pages(region_id):
+            print("getting market orders for region {}".format(region_id))
+            return [_order_columns(page) for page in api.iter_pages('/markets/{}/orders/', region_id)]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            columns = [c for pages in executor.map(region_pages, region_ids) for c in pages]
+        return cls(*(np.concatenate(c) for c in zip(*(columns or [_order_columns([])]))))
+
+
+def _local_cumulative(codes: np.ndarray, volumes: np.ndarray, group_count: int):
+    """ (cumulative volume over all rows, volume before each group, total volume per group) for rows sorted by
+        group.  cumulative - before[code] is the running volume within the row's group """
+    cumulative = np.cumsum(volumes)
+    totals = np.bincount(codes, weights=volumes, minlength=group_count).astype(np.int64)
+    before = np.cumsum(totals) - totals
+    return cumulative, before, totals
+
+
+def match_orders(book: OrderBook, min_margin=0.05, sales_tax=0.02) -> dict:
+    """ fills of the profitable matches between sell and buy orders of the same type, as columns: type_id, quantity,
+        sell (index into book.sell), buy (index into book.buy), cost and revenue (after sales_tax).  A fill is
+        profitable when revenue is at least (1 + min_margin) times cost """
+    sell, buy = book.sell, book.buy
+    sell_types, sell_starts = np.unique(sell.type_id, return_index=True)
+    buy_types, buy_starts = np.unique(buy.type_id, return_index=True)
+    types, si, bi = np.intersect1d(sell_types, buy_types, assume_unique=True, return_indices=True)
+    best_sell = sell.price[sell_starts[si]]
+    best_buy = buy.price[buy_starts[bi]] * (1 - sales_tax)
+    crossing = best_buy >= best_sell * (1 + min_margin)
+    types, best_sell, best_buy = types[crossing], best_sell[crossing], best_buy[crossing]
+    group_count = len(types)
+
+    # only orders that can take part in a profitable fill: sells below the best buy, buys above the best sell
+    def candidates(orders: _Orders, keep):
+        code = np.clip(np.searchsorted(types, orders.type_id), 0, max(group_count - 1, 0))
+        in_types = (types[code] == orders.type_id) if group_count else np.zeros(len(code), dtype=bool)
+        rows = np.flatnonzero(in_types)
+        rows = rows[keep(orders.price[rows], code[rows])]
+        return rows, code[rows]
+
+    sell_rows, sell_code = candidates(sell, lambda p, g: p * (1 + min_margin) <= best_buy[g])
+    buy_rows, buy_code = candidates(buy, lambda p, g: p * (1 - sales_tax) >= best_sell[g] * (1 + min_margin))
+    sell_cum, sell_before, sell_total = _local_cumulative(sell_code, sell.volume[sell_rows], group_count)
+    buy_cum, buy_before, buy_total = _local_cumulative(buy_code, buy.volume[buy_rows], group_count)
+    limit = np.minimum(sell_total, buy_total)
+
+    # walk both sides' depth at once: the breakpoints are where either side's running volume reaches the end of an
+    # order, each segment between breakpoints is filled from one sell order and one buy order
+    group = np.concatenate((sell_code, buy_code))
+    position = np.concatenate((sell_cum - sell_before[sell_code], buy_cum - buy_before[buy_code]))
+    position = np.minimum(position, limit[group])
+    order = np.lexsort((position, group))
+    group, position = group[order], position[order]
+    distinct = np.ones(len(group), dtype=bool)
+    distinct[1:] = (group[1:] != group[:-1]) | (position[1:] != position[:-1])
+    group, position = group[distinct], position[distinct]
+    previous = np.zeros(len(position), dtype=np.int64)
+    if len(position):
+        previous[1:] = np.where(group[1:] == group[:-1], position[:-1], 0)
+    quantity = position - previous
+    filled = quantity > 0
+    group, position, quantity = group[filled], position[filled], quantity[filled]
+    s = np.searchsorted(sell_cum, sell_before[group] + position)
+    b = np.searchsorted(buy_cum, buy_before[group] + position)
+    sell_price = sell.price[sell_rows[s]]
+    buy_price = buy.price[buy_rows[b]] * (1 - sales_tax)
+    profitable = buy_price >= sell_price * (1 + min_margin)  # prices only get worse further into the depth
+    return {'type_id': types[group][profitable],
+            'quantity': quantity[profitable],
+            'sell': sell_rows[s][profitable],
+            'buy': buy_rows[b][profitable],
+            'cost': (sell_price * quantity)[profitable],
+            'revenue': (buy_price * quantity)[profitable]}
+
+
+def jump_distances(allowed_jumps: Dict[int, FrozenSet[int]], start: int) -> Dict[int, int]:
+    """ jumps from start to every reachable system """
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        system = queue.popleft()
+        for n in allowed_jumps.get(system, ()):
+            if n not in distances:
+                distances[n] = distances[system] + 1
+                queue.append(n)
+    return distances
+
+
+class ArbitrageFinder:
+    """
+    Finds trades in an OrderBook.  volume_table gives the m^3 per unit and allowed_jumps (from
+    StaticDataAccessor.get_system_jumps) the route lengths
+    """
+
+    def __init__(self, book: OrderBook, volume_table: VolumeTable, allowed_jumps: Dict[int, FrozenSet[int]],
+                 min_margin=0.05, sales_tax=0.02):
+        self.book = book
+        self.volume_table = volume_table
+        self.allowed_jumps = allowed_jumps
+        self.min_margin = min_margin
+        self.sales_tax = sales_tax
+        self.distance_maps = {}  # type: Dict[int, Dict[int, int]]
+
+    def jumps(self, from_system: int, to_system: int) -> Optional[int]:
+        if from_system not in self.distance_maps:
+            self.distance_maps[from_system] = jump_distances(self.allowed_jumps, from_system)
+        return self.distance_maps[from_system].get(to_system)
+
+    def find(self, max_results=100, min_profit=1e6, max_volume=None,
+             destination_station_id: int = None) -> List[ArbitrageOpportunity]:
+        """ the best trades by profit per jump.  Fills are combined per type, source and destination station.
+            max_volume skips trades that need more cargo space, destination_station_id limits the trades to those
+            selling at that station (e.g. the hub a hauler returns to) """
+        fills = match_orders(self.book, self.min_margin, self.sales_tax)
+        sell, buy = self.book.sell, self.book.buy
+        keys = np.stack((fills['type_id'], sell.location_id[fills['sell']], buy.location_id[fills['buy']]), axis=1)
+        if destination_station_id is not None:
+            to_destination = keys[:, 2] == destination_station_id
+            keys = keys[to_destination]
+            fills = {k: v[to_destination] for k, v in fills.items()}
+        if len(keys) == 0:
+            return []
+        trades, first, codes = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        codes = codes.reshape(-1)
+
+        def total(column):
+            return np.bincount(codes, weights=column, minlength=len(trades))
+
+        quantity = total(fills['quantity']).astype(np.int64)
+        cost = total(fills['cost'])
+        revenue = total(fills['revenue'])
+        profit = revenue - cost
+        volume = self.volume_table.get_volumes(trades[:, 0]) * quantity
+        source_system = sell.system_id[fills['sell'][first]]
+        destination_system = buy.system_id[fills['buy'][first]]
+
+        candidates = profit >= min_profit
+        if max_volume is not None:
+            candidates &= volume <= max_volume
+        # routes are only computed for the most profitable trades, at most a few per result
+        shortlist = np.flatnonzero(candidates)
+        shortlist = shortlist[np.argsort(-profit[shortlist], kind='stable')][:max_results * 5]
+        result = []
+        for i in shortlist.tolist():
+            jumps = self.jumps(int(source_system[i]), int(destination_system[i]))
+            if jumps is None:
+                continue
+            result.append(ArbitrageOpportunity(int(trades[i, 0]), int(quantity[i]), int(trades[i, 1]),
+                                               int(source_system[i]), int(trades[i, 2]), int(destination_system[i]),
+                                               float(cost[i]), float(revenue[i]), float(profit[i]), float(volume[i]),
+                                               jumps))
+        result.sort(key=profit_per_jump, reverse=True)
+        return result[:max_results]
+
+
+def profit_per_jump(o: ArbitrageOpportunity) -> float:
+    return o.profit / max(o.jumps, 1)
+
+
+def profit_per_m3(o: ArbitrageOpportunity) -> float:
+    return o.profit / o.volume if o.volume > 0 else float('inf')
+
+
+def station_info_for_route(opportunities: Iterable[ArbitrageOpportunity], hub_station_id: int):
+    """ Sweeper2 pickup points for the trades that sell at the hub: the profit and volume to collect at each source
+        station, so the sweeper plans the round trip that picks up the most profit per jump """
+    from Sweeper2 import StationInfo
+    by_station = {}
+    for o in opportunities:
+        if o.destination_location_id != hub_station_id or o.source_location_id == hub_station_id:
+            continue
+        system_id, value, volume = by_station.get(o.source_location_id, (o.source_system_id, 0.0, 0.0))
+        by_station[o.source_location_id] = (system_id, value + o.profit, volume + o.volume)
+    return [StationInfo(system_id, station_id, value, volume)
+            for station_id, (system_id, value, volume) in by_station.items()]
+
+
+if __name__ == '__main__':
+    from operator import attrgetter
+
+    import Context
+    from ESI_Api import ESI_Api
+    from Sweeper2 import Sweeper2, get_solution_path
+
+    sda = Context.static_data()
+    jumps = sda.get_system_jumps()
+    api = ESI_Api('Tansy Dabs'); volume = 9500
+    Dodoxie_IX_Moon_20_id = 60011866
+    Dodoxie_id = 30002659
+
+    regions = [api.get_region_id(x) for x in ('Sinq Laison', 'Essence', 'Verge Vendor', 'Placid')]
+    book = OrderBook.load(api, regions)
+    finder = ArbitrageFinder(book, sda.get_volume_table(), jumps)
+    opportunities = finder.find(max_results=200, max_volume=volume, destination_station_id=Dodoxie_IX_Moon_20_id)
+    for o in opportunities[:20]:
+        print("{:>14,.0f} profit {:>12,.0f}/jump {:>12,.0f}/m^3  {:>8,d} x {} from {}".format(
+            o.profit, profit_per_jump(o), profit_per_m3(o), o.quantity, api.get_type_data(o.type_id).type_name,
+            sda.get_station_name(o.source_location_id)))
+
+    sweeper = Sweeper2(jumps, station_info_for_route(opportunities, Dodoxie_IX_Moon_20_id), Dodoxie_IX_Moon_20_id,
+                       Dodoxie_id, volume, 60)
+    sweeper.get_plan_v2()
+    best = max(sweeper.best_by_jump_count.values(), key=attrgetter('value_per_jump'), default=None)
+    if best is not None:
+        print("{} jumps, {} stations, profit={:,.0f},  profitPerJump={:,.1f}".format(
+            len(best.shortest_path), len(best.station_list), best.total_value, best.value_per_jump))
+        print('\n'.join(get_solution_path(best, sda)))
@@ -0,0 +1,296 @@
+"""
+Long-running report mode.  The token manager, caches, static data and price tables stay loaded, each character's ESI
+data is refetched when the Expires of its last response passes, and a report (with its history row) is written only
+when the assets, wallet, orders or prices actually changed.
+
+A local HTTP interface triggers reports and plans on demand:
+    GET /status                       last values of each character and when each input is next checked
+    GET /report/<character>          check now, writes the report only if something changed (?force=1 always writes)
+    GET /plan/<character>?station_id=&system_id=&volume=&seconds=    a Sweeper2 pickup plan back to the station
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import Context
+from AssetReporter import write_report, write_account_summary, make_apis
+from DataTypes import AssetValues
+from ESI_Api import ESI_Api, get_expiration
+from RegionalPrices import RegionalPrices, PRICING_MODES, pricing_region_id
+from ReportWriter import ReportOptions
+from TokenManager import TokenRefresher
+
+# endpoints whose responses make up a report, by the name used in the schedule
+WATCHED_ENDPOINTS = (('assets', '/characters/{}/assets/'),
+                     ('wallet', '/characters/{}/wallet/'),
+                     ('orders', '/characters/{}/orders/'))
+
+WatchKey = Tuple[Optional[str], str]  # (character_name, endpoint), character_name is None for the prices
+
+
+class AssetDaemon:
+    """
+    Schedules a check of each (character, endpoint) for when its response expires.  A check refetches the endpoint
+    (the response cache revalidates it by ETag) and compares a digest of the body with the previous one, the report is
+    regenerated only if a digest changed.  The report reads the watched responses from the response cache, and its
+    orders from ESI rather than the XML api so that the orders it values are the ones watched.  The price table is watched the same way and a price change regenerates
+    every character's report.  report and account_summary are the functions that write the reports, account_summary
+    may be None
+    """
+
+    def __init__(self, apis: List[ESI_Api], sda=None, options: ReportOptions = None, pricing_mode='global',
+                 pricing_region='The Forge', min_interval=timedelta(seconds=30), report=write_report,
+                 account_summary=write_account_summary):
+        self.apis = {api.character_name: api for api in apis}
+        self.sda = sda or Context.static_data()
+        self.options = options
+        self.pricing_mode = pricing_mode
+        self.pricing_region = pricing_region
+        self.region_id = pricing_region_id(next(iter(self.apis.values())), pricing_region)
+        self.min_interval = min_interval
+        self.report = report
+        self.account_summary = account_summary
+        self.fingerprints = {}  # type: Dict[WatchKey, str]
+        self.next_check = {}  # type: Dict[WatchKey, datetime]
+        self.values = {}  # type: Dict[str, AssetValues]
+        self.reported = {}  # type: Dict[str, datetime]
+        self.report_count = 0
+        self.server = None  # type: Optional[ThreadingHTTPServer]
+        self._stale = set(self.apis)  # characters whose report is out of date
+        self._heap = []  # (due, sequence, key)
+        self._sequence = count()
+        self._condition = threading.Condition()
+        self._character_locks = {name: threading.Lock() for name in self.apis}
+        self._prices_lock = threading.Lock()
+        self._stopping = False
+        self._thread = None  # type: Optional[threading.Thread]
+        self._token_refresher = None  # type: Optional[TokenRefresher]
+        self._jumps = None
+
+    def start(self, port: int = None, host='127.0.0.1'):
+        """ write the first reports, then keep them current in a background thread.  With a port (0 picks a free one)
+            the HTTP interface is served as well """
+        self._stopping = False
+        self._token_refresher = TokenRefresher(next(iter(self.apis.values())).token_manager)
+        self._token_refresher.start()
+        try:
+            self.check_prices()
+        except Exception as e:
+            print("price check failed: {!r}".format(e))
+            self._retry((None, 'prices'))
+        with ThreadPoolExecutor(max_workers=len(self.apis) or 1) as executor:
+            futures = [(name, executor.submit(self.check, name)) for name in self.apis]
+        for name, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print("report for {} failed: {!r}".format(name, e))
+                for endpoint, _ in WATCHED_ENDPOINTS:
+                    self._retry((name, endpoint))
+        self._thread = threading.Thread(target=self._run, name='AssetDaemon', daemon=True)
+        self._thread.start()
+        if port is not None:
+            self.server = ThreadingHTTPServer((host, port), _DaemonHandler)
+            self.server.asset_daemon = self
+            threading.Thread(target=self.server.serve_forever, name='AssetDaemonHttp', daemon=True).start()
+            print("asset daemon listening on http://{}:{}".format(host, self.server.server_address[1]))
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._token_refresher is not None:
+            self._token_refresher.stop()
+            self._token_refresher = None
+        next(iter(self.apis.values())).cache_manager.flush()
+
+    def check(self, character_name: str, endpoints: List[str] = None, force=False) -> bool:
+        """ refetch the character's endpoints (all by default) and write the report if they, or the prices, changed
+            since the last report.  Returns True if a report was written """
+        api = self.apis[character_name]
+        with self._character_locks[character_name]:
+            for endpoint in [e for e, _ in WATCHED_ENDPOINTS] if endpoints is None else endpoints:
+                if self._refetch(api, endpoint):
+                    self._stale.add(character_name)
+            if not force and character_name not in self._stale:
+                return False
+            self._stale.discard(character_name)
+            try:
+                self.values[character_name] = self.report(character_name, api, self.sda, False, self.pricing_mode,
+                                                          self.pricing_region, self.options, esi_orders=True)
+            except Exception:
+                self._stale.add(character_name)
+                raise
+            self.reported[character_name] = datetime.now()
+            with self._condition:
+                self.report_count += 1
+        if self.account_summary is not None:
+            self.account_summary(dict(self.values))
+        return True
+
+    def check_prices(self) -> bool:
+        """ refetch the price table, if the prices changed every report is out of date.  Returns True if they changed.
+            Reports running meanwhile keep the table they started with, a new table replaces the file they map
+            instead of overwriting it """
+        with self._prices_lock:
+            api = next(iter(self.apis.values()))
+            mode = 'global' if self.pricing_mode == 'history' else self.pricing_mode  # history follows the same expiry
+            price_table = RegionalPrices(api).get_price_table(mode, self.region_id)
+            changed = self._update((None, 'prices'), price_table.digest(), price_table.expiration)
+        if changed:
+            self._stale.update(self.apis)
+        return changed
+
+    def _refetch(self, api: ESI_Api, endpoint: str) -> bool:
+        """ digest all pages of the endpoint, schedule its next check for when the first page expires """
+        path = dict(WATCHED_ENDPOINTS)[endpoint]
+        digest = hashlib.sha1()
+        first = api.call_response(path, api.character_id)
+        digest.update(first.content)
+        expiration = get_expiration(first.headers, self.min_interval)
+        for page in range(2, int(first.headers.get('X-Pages', 1)) + 1):
+            digest.update(api.call_response(path, api.character_id, page=page).content)
+        return self._update((api.character_name, endpoint), digest.hexdigest(), expiration)
+
+    def _update(self, key: WatchKey, fingerprint: str, expiration: datetime) -> bool:
+        changed = self.fingerprints.get(key) != fingerprint
+        self.fingerprints[key] = fingerprint
+        if expiration <= datetime.now():
+            self._retry(key)
+        else:
+            with self._condition:
+                self.next_check[key] = expiration
+                heapq.heappush(self._heap, (expiration, next(self._sequence), key))
+                self._condition.notify_all()
+        return changed
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping and (not self._heap or self._heap[0][0] > datetime.now()):
+                    timeout = (self._heap[0][0] - datetime.now()).total_seconds() if self._heap else None
+                    self._condition.wait(timeout)
+                if self._stopping:
+                    return
+                due, _, key = heapq.heappop(self._heap)
+                if self.next_check.get(key) != due:
+                    continue  # rescheduled since, e.g. by an on demand check
+            character_name, endpoint = key
+            try:
+                if character_name is None:
+                    if self.check_prices():
+                        for name in list(self.apis):
+                            self.check(name, endpoints=[])
+                else:
+                    self.check(character_name, [endpoint])
+            except Exception as e:
+                print("check of {} failed: {!r}".format(key, e))
+                self._retry(key)
+
+    def _retry(self, key: WatchKey):
+        with self._condition:
+            due = datetime.now() + self.min_interval
+            self.next_check[key] = due
+            heapq.heappush(self._heap, (due, next(self._sequence), key))
+            self._condition.notify_all()
+
+    def status(self) -> dict:
+        with self._condition:
+            next_check = dict(self.next_check)
+        result = {'reports': self.report_count,
+                  'prices_next_check': next_check.get((None, 'prices')),
+                  'characters': {}}
+        for name in self.apis:
+            values = self.values.get(name)
+            result['characters'][name] = {
+                'reported': self.reported.get(name),
+                'values': values._asdict() if values else None,
+                'next_check': {endpoint: next_check.get((name, endpoint)) for endpoint, _ in WATCHED_ENDPOINTS}}
+        return result
+
+    def plan(self, character_name: str, station_id: int, system_id: int, volume: float, seconds: int) -> List[dict]:
+        """ the best Sweeper2 pickup plan for each jump count, as the station and system ids along the path """
+        from Sweeper2 import Sweeper2, _get_station_info
+        if self._jumps is None:
+            self._jumps = self.sda.get_system_jumps()
+        station_info = _get_station_info(self.apis[character_name], self.sda, self.pricing_mode, self.pricing_region)
+        sweeper = Sweeper2(self._jumps, station_info, station_id, system_id, volume, seconds)
+        sweeper.get_plan_v2()
+        return [{'jumps': jump_count, 'path': s.shortest_path, 'stations': [x.station_id for x in s.station_list],
+                 'total_value': s.total_value, 'total_volume': s.total_volume, 'value_per_jump': s.value_per_jump}
+                for jump_count, s in sorted(sweeper.best_by_jump_count.items())]
+
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [unquote(p) for p in url.path.strip('/').split('/')]
+        daemon = self.server.asset_daemon  # type: AssetDaemon
+        try:
+            if parts == ['status']:
+                self._reply(200, daemon.status())
+            elif len(parts) == 2 and parts[0] in ('report', 'plan') and parts[1] not in daemon.apis:
+                self._reply(404, {'error': 'unknown character {}'.format(parts[1])})
+            elif len(parts) == 2 and parts[0] == 'report':
+                written = daemon.check(parts[1], force=query.get('force') == '1')
+                values = daemon.values.get(parts[1])
+                self._reply(200, {'written': written, 'values': values._asdict() if values else None})
+            elif len(parts) == 2 and parts[0] == 'plan':
+                self._reply(200, daemon.plan(parts[1], int(query['station_id']), int(query['system_id']),
+                                             float(query.get('volume', 10000)), int(query.get('seconds', 10))))
+            else:
+                self._reply(404, {'error': 'not found'})
+        except (KeyError, ValueError) as e:
+            self._reply(400, {'error': repr(e)})
+        except Exception as e:
+            self._reply(500, {'error': repr(e)})
+
+    def _reply(self, status: int, body):
+        payload = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='keep the asset reports current and serve them on a local port')
+    parser.add_argument('characters', nargs='*', default=['Tabash Masso', 'Tansy Dabs', 'Brand Wessa'])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pricing-mode', choices=PRICING_MODES, default='global')
+    parser.add_argument('--pricing-region', default='The Forge')
+    args = parser.parse_args()
+
+    try:
+        daemon = AssetDaemon(make_apis(args.characters), options=ReportOptions(formats=('txt', 'html')),
+                             pricing_mode=args.pricing_mode, pricing_region=args.pricing_region)
+    except ValueError as e:
+        parser.error(str(e))
+    daemon.start(port=args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
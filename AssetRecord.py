@@ -0,0 +1,81 @@
+"""
+Compact record for one asset or open order, used through the report and the sweeper instead of the ESI dicts.  A dict
+costs a hash table per asset and grows as names and totals are added; a record is a fixed set of slots, and the
+strings many records share (location type and flag, type and location names) are interned.
+"""
+import sys
+from typing import Optional
+
+from DataTypes import MarketOrderData
+
+
+class AssetRecord:
+    """
+    The ESI asset fields, then the fields filled in while locating and valuing the asset.  Item access works like the
+    asset dicts did (a['type_name'], a.get('quantity'), 'station_id' in a), a field that is None counts as missing
+    """
+    __slots__ = ('item_id', 'type_id', 'quantity', 'location_id', 'location_type', 'location_flag', 'is_singleton',
+                 'type_name', 'category_id', 'group_id', 'location_name', 'station_id', 'total_value', 'total_volume')
+
+    def __init__(self, item_id: int, type_id: int, quantity: int, location_id: int, location_type: str,
+                 location_flag: str, is_singleton: bool):
+        self.item_id = item_id
+        self.type_id = type_id
+        self.quantity = quantity
+        self.location_id = location_id
+        self.location_type = _intern(location_type)
+        self.location_flag = _intern(location_flag)
+        self.is_singleton = is_singleton
+        self.type_name = None  # type: Optional[str]
+        self.category_id = None  # type: Optional[int]
+        self.group_id = None  # type: Optional[int]
+        self.location_name = None  # type: Optional[str]
+        self.station_id = None  # type: Optional[int]
+        self.total_value = 0.0
+        self.total_volume = 0.0
+
+    @classmethod
+    def from_json(cls, a: dict) -> 'AssetRecord':
+        """ record of an /characters/{id}/assets/ entry """
+        return cls(a['item_id'], a['type_id'], a.get('quantity'), a['location_id'], a['location_type'],
+                   a.get('location_flag'), a['is_singleton'])
+
+    @classmethod
+    def from_order(cls, o: MarketOrderData) -> 'AssetRecord':
+        """ record of the items left in an open order: the order_id as item_id, vol_remaining as quantity and the
+            order's station as location """
+        record = cls(o.order_id, o.type_id, o.vol_remaining, o.station_id, 'station', None, False)
+        record.type_name = o.type_name
+        record.location_name = _intern(o.station_name)
+        record.station_id = o.station_id
+        return record
+
+    def set_names(self, type_name: str, location_name: str):
+        self.type_name = _intern(type_name)
+        self.location_name = _intern(location_name)
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value):
+        try:
+            setattr(self, key, value)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __contains__(self, key: str) -> bool:
+        return getattr(self, key, None) is not None
+
+    def get(self, key: str, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def __repr__(self):
+        return 'AssetRecord({})'.format(', '.join('{}={!r}'.format(k, getattr(self, k)) for k in self.__slots__))
+
+
+def _intern(s: Optional[str]) -> Optional[str]:
+    return None if s is None else sys.intern(s)
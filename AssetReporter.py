@@ -1,127 +1,228 @@
+import argparse
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
 from operator import itemgetter
 from pprint import pprint
+from typing import Dict, List
+
+from requests.adapters import HTTPAdapter
 
 import Config
+import Context
+import RunProfile
+from AssetRecord import AssetRecord
+from AssetSnapshot import AssetSnapshot, AssetDiff, SnapshotStore
+from AssetValuation import ValuationEngine, group_sums, set_totals
+from DataTypes import AssetValues
 from MoneyChart import MoneyChart
+from RegionalPrices import RegionalPrices, pricing_region_id
+from ReportWriter import ReportWriter, ReportOptions
 from StaticDataAccessor import StaticDataAccessor
-from TokenManager import TokenData  # required for unpickling tokens
+from TokenManager import TokenData, TokenRefresher  # TokenData is required for unpickling tokens
 from ESI_Api import ESI_Api
 
 
-def write_report(character_name):
-    api = ESI_Api(character_name)
-    sda = StaticDataAccessor()
-
-    asset_list = api.assets()
-    assets_by_id = {a['item_id']: a for a in asset_list}
-
-    station_assets = defaultdict(list)    # items in stations, stored by location_name
-    ship_assets = defaultdict(list)       # items in ships, by ship's item id
-
-    for a in asset_list:
-        if a['is_singleton'] and a['category_id']==6:  # ships contain separate listing
-            ship_assets[a['item_id']].append(a)
-        elif a['location_type'] == 'station':
-            location = a['location_name']
-            station_assets[location].append(a)
-        else:
-            location_dict = assets_by_id[a['location_id']]
-            if location_dict['category_id']==6:
-                ship_assets[location_dict['item_id']].append(a)
-            else:  # add to station instead
-                station_assets[location_dict['location_name']].append(a)
-        quantity = max(1, a.get('quantity', 0))
-        value_of_a = api.get_market_price(a['type_id']) * quantity
-        a['total_value'] = value_of_a
-        volume_of_a = sda.get_type_volume(a['type_id']) * quantity
-        a['total_volume'] = volume_of_a
-
-    station_values = {loc: sum(i['total_value'] for i in items) for (loc, items) in station_assets.items()}
-    ship_values = {loc: sum(i['total_value'] for i in items) for (loc, items) in ship_assets.items()}
-
-    station_volume = {loc: sum(i['total_volume'] for i in items) for (loc, items) in station_assets.items()}
-
-    orders_by_location = defaultdict(list)
-    order_value_by_location = defaultdict(float)
-    market_orders = api.market_orders()
-    for o in (o for o in market_orders if o.order_type == 'sell' and o.vol_remaining > 0):
-        location = o.station_name
-        o_as_dict = o._asdict()  # convert to dict to match assets and to add a field
-        orders_by_location[location].append(o_as_dict)
-        vol_remaining = max(1, o.vol_remaining)
-        value_of = api.get_market_price(o.type_id) * vol_remaining
-        o_as_dict['total_value'] = value_of
-        order_value_by_location[location] += value_of
-        volume_of = sda.get_type_volume(o.type_id) * vol_remaining
-        o_as_dict['total_volume'] = volume_of
-
-    escrow_total = sum(o.escrow for o in market_orders)
-
-    combined_value_by_location = defaultdict(float)
-    combined_value_by_location.update(station_values)
-    for loc, value in order_value_by_location.items():
-        combined_value_by_location[loc] += value
-
-    station_value_total = sum(station_values.values())
-    orders_value_total = sum(order_value_by_location.values())
-    ship_value_total = sum(ship_values.values())
-    grand_total = escrow_total + station_value_total + orders_value_total + ship_value_total
+def write_report(character_name, api: ESI_Api = None, sda: StaticDataAccessor = None, print_stats=True,
+                 pricing_mode='global', pricing_region='The Forge', options: ReportOptions = None,
+                 esi_orders=False) -> AssetValues:
+    """ writes the asset report for one character and records its historical values, which are also returned.
+        pricing_mode is one of RegionalPrices.PRICING_MODES, the regional modes use prices in pricing_region.
+        options selects the report formats, top-N items per location or summary only.  esi_orders reads the open
+        orders from ESI instead of the XML api """
+    api = api or ESI_Api(character_name)
+    sda = sda or Context.static_data()
+    region_id = pricing_region_id(api, pricing_region)
+
+    asset_list, tree = api.assets_and_tree()
+    market_orders = api.esi_market_orders() if esi_orders else api.market_orders()
+    price_table = RegionalPrices(api).get_price_table(
+        pricing_mode, region_id,
+        {a.type_id for a in asset_list} | {o.type_id for o in market_orders})
+    with RunProfile.phase('valuation'):
+        engine = ValuationEngine(price_table, sda.get_volume_table())
+
+        station_assets = defaultdict(list)    # items in stations, stored by location_name
+        ship_assets = defaultdict(list)       # items in ships, by the ship's position in asset_list
+        station_keys = []  # location_name of each asset, None for assets in ships
+        ship_keys = []     # ship of each asset, None for assets in stations
+        location_labels = []  # station, or ship@station, of each asset
+
+        for i, a in enumerate(asset_list):
+            station, ship = None, None
+            if a.is_singleton and a.category_id==6:  # ships contain separate listing
+                ship = i
+            elif tree.ship[i] >= 0:  # in a ship, directly or in a container
+                ship = int(tree.ship[i])
+            else:  # in a station, or in containers in a station
+                station = tree.root_asset(i).location_name
+            if station is None:
+                ship_assets[ship].append(a)
+            else:
+                station_assets[station].append(a)
+            station_keys.append(station)
+            ship_keys.append(ship)
+            location_labels.append(station if station is not None else
+                                   '{}@{}'.format(asset_list[ship].type_name, asset_list[ship].location_name))
+
+        # value against the previous run's snapshot, only items that are new or changed need pricing
+        snapshots = SnapshotStore(Config.dataDir / 'Snapshots')
+        snapshot = AssetSnapshot.from_assets(asset_list, location_labels, price_table.digest())
+        previous = snapshots.latest(api.character_id)
+        diff = AssetDiff(previous, snapshot) if previous is not None else None
+        snapshot.revalue(engine, previous, diff)
+        values, volumes = snapshot.value, snapshot.volume
+        set_totals(asset_list, values, volumes)
+        snapshots.put(api.character_id, snapshot)
+        station_values = group_sums(station_keys, values)
+        ship_values = group_sums(ship_keys, values)
+        station_volume = group_sums(station_keys, volumes)
+
+        orders_by_location = defaultdict(list)
+        sell_orders = [o for o in market_orders if o.order_type == 'sell' and o.vol_remaining > 0]
+        order_locations = [o.station_name for o in sell_orders]
+        order_records = [AssetRecord.from_order(o) for o in sell_orders]  # valued and reported like the assets
+        order_values, _ = engine.value_items(order_records)
+        for location, record in zip(order_locations, order_records):
+            orders_by_location[location].append(record)
+        order_value_by_location = defaultdict(float, group_sums(order_locations, order_values))
+
+        escrow_total = sum(o.escrow for o in market_orders)
+
+        combined_value_by_location = defaultdict(float)
+        combined_value_by_location.update(station_values)
+        for loc, value in order_value_by_location.items():
+            combined_value_by_location[loc] += value
+
+        station_value_total = sum(station_values.values())
+        orders_value_total = sum(order_value_by_location.values())
+        ship_value_total = sum(ship_values.values())
+        grand_total = escrow_total + station_value_total + orders_value_total + ship_value_total
     wallet_balance = api.wallet_balance()
     api.put_historical_values(station_value_total, orders_value_total, escrow_total, ship_value_total, wallet_balance)
 
 
-    report_filename = Config.dataDir / 'Reports' / 'assets-{}-{:%Y-%m-%d-%H-%M}.txt'.format(character_name, datetime.now())
+    report_filename = Config.dataDir / 'Reports' / 'assets-{}-{:%Y-%m-%d-%H-%M}'.format(character_name, datetime.now())
     print("report filename = {}".format(report_filename))
 
-    with report_filename.open('w') as f:
-        # output in reverse value order
-        f.write("Asset Report for {}\n".format(character_name))
-        f.write('  Asset value       = {:>16,.0f} isk\n'.format(station_value_total))
-        f.write('  Open Orders value = {:>16,.0f} isk\n'.format(orders_value_total))
-        f.write('  Escrow value      = {:>16,.0f} isk\n'.format(escrow_total))
-        f.write('  Ships value       = {:>16,.0f} isk\n'.format(ship_value_total))
-        f.write('  Total value       = {:>16,.0f} isk\n'.format(grand_total))
-        f.write('\n')
-        f.write('  Wallet balance    = {:>16,.0f} isk\n'.format(wallet_balance))
-        f.write('  Net Worth         = {:>16,.0f} isk\n'.format(wallet_balance + grand_total))
-        f.write('\n')
-        for (location, value) in sorted(combined_value_by_location.items(), key=itemgetter(1), reverse=True):
-            f.write('{}\n'.format(location))
-            f.write('  Asset value       = {:>13,.0f}\n'.format(station_values.get(location, 0.0)))
-            f.write('  Open Orders value = {:>13,.0f}\n'.format(order_value_by_location[location]))
-            f.write('  Total value       = {:>13,.0f}\n'.format(combined_value_by_location[location]))
-            f.write('  Total volume      = {:>13,.0f} m^2\n'.format(station_volume.get(location, 0.0)))
-            if len(station_assets[location]) > 0:
-                f.write('     Asset Items:\n')
-                f.write('\n'.join(
-                    ["{:>13,.0f} [{:10,.1f} m^2] {:>8,d} x {}".format(a.get('total_value'), a.get('total_volume'), a.get('quantity',-1), a['type_name'])
-                      for a in sorted(station_assets[location], key=itemgetter('total_value'), reverse=True)]))
-            if len(orders_by_location[location]) > 0:
-                f.write('\n     Open Order Items:\n')
-                f.write('\n'.join(
-                    ["{:>13,.0f} [{:10,.1f} m^2]  {:>8,d} x {}".format(a.get('total_value'), a.get('total_volume'), a.get('vol_remaining',-1), a['type_name'])
-                      for a in sorted(orders_by_location[location], key=itemgetter('total_value'), reverse=True)]))
-            f.write('\n\n')
-        f.write('Ships\n\n')
-        for (ship_id, value) in sorted(ship_values.items(), key=itemgetter(1), reverse=True):
-            f.write('{}@{}\n'.format(assets_by_id[ship_id]['type_name'],assets_by_id[ship_id]['location_name']))
-            f.write('  Ship value        = {:>13,.0f}\n'.format(value))
-            f.write('     Items:\n')
-            f.write('\n'.join(
-                    ["{:>13,.0f}  {:>8,d} x {}".format(a.get('total_value'), a.get('quantity',-1), a['type_name'])
-                      for a in sorted(ship_assets[ship_id], key=itemgetter('total_value'), reverse=True)]))
-            f.write('\n\n')
-        f.flush()
-
-if __name__ == '__main__':
-    write_report('Tabash Masso')
-    write_report('Tansy Dabs')
-    write_report('Brand Wessa')
+    with RunProfile.phase('output'):
+        with ReportWriter(report_filename, options or ReportOptions()) as report:
+            report.summary(character_name,
+                           [('Asset value', station_value_total),
+                            ('Open Orders value', orders_value_total),
+                            ('Escrow value', escrow_total),
+                            ('Ships value', ship_value_total),
+                            ('Total value', grand_total)],
+                           [('Wallet balance', wallet_balance),
+                            ('Net Worth', wallet_balance + grand_total)])
+            if diff is not None:
+                report.changes(diff, lambda type_id: api.get_type_data(type_id).type_name)
+            # output in reverse value order
+            for (location, value) in sorted(combined_value_by_location.items(), key=itemgetter(1), reverse=True):
+                report.location(location,
+                                [('Asset value', station_values.get(location, 0.0)),
+                                 ('Open Orders value', order_value_by_location[location]),
+                                 ('Total value', value),
+                                 ('Total volume', station_volume.get(location, 0.0))],
+                                station_assets[location], orders_by_location[location])
+            for (ship, value) in sorted(ship_values.items(), key=itemgetter(1), reverse=True):
+                report.ship('{}@{}'.format(asset_list[ship].type_name, asset_list[ship].location_name), value,
+                            ship_assets[ship])
+    if print_stats:
+        _print_stats(api)
+    return AssetValues(datetime.now(), api.character_id, station_value_total, orders_value_total, ship_value_total,
+                       wallet_balance, escrow_total)
+
+
+def write_reports(character_names: List[str], max_workers=None, pricing_mode='global',
+                  pricing_region='The Forge', options: ReportOptions = None, apis: List[ESI_Api] = None,
+                  sda: StaticDataAccessor = None) -> Dict[str, AssetValues]:
+    """ reports for several characters at once.  The reports share the token and cache managers, static data, request
+        scheduler, connection pool and price table, so the run takes about as long as the slowest character.
+        A character whose report fails is left out of the account summary written afterwards.  apis defaults to
+        make_apis(character_names) and sda to the shared static data """
+    apis = make_apis(character_names) if apis is None else apis
+    sda = sda or Context.static_data()
+    if not apis:
+        return {}
+    cache_manager = apis[0].cache_manager
+    region_id = pricing_region_id(apis[0], pricing_region)
+    # tokens are refreshed in the background, requests then never wait on the SSO server
+    with TokenRefresher(apis[0].token_manager):
+        # fetch once up front instead of in every report, history prices depend on the types held so are left to them
+        if pricing_mode != 'history':
+            RegionalPrices(apis[0]).get_price_table(pricing_mode, region_id)
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(apis)) as executor:
+            futures = [(api.character_name, executor.submit(write_report, api.character_name, api, sda, False,
+                                                            pricing_mode, pricing_region, options))
+                       for api in apis]
+    values_by_character = {}
+    for character_name, future in futures:
+        try:
+            values_by_character[character_name] = future.result()
+        except Exception as e:
+            print("report for {} failed: {!r}".format(character_name, e))
+
+    write_account_summary(values_by_character)
+    _print_stats(apis[0])
+    cache_manager.flush()
+    return values_by_character
+
+
+def make_apis(character_names: List[str]) -> List[ESI_Api]:
+    """ apis for the characters sharing the Context managers, static data, request scheduler and connection pool """
+    token_manager = Context.token_manager()
+    cache_manager = Context.cache_manager()
+    sda = Context.static_data()
+    scheduler = Context.scheduler()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=scheduler.max_concurrency)
+
+    apis = []
+    for character_name in character_names:
+        api = ESI_Api(character_name, token_manager=token_manager, cache_manager=cache_manager, static_data=sda,
+                      scheduler=scheduler)
+        for session in (api.session, api.xml_session):
+            session.mount('https://', adapter)
+        apis.append(api)
+    return apis
+
+
+def write_account_summary(values_by_character: Dict[str, AssetValues]):
+    """ one line per character and the account totals """
+    summary_filename = Config.dataDir / 'Reports' / 'account-summary-{:%Y-%m-%d-%H-%M}.txt'.format(datetime.now())
+    print("summary filename = {}".format(summary_filename))
+    summary_filename.parent.mkdir(parents=True, exist_ok=True)
+    line_format = '{:<24} {:>16,.0f} {:>16,.0f} {:>16,.0f} {:>16,.0f} {:>16,.0f} {:>16,.0f}\n'
+    totals = [0.0] * 6
+    with summary_filename.open('w') as f:
+        f.write('{:<24} {:>16} {:>16} {:>16} {:>16} {:>16} {:>16}\n'.format(
+            'Character', 'Assets', 'Open Orders', 'Escrow', 'Ships', 'Wallet', 'Net Worth'))
+        for character_name, v in sorted(values_by_character.items()):
+            row = [v.station_value, v.orders_value, v.escrow_value, v.ship_value, v.wallet_balance]
+            row.append(sum(row))
+            totals = [t + x for t, x in zip(totals, row)]
+            f.write(line_format.format(character_name, *row))
+        f.write(line_format.format('Account total', *totals))
+
+
+def _print_stats(api: ESI_Api):
+    print(api.cache_manager.negative_cache_report())
+    print("Response cache: {}".format(dict(api.cache_manager.response_stats)))
+    print(api.scheduler.metrics_report())
 
-    mc = MoneyChart()
 
-    mc.generate_chart('Brand Wessa')
-    mc.generate_chart('Tansy Dabs')
-    mc.generate_chart('Tabash Masso')
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='asset reports for the characters')
+    RunProfile.RunProfile.add_argument(parser)
+    args = parser.parse_args()
+
+    profile = RunProfile.RunProfile.from_args('AssetReporter', args)
+    with profile or nullcontext():
+        write_reports(['Tabash Masso', 'Tansy Dabs', 'Brand Wessa'],
+                      options=ReportOptions(formats=('txt', 'html'), open_browser=True))
+    if profile is not None:
+        profile.save(Config.dataDir / 'Reports')
+
+    MoneyChart().write_charts(['Brand Wessa', 'Tansy Dabs', 'Tabash Masso'])
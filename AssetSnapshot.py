@@ -0,0 +1,141 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from AssetValuation import ValuationEngine, group_sums
+
+
+class AssetSnapshot:
+    """
+    One run's asset list as columns: item_id, type_id, quantity, location_id, the report location label, and the
+    value and volume of each item.  Saved as a compressed npz file.  price_digest is the PriceTable.digest of the
+    table the values came from, values can be reused by a later run that prices with the same table (the same
+    expiration is not enough, tables of different pricing modes and regions expire together)
+    """
+    __columns = ('item_id', 'type_id', 'quantity', 'location_id', 'location', 'value', 'volume')
+
+    def __init__(self, taken: datetime, price_digest: str, item_id: np.ndarray, type_id: np.ndarray,
+                 quantity: np.ndarray, location_id: np.ndarray, location: np.ndarray,
+                 value: np.ndarray = None, volume: np.ndarray = None):
+        self.taken = taken
+        self.price_digest = price_digest
+        self.item_id = item_id
+        self.type_id = type_id
+        self.quantity = quantity
+        self.location_id = location_id
+        self.location = location
+        self.value = value
+        self.volume = volume
+
+    def __len__(self):
+        return len(self.item_id)
+
+    @classmethod
+    def from_assets(cls, assets: Sequence[dict], locations: Sequence[str], price_digest: str,
+                    taken: datetime = None) -> 'AssetSnapshot':
+        """ unvalued snapshot of assets, locations is the report location label of each asset """
+        n = len(assets)
+        return cls(taken or datetime.now(), price_digest,
+                   np.fromiter((a['item_id'] for a in assets), dtype=np.int64, count=n),
+                   np.fromiter((a['type_id'] for a in assets), dtype=np.int64, count=n),
+                   np.fromiter((a.get('quantity') or 0 for a in assets), dtype=np.int64, count=n),
+                   np.fromiter((a['location_id'] for a in assets), dtype=np.int64, count=n),
+                   np.array(locations, dtype=str) if n else np.zeros(0, dtype='<U1'))
+
+    def revalue(self, engine: ValuationEngine, previous: Optional['AssetSnapshot'] = None,
+                diff: 'AssetDiff' = None):
+        """ sets value and volume.  When previous was priced with the same price table, items whose type and quantity
+            did not change keep their previous value and only the rest are valued """
+        if previous is None or diff is None or previous.price_digest != self.price_digest:
+            self.value, self.volume = engine.value(self.type_id, self.quantity)
+            return
+        self.value = np.zeros(len(self))
+        self.volume = np.zeros(len(self))
+        same = diff.matched >= 0
+        same[same] = ((self.quantity[same] == previous.quantity[diff.matched[same]]) &
+                      (self.type_id[same] == previous.type_id[diff.matched[same]]))
+        self.value[same] = previous.value[diff.matched[same]]
+        self.volume[same] = previous.volume[diff.matched[same]]
+        changed = ~same
+        self.value[changed], self.volume[changed] = engine.value(self.type_id[changed], self.quantity[changed])
+
+    def location_totals(self) -> Dict[str, float]:
+        return group_sums(self.location.tolist(), self.value)
+
+    def save(self, filename: Path):
+        np.savez_compressed(str(filename), taken=np.float64(self.taken.timestamp()),
+                            price_digest=np.str_(self.price_digest),
+                            **{c: getattr(self, c) for c in AssetSnapshot.__columns})
+
+    @classmethod
+    def load(cls, filename: Path) -> Optional['AssetSnapshot']:
+        """ None if the file is missing or unreadable.  Snapshots saved without a price digest are never reused """
+        try:
+            with np.load(str(filename), allow_pickle=False) as data:
+                return cls(datetime.fromtimestamp(float(data['taken'])),
+                           str(data['price_digest']) if 'price_digest' in data.files else '',
+                           *(data[c] for c in AssetSnapshot.__columns))
+        except (OSError, KeyError, ValueError) as e:
+            print("unable to load asset snapshot {}: {}".format(filename, e))
+            return None
+
+
+class AssetDiff:
+    """
+    Changes between two snapshots, matched on item_id.  matched holds for each current item the index of the same
+    item in the previous snapshot, -1 for added items.  The other fields are index arrays into current (added,
+    quantity_changed, moved) or previous (removed)
+    """
+
+    def __init__(self, previous: AssetSnapshot, current: AssetSnapshot):
+        self.previous = previous
+        self.current = current
+        # hash join on item_id
+        previous_index = {item_id: i for i, item_id in enumerate(previous.item_id.tolist())}
+        self.matched = np.fromiter((previous_index.get(item_id, -1) for item_id in current.item_id.tolist()),
+                                   dtype=np.int64, count=len(current))
+        found = self.matched >= 0
+        self.added = np.flatnonzero(~found)
+        kept = np.zeros(len(previous), dtype=bool)
+        kept[self.matched[found]] = True
+        self.removed = np.flatnonzero(~kept)
+        matched_rows = np.flatnonzero(found)
+        previous_rows = self.matched[matched_rows]
+        self.quantity_changed = matched_rows[current.quantity[matched_rows] != previous.quantity[previous_rows]]
+        self.moved = matched_rows[current.location_id[matched_rows] != previous.location_id[previous_rows]]
+
+    def __bool__(self):
+        return bool(len(self.added) or len(self.removed) or len(self.quantity_changed) or len(self.moved))
+
+    def location_changes(self) -> List[Tuple[str, float, float]]:
+        """ (location, previous total, current total) for the locations whose value changed, largest change first.
+            Both snapshots must be valued """
+        before = self.previous.location_totals()
+        after = self.current.location_totals()
+        changes = [(loc, before.get(loc, 0.0), after.get(loc, 0.0)) for loc in set(before) | set(after)]
+        changes = [c for c in changes if abs(c[2] - c[1]) >= 0.5]
+        return sorted(changes, key=lambda c: abs(c[2] - c[1]), reverse=True)
+
+
+class SnapshotStore:
+    """ snapshots by character, as directory/<character_id>/assets-<time>.npz.  The newest keep files are kept """
+
+    def __init__(self, directory: Path, keep=60):
+        self.directory = directory
+        self.keep = keep
+
+    def _files(self, character_id: int) -> List[Path]:
+        return sorted((self.directory / str(character_id)).glob('assets-*.npz'))
+
+    def latest(self, character_id: int) -> Optional[AssetSnapshot]:
+        files = self._files(character_id)
+        return AssetSnapshot.load(files[-1]) if files else None
+
+    def put(self, character_id: int, snapshot: AssetSnapshot):
+        character_dir = self.directory / str(character_id)
+        character_dir.mkdir(parents=True, exist_ok=True)
+        snapshot.save(character_dir / 'assets-{:%Y%m%d-%H%M%S}.npz'.format(snapshot.taken))
+        for old in self._files(character_id)[:-self.keep]:
+            old.unlink()
@@ -0,0 +1,76 @@
+import codecs
+import json
+import sys
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from AssetRecord import AssetRecord
+
+# string fields with only a handful of distinct values, interned so every asset shares one copy
+INTERNED_FIELDS = frozenset(['location_type', 'location_flag'])
+
+
+def _interning_object_hook(pairs: List[Tuple[str, object]]) -> dict:
+    # keys are interned too, json.loads shares keys within one call but each raw_decode call is separate
+    return {sys.intern(k): sys.intern(v) if k in INTERNED_FIELDS and isinstance(v, str) else v for k, v in pairs}
+
+
+_decoder = json.JSONDecoder(object_pairs_hook=_interning_object_hook)
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[object]:
+    """
+    Incrementally parse a JSON array from a stream of utf-8 byte chunks, yielding each element as soon as it is
+    complete.  Only one element and the unparsed tail of the input are held in memory at a time.
+    """
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    started = False
+    chunks = iter(chunks)
+    at_end = False
+    while True:
+        # skip whitespace and separators
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError("expected a JSON array, found {!r}".format(buffer[pos:pos + 20]))
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                value, end = _decoder.raw_decode(buffer, pos)
+                # a value that reaches the end of the buffer (e.g. a number) may continue in the next chunk
+                if end < len(buffer) or at_end:
+                    yield value
+                    pos = end
+                    continue
+            except json.JSONDecodeError:
+                if at_end:
+                    raise
+        if at_end:
+            raise ValueError("unexpected end of JSON array")
+        chunk = next(chunks, None)
+        if chunk is None:
+            at_end = True
+            buffer = buffer[pos:] + text_decoder.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+
+
+def index_assets(records: Iterable[Union[dict, AssetRecord]]) -> Tuple[List[AssetRecord], Dict[int, AssetRecord]]:
+    """ single pass over the asset records: returns the assets as AssetRecords and the index of containers
+        (singletons) by item_id, which is all that is needed to resolve item locations """
+    asset_list = []
+    containers = {}
+    for a in records:
+        if not isinstance(a, AssetRecord):
+            a = AssetRecord.from_json(a)
+        asset_list.append(a)
+        if a.is_singleton:
+            containers[a.item_id] = a
+    return asset_list, containers
@@ -0,0 +1,87 @@
+from typing import Dict, Hashable, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from PriceTable import PriceTable
+
+
+class VolumeTable:
+    """
+    Volume per unit by type as listed in invTypes.volume (the assembled volume, ships are not reduced to their packaged
+    size), stored as sorted parallel arrays (type_id, volume) for vectorised lookups
+    """
+
+    def __init__(self, type_ids: np.ndarray, volumes: np.ndarray):
+        self.type_ids = type_ids
+        self.volumes = volumes
+
+    def __len__(self):
+        return len(self.type_ids)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, float]]) -> 'VolumeTable':
+        """ from (type_id, volume) rows in any order, a missing volume counts as 0 """
+        rows = sorted(rows)
+        type_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        volumes = np.fromiter((r[1] or 0.0 for r in rows), dtype=np.float64, count=len(rows))
+        return cls(type_ids, volumes)
+
+    def get_volumes(self, type_ids) -> np.ndarray:
+        """ volumes aligned with type_ids, 0.0 for types not in the table """
+        return _lookup(self.type_ids, self.volumes, type_ids)
+
+
+def _lookup(keys: np.ndarray, values: np.ndarray, wanted) -> np.ndarray:
+    wanted = np.asarray(wanted, dtype=np.int64)
+    if len(keys) == 0:
+        return np.zeros(wanted.shape, dtype=np.float64)
+    idx = np.searchsorted(keys, wanted)
+    np.clip(idx, 0, len(keys) - 1, out=idx)
+    return np.where(keys[idx] == wanted, values[idx], 0.0)
+
+
+class ValuationEngine:
+    """
+    Values item lists as columns: prices and volumes are joined on type_id against the price and volume tables, and
+    totals per location or ship are grouped reductions over those columns
+    """
+
+    def __init__(self, price_table: PriceTable, volume_table: VolumeTable):
+        self.price_table = price_table
+        self.volume_table = volume_table
+
+    def value(self, type_ids, quantities) -> Tuple[np.ndarray, np.ndarray]:
+        """ (total value, total volume) per item, quantities below 1 count as 1 """
+        type_ids = np.asarray(type_ids, dtype=np.int64)
+        quantities = np.maximum(np.asarray(quantities, dtype=np.int64), 1)
+        return (self.price_table.get_prices(type_ids) * quantities,
+                self.volume_table.get_volumes(type_ids) * quantities)
+
+    def value_items(self, items: Sequence[dict], quantity_field='quantity') -> Tuple[np.ndarray, np.ndarray]:
+        """ values a list of AssetRecords (or asset dicts), also setting their total_value and total_volume fields """
+        type_ids = np.fromiter((i['type_id'] for i in items), dtype=np.int64, count=len(items))
+        quantities = np.fromiter((i.get(quantity_field) or 0 for i in items), dtype=np.int64, count=len(items))
+        values, volumes = self.value(type_ids, quantities)
+        set_totals(items, values, volumes)
+        return values, volumes
+
+
+def set_totals(items: Sequence[dict], values: np.ndarray, volumes: np.ndarray):
+    """ copy the value and volume columns into the total_value and total_volume fields of the items """
+    for item, value, volume in zip(items, values.tolist(), volumes.tolist()):
+        item['total_value'] = value
+        item['total_volume'] = volume
+
+
+def factorize(keys: Iterable[Hashable]) -> Tuple[np.ndarray, List[Hashable]]:
+    """ (code per key, distinct keys in order of first appearance) """
+    codes_by_key = {}
+    codes = [codes_by_key.setdefault(k, len(codes_by_key)) for k in keys]
+    return np.array(codes, dtype=np.int64), list(codes_by_key)
+
+
+def group_sums(keys: Sequence[Hashable], values: np.ndarray) -> Dict[Hashable, float]:
+    """ sum of values per distinct key, items with a None key are left out """
+    codes, labels = factorize(keys)
+    sums = np.bincount(codes, weights=values, minlength=len(labels)) if len(codes) else np.zeros(0)
+    return {label: float(total) for label, total in zip(labels, sums.tolist()) if label is not None}
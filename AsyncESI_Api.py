@@ -0,0 +1,125 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, AsyncIterator, Tuple, Optional
+
+from requests.adapters import HTTPAdapter
+
+from AssetRecord import AssetRecord
+from DataTypes import StationData, TypeData
+from ESI_Api import ESI_Api
+
+
+class AsyncESI_Api:
+    """
+    asyncio front end for ESI_Api.  Requests run on a single pooled keep-alive session with at most max_concurrency
+    requests in flight, and concurrent calls for the same url share one request.
+
+    Lookups of station and type data are done in bulk: assets() collects every unresolved id from the asset list,
+    resolves them concurrently, and only then fills in location_name/type_name from the (now warm) caches.
+
+    usage:  asset_list = asyncio.run(AsyncESI_Api(ESI_Api('Brand Wessa')).assets())
+    """
+
+    def __init__(self, api: ESI_Api, max_concurrency=20):
+        self.api = api
+        self.cache_manager = api.cache_manager
+        self.max_concurrency = max_concurrency
+        # one connection pool, sized so every concurrent request can keep its connection alive
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        api.session.mount('https://', adapter)
+        api.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='esi')
+        self.semaphore = None  # type: asyncio.Semaphore  # created on first use, inside the running loop
+        self.in_flight = {}  # type: Dict[Tuple[str, Optional[int]], asyncio.Future]
+
+    async def call(self, path, *args, page=None, **kwargs):
+        """ async ESI_Api.call, requests for a url already in flight wait for that response instead """
+        return (await self.call_response(path, *args, page=page, **kwargs)).json()
+
+    async def call_response(self, path, *args, page=None, **kwargs):
+        url = path.format(*args, **kwargs)
+        key = (url, page)
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._call_response(url, page))
+            self.in_flight[key] = future
+            future.add_done_callback(lambda f: self.in_flight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _call_response(self, url, page):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, functools.partial(self.api.call_response, url, page=page))
+
+    async def iter_pages(self, path, *args, **kwargs) -> AsyncIterator[list]:
+        """ async ESI_Api.iter_pages: page 1 gives the page count, the rest are requested concurrently and yielded in
+            page order as they arrive """
+        first = await self.call_response(path, *args, page=1, **kwargs)
+        page_count = int(first.headers.get('X-Pages', 1))
+        tasks = [asyncio.ensure_future(self.call(path, *args, page=page, **kwargs))
+                 for page in range(2, page_count + 1)]
+        try:
+            yield first.json()  # the other pages download while the caller processes page 1
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call_paged(self, path, *args, **kwargs) -> list:
+        result = []
+        async for page in self.iter_pages(path, *args, **kwargs):
+            result.extend(page)
+        return result
+
+    async def get_station_data(self, station_id) -> StationData:
+        sd = self.cache_manager.get_station_data(station_id)
+        if not sd:
+            if self.cache_manager.get_negative('station', station_id):
+                return self.api.get_station_data(station_id)  # placeholder, no api call
+            json, error = None, None
+            try:
+                json = await self.call('/universe/stations/{0}/', station_id)
+            except Exception as e:
+                error = e
+            sd = self.cache_manager.get_station_data(station_id)  # a concurrent lookup may have stored it
+            if not sd:
+                sd = self.api._store_station_json(station_id, json, error)
+        return sd
+
+    async def get_type_data(self, type_id, persist=True) -> TypeData:
+        td = self.cache_manager.get_type_data(type_id)
+        if not td:
+            if self.cache_manager.get_negative('type', type_id):
+                return self.api.get_type_data(type_id)  # placeholder, no api call
+            json, error = None, None
+            try:
+                json = await self.call('/universe/types/{0}/', type_id)
+            except Exception as e:
+                error = e
+            td = self.cache_manager.get_type_data(type_id)
+            if not td:
+                td = self.api._store_type_json(type_id, json, error, persist)
+        return td
+
+    async def resolve_stations(self, station_ids: Iterable[int]) -> List[StationData]:
+        return await asyncio.gather(*(self.get_station_data(x) for x in set(station_ids)))
+
+    async def resolve_types(self, type_ids: Iterable[int]) -> List[TypeData]:
+        return await asyncio.gather(*(self.get_type_data(x) for x in set(type_ids)))
+
+    async def assets(self) -> List[AssetRecord]:
+        asset_list = [AssetRecord.from_json(a)
+                      for a in await self.call_paged('/characters/{}/assets/', self.api.character_id)]
+        # resolve every station and type up front, concurrently, so processing the assets only hits the caches
+        await asyncio.gather(
+            self.resolve_stations(a.location_id for a in asset_list if a.location_type == 'station'),
+            self.resolve_types(a.type_id for a in asset_list))
+        self.api.locate_assets(asset_list)
+        return asset_list
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -1,11 +1,16 @@
-import pickle
+import json
 import sqlite3
+import threading
+import zlib
+from collections import Counter
 from datetime import datetime, timedelta, date
+from pathlib import Path
 
 import Config
 
-from typing import Dict, Optional, List
-from DataTypes import StationData, TypeData, MarketPriceData, TypeId, AssetValues
+from typing import Dict, Optional, List, Iterable, Set, Tuple
+from DataTypes import StationData, TypeData, SystemData, AssetValues, CachedResponse
+from PriceTable import PriceTable
 
 
 class CacheManager:
@@ -42,18 +47,131 @@ class CacheManager:
     );
     '''
 
-    def __init__(self, data_dir=Config.dataDir):
+    # added after the original tables, so created separately on existing databases.
+    # rollup tables hold the closing (last) value of each week/month, keyed by the first day of the period
+    __create_history_rollups = '''
+    CREATE INDEX IF NOT EXISTS historical_values_by_character ON historical_values (character_id, value_date);
+
+    CREATE TABLE IF NOT EXISTS historical_values_weekly
+    (  character_id INT,
+       period_start DATE,
+       value_date DATE,
+       station_value REAL,
+       orders_value REAL,
+       ship_value REAL,
+       wallet_balance REAL,
+       escrow_value REAL,
+       CONSTRAINT pk PRIMARY KEY (character_id, period_start)
+    );
+
+    CREATE TABLE IF NOT EXISTS historical_values_monthly
+    (  character_id INT,
+       period_start DATE,
+       value_date DATE,
+       station_value REAL,
+       orders_value REAL,
+       ship_value REAL,
+       wallet_balance REAL,
+       escrow_value REAL,
+       CONSTRAINT pk PRIMARY KEY (character_id, period_start)
+    );
+    '''
+
+    # ids that could not be resolved by the api, not looked up again until expiration
+    __create_negative_cache = '''
+    CREATE TABLE IF NOT EXISTS negative_cache
+    (  kind TEXT,
+       id INTEGER,
+       reason TEXT,
+       failed_at TIMESTAMP,
+       expiration TIMESTAMP,
+       CONSTRAINT pk PRIMARY KEY (kind, id)
+    );
+    '''
+
+    # raw ESI responses, body is zlib compressed.  Served without a request until expiration, then revalidated by etag
+    __create_response_cache = '''
+    CREATE TABLE IF NOT EXISTS http_responses
+    (  cache_key TEXT PRIMARY KEY,
+       etag TEXT,
+       expiration TIMESTAMP,
+       headers TEXT,
+       body BLOB
+    );
+    '''
+
+    # added after the original tables, so created separately on existing databases
+    __create_systems = '''
+    CREATE TABLE IF NOT EXISTS solar_systems
+    (  solar_system_id INTEGER PRIMARY KEY,
+       solar_system_name TEXT
+    );
+    '''
+
+    # sqlite date expression for the start of the rollup period containing value_date (weeks start on Monday)
+    __rollup_periods = {
+        'weekly': "date(value_date, 'weekday 0', '-6 days')",
+        'monthly': "date(value_date, 'start of month')"
+    }
+
+    __update_rollup = '''
+    INSERT INTO historical_values_{resolution}
+    SELECT character_id, {period_start}, value_date, station_value, orders_value, ship_value, wallet_balance, escrow_value
+      FROM historical_values
+     WHERE {where}
+    ON CONFLICT (character_id, period_start) DO UPDATE SET
+       value_date=excluded.value_date,
+       station_value=excluded.station_value,
+       orders_value=excluded.orders_value,
+       ship_value=excluded.ship_value,
+       wallet_balance=excluded.wallet_balance,
+       escrow_value=excluded.escrow_value
+     WHERE excluded.value_date >= historical_values_{resolution}.value_date
+    '''
+
+    __insert_station = 'INSERT OR REPLACE INTO stations VALUES (?, ?, ?)'
+    __insert_type = 'INSERT OR REPLACE INTO types VALUES (?, ?, ?, ?, ?, ?)'
+    __insert_system = 'INSERT OR REPLACE INTO solar_systems VALUES (?, ?)'
+
+    def __init__(self, data_dir=Config.dataDir, write_behind=False, flush_size=500, flush_interval=timedelta(seconds=5)):
+        """
+        If write_behind is True, put_* calls are buffered in memory and written to sqlite3 in a single transaction
+        once flush_size rows are pending, flush_interval has passed since the last flush, or on flush()/close().  A
+        timer flushes rows that are still buffered after flush_interval when nothing else is put.
+        """
         self.data_dir = data_dir
-        self.market_prices_filename = data_dir / "market_prices.pickle"
+        self.market_prices_filename = data_dir / "market_prices.bin"
         self.db_filename = data_dir / "cached_data.sqlite3"
-        self.db_conn = sqlite3.connect(str(self.db_filename))
+        # connection is shared between threads, db_lock serializes access to it
+        self.db_conn = sqlite3.connect(str(self.db_filename), check_same_thread=False)
+        self.db_lock = threading.RLock()
         tables = self.db_conn.execute("select name from sqlite_master where type='table'").fetchall()
         if len(tables) == 0:
             self.db_conn.executescript(CacheManager.__create_tables)
+        self._create_history_rollups()
+        self.db_conn.executescript(CacheManager.__create_systems)
+        self.db_conn.executescript(CacheManager.__create_negative_cache)
+        self.db_conn.executescript(CacheManager.__create_response_cache)
 
         self.station_dict = {}  # type: Dict[int, StationData]
         self.type_dict = {}  # type: Dict[int, TypeData]
-        self.price_dict_expiration = None  # type: Optional[(Dict[TypeId, MarketPriceData], datetime)] # expiration date
+        self.system_dict = {}  # type: Dict[int, SystemData]
+        self.price_tables = {}  # type: Dict[str, PriceTable]
+
+        self.write_behind = write_behind
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.last_flush = datetime.now()
+        self._flush_timer = None  # type: Optional[threading.Timer]
+        self.negative_dict = {}  # type: Dict[Tuple[str, int], Tuple[str, datetime]]  # (kind, id) -> (reason, expiration)
+        self.negative_hits = Counter()  # type: Dict[str, int]  # api calls skipped per kind
+        self._negative_counted = set()  # type: Set[Tuple[str, int]]  # ids already counted in negative_hits
+        self.response_stats = Counter()  # type: Dict[str, int]  # 'hit', 'revalidated', 'miss' counts of the response cache
+
+        # write-behind buffers, keyed by id so the last put for an id wins
+        self.pending_stations = {}  # type: Dict[int, StationData]
+        self.pending_types = {}  # type: Dict[int, TypeData]
+        self.pending_systems = {}  # type: Dict[int, SystemData]
 
     def get_station_data(self, station_id: int) -> Optional[StationData]:
         """ looks up station data from caches, returns None if not found """
@@ -62,7 +180,8 @@ class CacheManager:
             # print("from memory cache:", self.station_dict[station_id])
             return self.station_dict[station_id]
         # sqlite3 cache
-        row = self.db_conn.execute('select station_id, station_name, solar_system_id from stations where station_id=?', (station_id,)).fetchone()
+        with self.db_lock:
+            row = self.db_conn.execute('select station_id, station_name, solar_system_id from stations where station_id=?', (station_id,)).fetchone()
         if row:
             sd = StationData._make(row)
             print("from sqlite3 cache: ", sd)
@@ -72,10 +191,19 @@ class CacheManager:
 
     def put_station_data(self, station_data: StationData, persist=True):
         """ add to both in-memory and sqlite3 cache"""
-        self.station_dict[station_data.station_id] = station_data
+        self.put_station_data_many([station_data], persist)
+
+    def put_station_data_many(self, station_data_list: Iterable[StationData], persist=True):
+        """ add to both in-memory and sqlite3 cache, all rows are written in a single transaction """
+        station_data_list = list(station_data_list)
+        self.station_dict.update((sd.station_id, sd) for sd in station_data_list)
         if persist:
-            with self.db_conn as conn:  # auto commit or rollback
-                conn.execute('INSERT INTO stations VALUES (?, ?, ?)', station_data)
+            if self.write_behind:
+                with self.db_lock:
+                    self.pending_stations.update((sd.station_id, sd) for sd in station_data_list)
+                self._flush_if_due()
+            else:
+                self._write_many(CacheManager.__insert_station, station_data_list)
 
     def get_type_data(self, type_id) -> Optional[TypeData]:
         """ looks up type data from caches, returns None if not found"""
@@ -84,7 +212,8 @@ class CacheManager:
             # print("from memory cache:", self.type_dict[type_id])
             return self.type_dict[type_id]
         # sqlite3 cache
-        row = self.db_conn.execute('select type_id, type_name, type_description, group_id, category_id, icon_id from types where type_id=?', (type_id,)).fetchone()
+        with self.db_lock:
+            row = self.db_conn.execute('select type_id, type_name, type_description, group_id, category_id, icon_id from types where type_id=?', (type_id,)).fetchone()
         if row:
             d = TypeData._make(row)
             print("from sqlite3 cache: ", d)
@@ -94,31 +223,199 @@ class CacheManager:
 
     def put_type_data(self, type_data: TypeData, persist=True):
         """ update caches with type_data.  If persist is False do not update sqlite3 cache"""
-        self.type_dict[type_data.type_id] = type_data
+        self.put_type_data_many([type_data], persist)
+
+    def put_type_data_many(self, type_data_list: Iterable[TypeData], persist=True):
+        """ update caches with all of type_data_list, sqlite3 rows are written in a single transaction.
+            If persist is False do not update sqlite3 cache"""
+        type_data_list = list(type_data_list)
+        self.type_dict.update((td.type_id, td) for td in type_data_list)
+        if persist:
+            if self.write_behind:
+                with self.db_lock:
+                    self.pending_types.update((td.type_id, td) for td in type_data_list)
+                self._flush_if_due()
+            else:
+                self._write_many(CacheManager.__insert_type, type_data_list)
+
+    def get_system_data(self, solar_system_id: int) -> Optional[SystemData]:
+        """ looks up solar system data from caches, returns None if not found """
+        if solar_system_id in self.system_dict:
+            return self.system_dict[solar_system_id]
+        with self.db_lock:
+            row = self.db_conn.execute('select solar_system_id, solar_system_name from solar_systems where solar_system_id=?',
+                                       (solar_system_id,)).fetchone()
+        if row:
+            d = SystemData._make(row)
+            self.system_dict[solar_system_id] = d
+            return d
+        return None
+
+    def put_system_data_many(self, system_data_list: Iterable[SystemData], persist=True):
+        """ add to both in-memory and sqlite3 cache, all rows are written in a single transaction """
+        system_data_list = list(system_data_list)
+        self.system_dict.update((sd.solar_system_id, sd) for sd in system_data_list)
         if persist:
-            with self.db_conn as conn:  # auto commit or rollback
-                conn.execute('INSERT INTO types VALUES (?, ?, ?, ?, ?, ?)', type_data)
-
-    def get_price_dict(self) -> Optional[Dict[TypeId, MarketPriceData]]:
-        if not self.price_dict_expiration:
-            if self.market_prices_filename.exists():
-                print("getting market prices from pickle file")
-                with self.market_prices_filename.open('rb') as f:
-                    self.price_dict_expiration = pickle.load(f)
+            if self.write_behind:
+                with self.db_lock:
+                    self.pending_systems.update((sd.solar_system_id, sd) for sd in system_data_list)
+                self._flush_if_due()
             else:
+                self._write_many(CacheManager.__insert_system, system_data_list)
+
+    def put_many(self, stations: Iterable[StationData] = (), types: Iterable[TypeData] = (),
+                 systems: Iterable[SystemData] = ()):
+        """ add stations, types and systems to the caches, writing all of them (and anything already buffered) to
+            sqlite3 in a single transaction """
+        stations, types, systems = list(stations), list(types), list(systems)
+        self.station_dict.update((sd.station_id, sd) for sd in stations)
+        self.type_dict.update((td.type_id, td) for td in types)
+        self.system_dict.update((sd.solar_system_id, sd) for sd in systems)
+        with self.db_lock:
+            self.pending_stations.update((sd.station_id, sd) for sd in stations)
+            self.pending_types.update((td.type_id, td) for td in types)
+            self.pending_systems.update((sd.solar_system_id, sd) for sd in systems)
+            self.flush()
+
+    def _write_many(self, sql: str, rows: List[tuple]):
+        if len(rows) == 0:
+            return
+        with self.db_lock, self.db_conn as conn:  # auto commit or rollback
+            conn.executemany(sql, rows)
+
+    def _flush_if_due(self):
+        with self.db_lock:
+            pending_count = len(self.pending_stations) + len(self.pending_types) + len(self.pending_systems)
+            wait = self.last_flush + self.flush_interval - datetime.now()
+            if pending_count >= self.flush_size or wait <= timedelta(0):
+                self.flush()
+            elif pending_count > 0 and self._flush_timer is None:
+                self._flush_timer = threading.Timer(wait.total_seconds(), self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self):
+        """ write any buffered station, type and system rows to sqlite3 in one transaction """
+        with self.db_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            stations = list(self.pending_stations.values())
+            types = list(self.pending_types.values())
+            systems = list(self.pending_systems.values())
+            if len(stations) > 0 or len(types) > 0 or len(systems) > 0:
+                with self.db_conn as conn:  # auto commit or rollback
+                    conn.executemany(CacheManager.__insert_station, stations)
+                    conn.executemany(CacheManager.__insert_type, types)
+                    conn.executemany(CacheManager.__insert_system, systems)
+            self.pending_stations.clear()
+            self.pending_types.clear()
+            self.pending_systems.clear()
+            self.last_flush = datetime.now()
+
+    def close(self):
+        """ flush pending writes and close the sqlite3 connection """
+        self.flush()
+        with self.db_lock:
+            self.db_conn.close()
+
+    def get_negative(self, kind: str, id: int) -> Optional[str]:
+        """ returns the failure reason if id of this kind (e.g. 'type', 'station') is known to be unresolvable and the
+            entry has not expired, None otherwise.  Each id found is counted once as a saved api call """
+        key = (kind, id)
+        if key not in self.negative_dict:
+            with self.db_lock:
+                row = self.db_conn.execute('select reason, expiration from negative_cache where kind=? and id=?',
+                                           key).fetchone()
+            # remember misses too, so known-good ids only query sqlite once
+            self.negative_dict[key] = (row[0], datetime.fromisoformat(row[1])) if row else None
+        entry = self.negative_dict[key]
+        if entry is None or entry[1] <= datetime.now():
+            return None
+        if key not in self._negative_counted:
+            self._negative_counted.add(key)
+            self.negative_hits[kind] += 1
+        return entry[0]
+
+    def put_negative(self, kind: str, id: int, reason: str, ttl=timedelta(days=7)):
+        """ record that id of this kind could not be resolved, lookups are skipped for ttl """
+        now = datetime.now()
+        self.negative_dict[(kind, id)] = (reason, now + ttl)
+        with self.db_lock, self.db_conn as conn:
+            conn.execute('INSERT OR REPLACE INTO negative_cache VALUES (?, ?, ?, ?, ?)',
+                         (kind, id, reason, now.isoformat(), (now + ttl).isoformat()))
+
+    def negative_cache_report(self) -> str:
+        """ summary of the negative cache: active entries and api calls saved this session, by kind """
+        with self.db_lock:
+            rows = self.db_conn.execute('select kind, count(*) from negative_cache where expiration > ? group by kind',
+                                        (datetime.now().isoformat(),)).fetchall()
+        active = dict(rows)
+        kinds = sorted(set(active.keys()) | set(self.negative_hits.keys()))
+        lines = ['Negative cache: {} api calls saved'.format(sum(self.negative_hits.values()))]
+        lines += ['  {:<10} {:>6} known bad, {:>6} calls saved'.format(k, active.get(k, 0), self.negative_hits[k])
+                  for k in kinds]
+        return '\n'.join(lines)
+
+    def get_response(self, cache_key: str) -> Optional[CachedResponse]:
+        """ cached response for cache_key (url and parameters), expired responses are returned too so they can be
+            revalidated """
+        with self.db_lock:
+            row = self.db_conn.execute('select etag, expiration, headers, body from http_responses where cache_key=?',
+                                       (cache_key,)).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(row[0], datetime.fromisoformat(row[1]), json.loads(row[2]), zlib.decompress(row[3]))
+
+    def put_response(self, cache_key: str, response: CachedResponse):
+        with self.db_lock, self.db_conn as conn:
+            conn.execute('INSERT OR REPLACE INTO http_responses VALUES (?, ?, ?, ?, ?)',
+                         (cache_key,
+                          response.etag,
+                          response.expiration.isoformat(),
+                          json.dumps(response.headers),
+                          zlib.compress(response.body)))
+
+    def get_price_table(self, name: str = None) -> Optional[PriceTable]:
+        """ returns the market price table, None if there is no table or it has expired.  name selects one of the
+            derived tables (e.g. regional prices), the default is the global market price table """
+        price_table = self.price_tables.get(name)
+        if price_table is None:
+            filename = self._price_table_filename(name)
+            price_table = PriceTable.load(filename)
+            if price_table is None:
                 return None
-        if self.price_dict_expiration[1] > datetime.now():
-            return self.price_dict_expiration[0]
-        else:
-            print("pickled market prices expired")
-            return None  # expired
+            print("loaded market prices from {}".format(filename))
+            self.price_tables[name] = price_table
+        if price_table.is_expired():
+            print("cached market prices expired")
+            return None
+        return price_table
+
+    def put_price_table(self, price_table: PriceTable, name: str = None):
+        """ persist price_table, replaces any existing table of that name """
+        with self.db_lock:  # reports running in parallel may store the same table
+            self.price_tables.pop(name, None)  # tables already handed out keep reading the replaced file
+            price_table.save(self._price_table_filename(name))
+            self.price_tables[name] = price_table
+
+    def _price_table_filename(self, name: str = None) -> Path:
+        return self.market_prices_filename if name is None else self.data_dir / "prices-{}.bin".format(name)
+
+    def _create_history_rollups(self):
+        """ create the history index and rollup tables if needed, filling the rollups from any existing history """
+        table_names = {x[0] for x in self.db_conn.execute("select name from sqlite_master where type='table'")}
+        is_new = 'historical_values_weekly' not in table_names
+        self.db_conn.executescript(CacheManager.__create_history_rollups)
+        if is_new:
+            with self.db_conn as conn:
+                for resolution in CacheManager.__rollup_periods:
+                    conn.execute(self._rollup_sql(resolution, 'true'))
 
-    def put_price_dict(self, price_dict: Dict[TypeId, MarketPriceData], expiration: datetime):
-        """ convert price_list to Dict[PriceId, MarketPriceData] and persist """
-        payload = (price_dict, expiration)
-        self.price_dict_expiration = payload
-        with self.market_prices_filename.open('wb') as f:
-            pickle.dump(payload, f)
+    def _rollup_sql(self, resolution: str, where: str) -> str:
+        return CacheManager.__update_rollup.format(resolution=resolution,
+                                                   period_start=CacheManager.__rollup_periods[resolution],
+                                                   where=where)
 
     def put_historical_values(self,
                               character_id,
@@ -126,20 +423,76 @@ class CacheManager:
                               orders_value: float,
                               escrow_value: float,
                               ship_value: float,
-                              wallet_balance: float):
+                              wallet_balance: float,
+                              value_date: date = None):
         """ store the historical values, uses today date, replaces if alread present (i.e. last entry of the day
-            is persisted """
-        with self.db_conn as conn:
+            is persisted.  Weekly and monthly rollups are updated in the same transaction """
+        value_date = value_date or date.today()
+        with self.db_lock, self.db_conn as conn:
             conn.execute("INSERT OR REPLACE INTO historical_values VALUES (?, ?, ?, ?, ?, ?, ?)",
-                         (date.today(), character_id, station_value, orders_value, ship_value, wallet_balance, escrow_value))
+                         (value_date, character_id, station_value, orders_value, ship_value, wallet_balance, escrow_value))
+            for resolution in CacheManager.__rollup_periods:
+                conn.execute(self._rollup_sql(resolution, 'character_id=? AND value_date=?'), (character_id, value_date))
 
-    def get_historical_values(self, character_id) -> List[AssetValues]:
-        """ store the historical values, uses today date, replaces if alread present (i.e. last entry of the day
-            is persisted """
-        with self.db_conn as conn:
-            results = conn.execute("SELECT * FROM historical_values WHERE character_id=?",
-                         (character_id, ))
-        return [AssetValues._make(x) for x in results.fetchall()]
+    def get_historical_values(self, character_id, start: date = None, end: date = None,
+                              max_points: int = None) -> List[AssetValues]:
+        """ historical values for the character ordered by date, optionally limited to start <= date <= end.
+            If max_points is given the finest resolution (daily, weekly, monthly) with at most max_points values in
+            the range is used, monthly values are thinned out evenly if there are still too many """
+        resolution = 'daily'
+        if max_points is not None:
+            for resolution in ('daily', 'weekly', 'monthly'):
+                if self._count_historical_values(character_id, start, end, resolution) <= max_points:
+                    break
+        values = self.get_historical_values_rollup(character_id, resolution, start, end)
+        if max_points is not None and len(values) > max_points:
+            values = _downsample(values, max_points)
+        return values
+
+    def get_historical_values_rollup(self, character_id, resolution: str, start: date = None,
+                                     end: date = None) -> List[AssetValues]:
+        """ resolution is one of 'daily', 'weekly' or 'monthly'. Weekly and monthly values are the last values
+            stored in each period """
+        table, where, params = self._historical_values_query(character_id, start, end, resolution)
+        with self.db_lock:
+            results = self.db_conn.execute(
+                "SELECT value_date, character_id, station_value, orders_value, ship_value, wallet_balance, escrow_value"
+                " FROM {} WHERE {} ORDER BY value_date".format(table, where), params)
+            return [AssetValues._make(x) for x in results.fetchall()]
+
+    def _count_historical_values(self, character_id, start: Optional[date], end: Optional[date], resolution: str) -> int:
+        table, where, params = self._historical_values_query(character_id, start, end, resolution)
+        with self.db_lock:
+            return self.db_conn.execute("SELECT count(*) FROM {} WHERE {}".format(table, where), params).fetchone()[0]
+
+    def _historical_values_query(self, character_id, start: Optional[date], end: Optional[date], resolution: str):
+        """ returns table name, where clause, and parameters for a range query on the character's values.  For
+            rollups the range applies to the date of the closing value of each period """
+        if resolution == 'daily':
+            table = 'historical_values'
+        elif resolution in CacheManager.__rollup_periods:
+            table = 'historical_values_' + resolution
+        else:
+            raise ValueError("unknown resolution {}".format(resolution))
+        where = ['character_id=?']
+        params = [character_id]
+        if start is not None:
+            where.append('value_date >= ?')
+            params.append(start)
+        if end is not None:
+            where.append('value_date <= ?')
+            params.append(end)
+        return table, ' AND '.join(where), params
+
+
+def _downsample(values: list, max_points: int) -> list:
+    """ evenly spaced subset of values with at most max_points entries, always keeps the most recent value """
+    if max_points <= 0:
+        return []
+    if max_points == 1:
+        return values[-1:]
+    step = (len(values) - 1) / (max_points - 1)
+    return [values[round(i * step)] for i in range(max_points)]
 
 
 if __name__ == '__main__':
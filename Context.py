@@ -0,0 +1,71 @@
+"""
+Shared managers, created on first use.  Importing this module (or the modules that use it) opens nothing; the token
+store, caches and static data are opened by the first call that needs them and shared after that.
+
+Tests and tools with their own data directory register their instances first:
+    Context.register(token_manager=TokenManager(data_dir), cache_manager=CacheManager(data_dir))
+"""
+import threading
+
+import Config
+
+_lock = threading.RLock()
+_instances = {}
+
+
+def _get(name: str, factory):
+    with _lock:
+        instance = _instances.get(name)
+        if instance is None:
+            instance = _instances[name] = factory()
+        return instance
+
+
+def token_manager():
+    """ the shared TokenManager """
+    def create():
+        from TokenManager import TokenManager
+        return TokenManager(Config.dataDir)
+    return _get('token_manager', create)
+
+
+def cache_manager():
+    """ the shared CacheManager """
+    def create():
+        from CacheManager import CacheManager
+        return CacheManager(Config.dataDir)
+    return _get('cache_manager', create)
+
+
+def static_data():
+    """ the shared StaticDataAccessor """
+    def create():
+        from StaticDataAccessor import StaticDataAccessor
+        return StaticDataAccessor(Config.dataDir)
+    return _get('static_data', create)
+
+
+def scheduler():
+    """ the shared RequestScheduler, so every api counts against one rate and error limit """
+    def create():
+        from RequestScheduler import RequestScheduler
+        return RequestScheduler()
+    return _get('scheduler', create)
+
+
+def register(**instances):
+    """ use the given instances (token_manager, cache_manager, static_data, scheduler) instead of creating them """
+    unknown = set(instances) - {'token_manager', 'cache_manager', 'static_data', 'scheduler'}
+    if unknown:
+        raise ValueError("unknown context entries {}".format(sorted(unknown)))
+    with _lock:
+        _instances.update(instances)
+
+
+def close():
+    """ flush and close the shared managers that were created, the next use creates new ones """
+    with _lock:
+        cache = _instances.pop('cache_manager', None)
+        _instances.clear()
+    if cache is not None:
+        cache.close()
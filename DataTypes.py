@@ -2,6 +2,7 @@ from collections import namedtuple
 from typing import NewType
 
 StationData = namedtuple('StationData', 'station_id station_name solar_system_id')
+SystemData = namedtuple('SystemData', 'solar_system_id solar_system_name')
 TypeData = namedtuple('TypeData', 'type_id type_name type_description group_id category_id icon_id')
 MarketPriceData = namedtuple('MarketPriceData', 'type_id average_price adjusted_price')
 MarketOrderData = namedtuple('MarketOrderData', 'order_id character_id character_name station_id station_name vol_entered vol_remaining order_state type_id type_name range duration price order_type escrow issued')
@@ -9,5 +10,8 @@ MarketOrderData = namedtuple('MarketOrderData', 'order_id character_id character
 TypeId = NewType('TypeId', int)
 StationId = NewType('StationId', int)
 
+CachedResponse = namedtuple('CachedResponse', 'etag expiration headers body')
+
 AssetValues = namedtuple('AssetValues', 'date character_id station_value orders_value ship_value wallet_balance escrow_value')
 
+ArbitrageOpportunity = namedtuple('ArbitrageOpportunity', 'type_id quantity source_location_id source_system_id destination_location_id destination_system_id cost revenue profit volume jumps')
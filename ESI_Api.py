@@ -1,121 +1,317 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
 from pprint import pprint
 
-from traitlets import Float
-
-from DataTypes import StationData, TypeData, MarketPriceData, TypeId, MarketOrderData
-from typing import Optional, Dict, List
+from DataTypes import StationData, TypeData, MarketPriceData, TypeId, MarketOrderData, CachedResponse
+from itertools import chain
+from urllib.parse import urlencode
+from typing import Optional, Dict, List, Iterator, Tuple
 from TokenManager import TokenData  # needed to allow unpickling of TokenData
 import xml.etree.ElementTree as ET
 
+import numpy as np
 import requests
 from requests.auth import AuthBase
-
-import CacheManager
+from requests.structures import CaseInsensitiveDict
+
+import Context
+import RunProfile
+from AssetRecord import AssetRecord
+from AssetStream import iter_json_array, index_assets
+from LocationTree import LocationTree
+from MarketOrders import iter_xml_orders, iter_esi_orders, enrich_orders
+from NameResolver import NameResolver
+from PriceTable import PriceTable
+from RequestScheduler import RequestScheduler, EsiError, EsiHttpError
 from TokenManager import TokenManager
 
 
 class ESI_Api:
-    def __init__(self, character_name: str, token_manager=TokenManager(), cache_manager=CacheManager.CacheManager()):
-        self.cache_manager = cache_manager
+    def __init__(self, character_name: str, token_manager: TokenManager = None, cache_manager=None,
+                 static_data=None, scheduler: RequestScheduler = None):
+        """ token_manager and cache_manager default to the shared ones from Context.
+            static_data is an optional StaticDataAccessor, used to fill in details when resolving names in bulk.
+            scheduler can be shared between apis so all requests count against one rate and error limit """
+        token_manager = token_manager or Context.token_manager()
+        self.cache_manager = cache_manager or Context.cache_manager()
+        self.scheduler = scheduler or RequestScheduler()
+        self.static_data = static_data
         self.token_manager = token_manager
         self.character_name = character_name
         self.character_id = token_manager.get_token_data(character_name).character_id
         self.session = requests.Session()
         self.session.auth = EveSSOAuth(character_name, token_manager)
         self.session.params = {'datasource': 'tranquility'}
+        self.xml_session = requests.Session()
         self.esi_api_url = 'https://esi.tech.ccp.is/latest'
         self.xml_api_url = 'https://api.eveonline.com'  # 'https://api.testeveonline.com/'  #
+        self.use_response_cache = True
 
     def call(self, path, *args, **kwargs):
-        r = self.session.get(self.esi_api_url + path.format(*args, **kwargs))
+        return self.call_response(path, *args, **kwargs).json()
+
+    def call_response(self, path, *args, page=None, params: dict = None, **kwargs) -> requests.Response:
+        """ make the ESI call and return the full response, use when headers like Expires are needed.
+            params are extra query parameters.
+            Responses are served from the response cache until they expire, after that they are revalidated with
+            If-None-Match and the cached body is reused on 304 """
+        url = self.esi_api_url + path.format(*args, **kwargs)
+        if page is not None:
+            params = dict(params or {}, page=page)
+        cache_key = None
+        cached = None
+        request_headers = None
+        if self.use_response_cache:
+            cache_key = self._response_cache_key(url, params)
+            cached = self.cache_manager.get_response(cache_key)
+            if cached is not None:
+                if cached.expiration > datetime.now():
+                    self.cache_manager.response_stats['hit'] += 1
+                    return _make_response(url, cached.headers, cached.body)
+                if cached.etag:
+                    request_headers = {'If-None-Match': cached.etag}
+        r = self.scheduler.request(self.session, 'GET', url, path, params=params, headers=request_headers)
+        if r.status_code == 304 and cached is not None:
+            self.cache_manager.response_stats['revalidated'] += 1
+            headers = dict(cached.headers, **r.headers)
+            cached = CachedResponse(r.headers.get('ETag', cached.etag),
+                                    get_expiration(r.headers, timedelta(0)),
+                                    headers,
+                                    cached.body)
+            self.cache_manager.put_response(cache_key, cached)
+            return _make_response(url, cached.headers, cached.body)
+        if r.status_code != 200:
+            raise EsiHttpError(r.status_code, 'GET', url, r.text)
         try:
-            if r.status_code != 200:
-                raise RuntimeError("error making ESI call")
-            return r.json()
-        except:
+            r.json()  # make sure the body parses
+        except ValueError as e:
             print('Error parsing response for {}'.format(path.format(*args, **kwargs)))
             print(r.text)
             print(r.headers)
-            exit(1)
+            raise EsiError("unable to parse response for {}".format(url)) from e
+        if cache_key is not None:
+            self.cache_manager.response_stats['miss'] += 1
+            if 'ETag' in r.headers or 'Expires' in r.headers:
+                self.cache_manager.put_response(cache_key, CachedResponse(r.headers.get('ETag'),
+                                                                          get_expiration(r.headers, timedelta(0)),
+                                                                          dict(r.headers),
+                                                                          r.content))
+        return r
 
-    def _process_asset_dict(self, asset_dict, singletons):
-        """ set the location_name and type_name of the assets item. If location is inside another item like a ship
-         or container processes the containing item first.  Lists the type and location of the containing object as
-         the location_name.
-         also set station_id if location_type is a station, will also be set if item is in a container in a station
+    def call_post(self, path, body, *args, **kwargs):
+        """ POST body as json to the ESI path, returns the parsed response.  POST responses are not cached """
+        url = self.esi_api_url + path.format(*args, **kwargs)
+        r = self.scheduler.request(self.session, 'POST', url, 'POST ' + path, json=body)
+        if r.status_code != 200:
+            raise EsiHttpError(r.status_code, 'POST', url, r.text)
+        return r.json()
+
+    def iter_pages(self, path, *args, max_workers=8, **kwargs) -> Iterator[list]:
+        """ yields each page of a paged ESI call, in page order.  Page 1 gives the page count (X-Pages header), the
+            remaining pages are downloaded concurrently and each is yielded as soon as it and the pages before it
+            have arrived """
+        first = self.call_response(path, *args, page=1, **kwargs)
+        page_count = int(first.headers.get('X-Pages', 1))
+        if page_count == 1:
+            yield first.json()
+            return
+        with ThreadPoolExecutor(max_workers=min(max_workers, page_count - 1)) as executor:
+            futures = [executor.submit(self.call, path, *args, page=page, **kwargs)
+                       for page in range(2, page_count + 1)]
+            yield first.json()  # the other pages download while the caller processes page 1
+            for f in futures:
+                yield f.result()
+
+    def call_paged(self, path, *args, **kwargs) -> list:
+        """ all pages of a paged ESI call merged into one list """
+        return list(chain.from_iterable(self.iter_pages(path, *args, **kwargs)))
+
+    def iter_records(self, path, *args, max_workers=8, chunk_size=65536, **kwargs) -> Iterator[dict]:
+        """ streams the records of a paged ESI call that returns a JSON array.  Page 1 is parsed incrementally as it
+            downloads while the remaining pages are downloaded (and parsed) concurrently.  Records are yielded in page
+            order.  When the response cache holds every page unexpired (e.g. just fetched by the AssetDaemon) the
+            records are read from it, streamed responses are not cached since caching needs the whole body in memory
+        """
+        cached = self._cached_pages(path, *args, **kwargs)
+        if cached is not None:
+            for body in cached:
+                yield from iter_json_array((body,))
+            return
+        first = self._stream_response(path, *args, page=1, **kwargs)
+        page_count = int(first.headers.get('X-Pages', 1))
+        if page_count == 1:
+            yield from iter_json_array(first.iter_content(chunk_size))
+            return
+        with ThreadPoolExecutor(max_workers=min(max_workers, page_count - 1)) as executor:
+            futures = [executor.submit(self._read_records, path, *args, page=page, chunk_size=chunk_size, **kwargs)
+                       for page in range(2, page_count + 1)]
+            yield from iter_json_array(first.iter_content(chunk_size))
+            for f in futures:
+                yield from f.result()
+
+    def _cached_pages(self, path, *args, **kwargs) -> Optional[List[bytes]]:
+        """ the bodies of all pages of the call if the response cache holds every one unexpired, None otherwise """
+        if not self.use_response_cache:
+            return None
+        url = self.esi_api_url + path.format(*args, **kwargs)
+        bodies = []
+        page_count = 1
+        while len(bodies) < page_count:
+            cached = self.cache_manager.get_response(self._response_cache_key(url, {'page': len(bodies) + 1}))
+            if cached is None and len(bodies) == 0:  # page 1 is also fetched without the page parameter
+                cached = self.cache_manager.get_response(self._response_cache_key(url, None))
+            if cached is None or cached.expiration <= datetime.now():
+                return None
+            if len(bodies) == 0:
+                page_count = int(CaseInsensitiveDict(cached.headers).get('X-Pages', 1))
+            bodies.append(cached.body)
+        self.cache_manager.response_stats['hit'] += len(bodies)
+        return bodies
+
+    def _response_cache_key(self, url: str, params: Optional[dict]) -> str:
+        return url + '?' + urlencode(sorted(dict(self.session.params, **(params or {})).items()))
+
+    def _read_records(self, path, *args, page=None, chunk_size=65536, **kwargs) -> list:
+        r = self._stream_response(path, *args, page=page, **kwargs)
+        return list(iter_json_array(r.iter_content(chunk_size)))
+
+    def _stream_response(self, path, *args, page=None, **kwargs) -> requests.Response:
+        url = self.esi_api_url + path.format(*args, **kwargs)
+        r = self.scheduler.request(self.session, 'GET', url, path,
+                                   params=None if page is None else {'page': page}, stream=True)
+        if r.status_code != 200:
+            raise EsiHttpError(r.status_code, 'GET', url, r.text)
+        return r
+
+    def locate_assets(self, asset_list: List[AssetRecord]) -> LocationTree:
+        """ set the type_name, category_id, group_id and location_name of the assets.  If location is inside another
+         item like a ship or container lists the type and location of the containing object as the location_name.
+         also set station_id if the item is in a station, at any depth of containers.  Stations and types should be
+         resolved beforehand, this only reads the caches
         """
-        a = asset_dict
-        if 'location_name' in asset_dict:  # already set
-            pass
-        elif a['location_type'] == 'station':
-            a['location_name'] = self.get_station_data(a['location_id']).station_name
-            a['station_id'] = a['location_id']
-        elif a['location_id'] in singletons:
-            s = singletons[a['location_id']]
-            self._process_asset_dict(s, singletons)  # ensure containing object has been processed
-            a['location_name'] = "{}@{}".format(s['type_name'], s['location_name'])
-            a['station_id'] = s['station_id']
-        else:
-            a['location_name'] = "{}-{}".format(a['location_type'], a['location_id'])
-        if 'type_name' not in a:
-            type_data = self.get_type_data(a['type_id'])
-            a['type_name'] = type_data.type_name
-            a['category_id'] = type_data.category_id
-            a['group_id'] = type_data.group_id
-
-    def assets(self) -> List[dict]:
-        asset_list = self.call('/characters/{}/assets/', self.character_id)
-        singletons = {x['item_id']: x for x in asset_list if x['is_singleton']}
-        # api includes only location_id and type_id, fill in with names
         for a in asset_list:
-            self._process_asset_dict(a, singletons)
-        return asset_list
+            type_data = self.get_type_data(a.type_id)
+            a.type_name = type_data.type_name
+            a.category_id = type_data.category_id
+            a.group_id = type_data.group_id
+        tree = LocationTree(asset_list, lambda x: x.category_id == 6)
+        for i in tree.order:  # containers come before their contents
+            a = asset_list[i]
+            container = tree.container(i)
+            if a.location_type == 'station':
+                a.set_names(a.type_name, self.get_station_data(a.location_id).station_name)
+                a.station_id = a.location_id
+            elif container is not None:
+                a.set_names(a.type_name, "{}@{}".format(container.type_name, container.location_name))
+                a.station_id = container.station_id
+            else:
+                a.set_names(a.type_name, "{}-{}".format(a.location_type, a.location_id))
+        return tree
+
+    def assets(self) -> List[AssetRecord]:
+        return self.assets_and_tree()[0]
+
+    def assets_and_tree(self) -> Tuple[List[AssetRecord], LocationTree]:
+        """ the character's assets, and the tree of which ship or container holds each of them """
+        with RunProfile.phase('fetch'):
+            asset_list, _ = index_assets(self.iter_records('/characters/{}/assets/', self.character_id))
+        with RunProfile.phase('name resolution'):
+            resolver = NameResolver(self, self.static_data)
+            resolver.add_assets(asset_list)
+            resolver.resolve()
+            # api includes only location_id and type_id, fill in with names
+            return asset_list, self.locate_assets(asset_list)
+
+    def assets_and_containers(self) -> Tuple[List[AssetRecord], Dict[int, AssetRecord]]:
+        """ the character's assets, and the containers (ships, cans, ...) among them by item_id """
+        asset_list, _ = self.assets_and_tree()
+        return asset_list, {a.item_id: a for a in asset_list if a.is_singleton}
 
     def get_station_data(self, station_id) -> StationData:
         sd = self.cache_manager.get_station_data(station_id)
         if not sd:
-            json = self.call('/universe/stations/{0}/', station_id)
-            print(json)
-            # TODO: handle error cases
-            sd = StationData(station_id, json['name'], json['system_id'])
-            self.cache_manager.put_station_data(sd)
-            print("api lookup:", sd)
+            if self.cache_manager.get_negative('station', station_id):
+                sd = _unknown_station(station_id)
+                self.cache_manager.put_station_data(sd, persist=False)  # the next lookup stays in memory
+                return sd
+            json, error = None, None
+            try:
+                json = self.call('/universe/stations/{0}/', station_id)
+                print(json)
+            except Exception as e:
+                error = e
+            sd = self._store_station_json(station_id, json, error)
+        return sd
+
+    def _store_station_json(self, station_id, json: Optional[dict], error: Optional[Exception]) -> StationData:
+        """ convert the /universe/stations/ response to StationData and cache it.  If the lookup failed a placeholder
+            is cached for this session, and if ESI said the station does not exist it goes in the negative cache """
+        if error is None:
+            try:
+                sd = StationData(station_id, json['name'], json['system_id'])
+                self.cache_manager.put_station_data(sd)
+                print("api lookup:", sd)
+                return sd
+            except Exception as e:
+                error = "unexpected response {}: {}".format(json, e)
+        print("Error getting station data for station_id {}: {}".format(station_id, error))
+        if _is_not_found(error):
+            self.cache_manager.put_negative('station', station_id, str(error))
+        sd = _unknown_station(station_id)
+        self.cache_manager.put_station_data(sd, persist=False)
         return sd
 
     def get_type_data(self, type_id, persist=True) -> TypeData:
         td = self.cache_manager.get_type_data(type_id)
         if not td:
-            is_error = False
+            if self.cache_manager.get_negative('type', type_id):
+                td = _unknown_type(type_id)
+                self.cache_manager.put_type_data(td, persist=False)  # the next lookup stays in memory
+                return td
+            json, error = None, None
             print("doing api lookup for type_id {}".format(type_id))
             try:
                 json = self.call('/universe/types/{0}/', type_id)  # type: dict
-                # some types, e.g. skill books, don't have the same fields
-                name = json.get('type_name') or json.get('name')
-                if name == None:
-                    name = 'unknown-{}'.format(type_id)
-                    is_error = True
-                description = json.get('type_description') or json.get('description')
-                if description == None:
-                    description = 'description not found'
-                    is_error = True
-                td = TypeData(type_id,
-                              name,
-                              description,
-                              json.get('group_id'),
-                              json.get('category_id', None),
-                              json.get('icon_id', None)  # missing, optional graphic_id
-                              )
             except Exception as e:
-                td = td or TypeData(type_id, 'unknown-' + str(type_id), 'unknown', 0, None, None)
-                is_error = True
-            if is_error:
-                # add to memory cache only so we don't look up via api again this session
-                print("Error getting type data for type_id {}:\nresponse: {}\nException: {}".format(type_id, str(json), e))
-                self.cache_manager.put_type_data(td, persist=False)
-            else:
-                self.cache_manager.put_type_data(td, persist=persist)
-                print("api lookup:", td)
+                error = e
+            td = self._store_type_json(type_id, json, error, persist)
+        return td
+
+    def _store_type_json(self, type_id, json: Optional[dict], error: Optional[Exception], persist=True) -> TypeData:
+        """ convert the /universe/types/ response to TypeData and cache it.  If the lookup failed a placeholder is
+            cached for this session, and if ESI said the type does not exist it goes in the negative cache """
+        is_incomplete = False
+        if error is None:
+            # some types, e.g. skill books, don't have the same fields
+            name = json.get('type_name') or json.get('name')
+            if name == None:
+                name = 'unknown-{}'.format(type_id)
+                error = 'name not found'
+            description = json.get('type_description') or json.get('description')
+            if description == None:
+                description = 'description not found'
+                is_incomplete = True
+            td = TypeData(type_id,
+                          name,
+                          description,
+                          json.get('group_id'),
+                          json.get('category_id', None),
+                          json.get('icon_id', None)  # missing, optional graphic_id
+                          )
+        else:
+            td = _unknown_type(type_id)
+        if error or is_incomplete:
+            # add to memory cache only so we don't look up via api again this session, ids ESI does not know also go
+            # in the negative cache so later sessions skip them.  Other failures are retried next session
+            print("Error getting type data for type_id {}:\nresponse: {}\nerror: {}".format(
+                type_id, str(json), error or 'description not found'))
+            if _is_not_found(error):
+                self.cache_manager.put_negative('type', type_id, str(error))
+            self.cache_manager.put_type_data(td, persist=False)
+        else:
+            self.cache_manager.put_type_data(td, persist=persist)
+            print("api lookup:", td)
         return td
 
     def get_region_id(self, region_name: str) -> Optional[int]:
@@ -124,69 +320,100 @@ class ESI_Api:
     def get_region_name(self, region_id: int) -> Optional[str]:
         return _region_id_dict.get(region_id, None)
 
-    def get_market_price(self, type_id: TypeId) -> float:
-        """ for now using global price.  In the future want to build a model of expected regional price based on
-            market orders and/or history.
+    def get_price_table(self) -> PriceTable:
+        """ the global average prices.  RegionalPrices builds tables from a region's orders and history on top of these
         """
-        price_dict = self.cache_manager.get_price_dict()
-        if not price_dict:
+        price_table = self.cache_manager.get_price_table()
+        if price_table is None:
             print("gettting market prices from api")
-            price_json = self.call('/markets/prices/')  # type: List[Dict]
-            price_list = map(lambda x: MarketPriceData(x['type_id'], x.get('average_price', None), x['adjusted_price']), price_json)
-            price_dict = {p.type_id: p for p in price_list}
-            self.cache_manager.put_price_dict(price_dict, datetime.now() + timedelta(hours=1))  # TODO: get expiration from the headers
-        pd = price_dict.get(type_id)
-        if not pd:
-            return 0.0  # no price found
-        else:
-            return pd.average_price or pd.adjusted_price
+            r = self.call_response('/markets/prices/')
+            price_json = r.json()  # type: List[Dict]
+            price_list = map(lambda x: MarketPriceData(x['type_id'], x.get('average_price', None), x.get('adjusted_price', None)), price_json)
+            price_table = PriceTable.from_price_data(price_list, get_expiration(r.headers, timedelta(hours=1)))
+            self.cache_manager.put_price_table(price_table)
+        return price_table
+
+    def get_market_price(self, type_id: TypeId) -> float:
+        return self.get_price_table().get_price(type_id)
+
+    def get_market_prices(self, type_ids) -> np.ndarray:
+        """ vectorised get_market_price, returns an array of prices aligned with type_ids """
+        return self.get_price_table().get_prices(type_ids)
 
     def market_orders(self) -> List[MarketOrderData]:
-        response = requests.get(self.xml_api_url + '/char/MarketOrders.xml.aspx',
-                                params={'characterID': self.character_id,
-                                        'accessToken': self.token_manager.get_token_data(self.character_name).access_token,
-                                        'accessType': 'character'
-                                        }
-                                )
-        try:
-            root = ET.fromstring(response.text)
-            result = []
-            for child in root.findall('./result/rowset/row'):
-                a = child.attrib
-                order_data = MarketOrderData(int(a['orderID']),  # order_id
-                                             int(a['charID']),  # character_id
-                                             self.character_name,  # character_name
-                                             int(a['stationID']),  # station_id
-                                             self.get_station_data(int(a['stationID'])).station_name,  # station_name
-                                             int(a['volEntered']),  # vol_entered
-                                             int(a['volRemaining']),  # vol_remaining
-                                             int(a['orderState']),  # TODO: make enum order_state
-                                             int(a['typeID']),  # type_id
-                                             self.get_type_data(a['typeID']).type_name,  # type_name
-                                             int(a['range']),  # range
-                                             int(a['duration']),  # duration
-                                             float(a['price']),  # price
-                                             "buy" if a['bid'] == "1" else "sell",  # order_type
-                                             float(a['escrow']),
-                                             datetime.strptime(a['issued'], '%Y-%m-%d %H:%M:%S')  # issued
-                                             )
-                result.append(order_data)
-            return result
-
-        except:
-            print('Error parsing response for {}', response.url)
-            print(response.text)
-            print(response.headers)
-            exit(1)
+        """ market orders from the XML api, parsed as the response downloads """
+        url = self.xml_api_url + '/char/MarketOrders.xml.aspx'
+        access_token = self.token_manager.get_token_data(self.character_name).access_token
+        with RunProfile.phase('fetch'):
+            response = self.scheduler.request(self.xml_session, 'GET', url, url,
+                                              params={'characterID': self.character_id,
+                                                      'accessToken': access_token,
+                                                      'accessType': 'character'
+                                                      },
+                                              stream=True)
+            if response.status_code != 200:
+                raise EsiHttpError(response.status_code, 'GET', url, response.text)
+            response.raw.decode_content = True
+            try:
+                orders = list(iter_xml_orders(response.raw, self.character_name))
+            except ET.ParseError as e:
+                print('Error parsing response for {}'.format(response.url))
+                print(response.headers)
+                raise EsiError("unable to parse response for {}".format(url)) from e
+        with RunProfile.phase('name resolution'):
+            return enrich_orders(orders, self, self.static_data)
+
+    def esi_market_orders(self) -> List[MarketOrderData]:
+        """ open market orders from ESI, streamed page by page """
+        orders = iter_esi_orders(self.iter_records('/characters/{}/orders/', self.character_id),
+                                 self.character_id, self.character_name)
+        return enrich_orders(orders, self, self.static_data)
 
     def wallet_balance(self) -> float:
-        wallet_bal = self.call('/characters/{}/wallet/', self.character_id)  # type: Float
+        with RunProfile.phase('fetch'):
+            wallet_bal = self.call('/characters/{}/wallet/', self.character_id)  # type: float
         return wallet_bal
 
     def put_historical_values(self, station_value: float, orders_value: float, escrow_value: float, ship_value: float, wallet_balance: float):
         self.cache_manager.put_historical_values(self.character_id, station_value, orders_value, escrow_value, ship_value, wallet_balance)
 
 
+def _is_not_found(error) -> bool:
+    """ True if the lookup failed because ESI does not know the id, not because of a timeout or server error """
+    return isinstance(error, EsiHttpError) and error.status_code == 404
+
+
+def _unknown_station(station_id) -> StationData:
+    return StationData(station_id, 'unknown-{}'.format(station_id), None)
+
+
+def _unknown_type(type_id) -> TypeData:
+    return TypeData(type_id, 'unknown-{}'.format(type_id), 'unknown', 0, None, None)
+
+
+def _make_response(url, headers: dict, body: bytes) -> requests.Response:
+    """ build a requests.Response for a cached body, so callers handle cached and live responses the same way """
+    r = requests.Response()
+    r.status_code = 200
+    r.reason = 'OK'
+    r.url = url
+    r.headers = CaseInsensitiveDict(headers)
+    r.encoding = 'utf-8'
+    r._content = body
+    return r
+
+
+def get_expiration(headers, default: timedelta) -> datetime:
+    """ local expiration time from the Expires header of an ESI response, now + default if the header is missing """
+    expires = headers.get('Expires')
+    if expires:
+        try:
+            return parsedate_to_datetime(expires).astimezone().replace(tzinfo=None)
+        except (TypeError, ValueError):
+            pass
+    return datetime.now() + default
+
+
 _region_id_dict = {
     10000054: 'Aridia',
     10000069: 'Black Rise',
@@ -264,7 +491,7 @@ class EveSSOAuth(AuthBase):
 
     def __call__(self, r):
         # modify and return the request
-        r.headers['Authorization'] = "Bearer " + self.token_manager.get_access_token(self.character_name)
+        r.headers['Authorization'] = "Bearer " + self.token_manager.get_cached_access_token(self.character_name)
         return r
 
 
@@ -0,0 +1,348 @@
+"""
+Record/replay stand-ins for ESI and the SSO server, for offline benchmarking and deterministic tests.
+
+record:   cassette = Cassette(); record_api(api, cassette); ...run report...; cassette.save(path)
+replay:   with FakeEsiServer(Cassette.load(path), latency=0.05) as server: server.configure(api) ...
+offline:  replay_api(api, Cassette.load(path)) replays in-process without any sockets
+"""
+import gzip
+import io
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+from requests.adapters import HTTPAdapter, BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+# never written to a cassette, in queries or in request and token response bodies
+_secret_params = frozenset(['accessToken'])
+_secret_fields = frozenset(['access_token', 'refresh_token', 'code', 'client_secret'])
+# headers that describe the recorded transfer rather than the content
+_transfer_headers = frozenset(['content-length', 'content-encoding', 'transfer-encoding', 'connection'])
+
+
+def _request_key(method: str, url: str, body: Optional[str], ignore_params=frozenset()) -> Tuple:
+    parts = urlsplit(url)
+    query = tuple(sorted((k, v) for k, v in parse_qsl(parts.query)
+                         if k not in _secret_params and k not in ignore_params))
+    return method.upper(), parts.path, query, _redact_body(body) or None
+
+
+class Cassette:
+    """ recorded interactions: request (method, url path, query, body) and response (status, headers, body, elapsed).
+        Stored as gzip compressed json lines """
+
+    version = 1
+
+    def __init__(self):
+        self.interactions = []  # type: List[dict]
+        self.lock = threading.Lock()
+        self._indexes = {}  # type: Dict[frozenset, Dict[Tuple, List[dict]]]  # by ignore_params
+        self._replay_counts = defaultdict(int)
+
+    def add(self, method: str, url: str, request_body: Optional[str], status: int, headers: dict, body: str,
+            elapsed: float):
+        parts = urlsplit(url)
+        if parts.path.endswith('/token'):
+            body = _redact_body(body)
+        query = [(k, v) for k, v in parse_qsl(parts.query) if k not in _secret_params]
+        with self.lock:
+            self.interactions.append({'method': method.upper(),
+                                      'path': parts.path,
+                                      'query': query,
+                                      'request_body': _redact_body(request_body),
+                                      'status': status,
+                                      'headers': {k: v for k, v in headers.items()
+                                                  if k.lower() not in _transfer_headers},
+                                      'body': body,
+                                      'elapsed': elapsed})
+            self._indexes.clear()
+
+    def find(self, method: str, url: str, body: Optional[str] = None, ignore_params=frozenset()) -> Optional[dict]:
+        """ the recorded interaction for the request.  Repeated requests get the recorded responses in order, the last
+            one repeats once they run out """
+        with self.lock:
+            ignore_params = frozenset(ignore_params)
+            index = self._indexes.get(ignore_params)
+            if index is None:
+                index = self._indexes[ignore_params] = defaultdict(list)
+                for i in self.interactions:
+                    url_of = i['path'] + '?' + urlencode([tuple(q) for q in i['query']])
+                    index[_request_key(i['method'], url_of, i['request_body'], ignore_params)].append(i)
+            key = _request_key(method, url, body, ignore_params)
+            matches = index.get(key)
+            if not matches:
+                return None
+            n = self._replay_counts[key]
+            self._replay_counts[key] += 1
+            return matches[min(n, len(matches) - 1)]
+
+    def save(self, filename: Path):
+        with gzip.open(str(filename), 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'version': Cassette.version}) + '\n')
+            for i in self.interactions:
+                f.write(json.dumps(i, separators=(',', ':')) + '\n')
+
+    @classmethod
+    def load(cls, filename: Path) -> 'Cassette':
+        cassette = cls()
+        with gzip.open(str(filename), 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != Cassette.version:
+                raise ValueError("unsupported cassette version {}".format(header.get('version')))
+            cassette.interactions = [json.loads(line) for line in f if line.strip()]
+        return cassette
+
+
+def _redact_body(body: Optional[str]) -> Optional[str]:
+    """ body with the values of _secret_fields replaced, for json objects and form-encoded bodies (the SSO token
+        requests).  Bodies without secrets are returned unchanged """
+    if not body:
+        return body
+    try:
+        d = json.loads(body)
+    except ValueError:
+        pairs = parse_qsl(body, keep_blank_values=True)
+        if not any(k in _secret_fields for k, _ in pairs):
+            return body
+        return urlencode([(k, 'recorded' if k in _secret_fields else v) for k, v in pairs])
+    if not isinstance(d, dict) or not _secret_fields.intersection(d):
+        return body
+    return json.dumps({k: 'recorded' if k in _secret_fields else v for k, v in d.items()})
+
+
+def _body_text(body) -> Optional[str]:
+    if body is None:
+        return None
+    return body.decode('utf-8') if isinstance(body, bytes) else str(body)
+
+
+class RecordingAdapter(HTTPAdapter):
+    """ transport adapter that sends requests normally and records every response in the cassette """
+
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        r = super().send(request, **kwargs)
+        body = r.content  # reads streamed responses too, iter_content then replays the read content
+        r.raw = _ContentStream(body)  # for callers reading the raw stream
+        self.cassette.add(request.method, request.url, _body_text(request.body), r.status_code, dict(r.headers),
+                          body.decode(r.encoding or 'utf-8', errors='replace'), time.perf_counter() - start)
+        return r
+
+
+class ReplayAdapter(BaseAdapter):
+    """ transport adapter that answers from the cassette without touching the network, 404 for unknown requests """
+
+    def __init__(self, cassette: Cassette, latency: float = 0.0):
+        super().__init__()
+        self.cassette = cassette
+        self.latency = latency
+
+    def send(self, request, **kwargs):
+        interaction = self.cassette.find(request.method, request.url, _body_text(request.body))
+        if self.latency:
+            time.sleep(self.latency)
+        r = requests.Response()
+        r.request = request
+        r.url = request.url
+        r.encoding = 'utf-8'
+        if interaction is None:
+            r.status_code = 404
+            r.reason = 'Not Recorded'
+            r.headers = CaseInsensitiveDict()
+            r._content = b'{"error": "not recorded"}'
+        else:
+            r.status_code = interaction['status']
+            r.reason = 'Replayed'
+            r.headers = CaseInsensitiveDict(interaction['headers'])
+            r._content = interaction['body'].encode('utf-8')
+        r.raw = _ContentStream(r._content)
+        return r
+
+    def close(self):
+        pass
+
+
+class _ContentStream:
+    """ minimal stand-in for urllib3's response, for code that reads response.raw directly """
+
+    def __init__(self, content: bytes):
+        self._stream = io.BytesIO(content)
+        self.decode_content = True
+
+    def read(self, *args, **kwargs):
+        return self._stream.read(*args)
+
+    def stream(self, chunk_size, decode_content=True):
+        while True:
+            chunk = self._stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _mount(session: requests.Session, adapter):
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+
+def record_api(api, cassette: Cassette):
+    """ record everything api (an ESI_Api) and its TokenManager send """
+    for session in (api.session, api.xml_session, api.token_manager.session):
+        _mount(session, RecordingAdapter(cassette))
+
+
+def replay_api(api, cassette: Cassette, latency: float = 0.0):
+    """ answer every request of api (an ESI_Api) and its TokenManager from the cassette, without a network """
+    for session in (api.session, api.xml_session, api.token_manager.session):
+        _mount(session, ReplayAdapter(cassette, latency))
+
+
+class FakeEsiHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self._replay(None)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self._replay(self.rfile.read(length).decode('utf-8') if length else None)
+
+    def _replay(self, body: Optional[str]):
+        server = self.server  # type: FakeEsiServer
+        server.count_request()
+        if server.latency:
+            time.sleep(server.latency)
+        parts = urlsplit(self.path)
+        if parts.path.endswith('/oauth/token'):
+            return self._send(200, {'Content-Type': 'application/json'}, json.dumps(
+                {'access_token': 'replay', 'refresh_token': 'replay', 'expires_in': 1200}).encode('utf-8'))
+        if server.inject_error():
+            return self._send(502, server.error_limit_headers(is_error=True), b'{"error": "injected failure"}')
+
+        page = int(dict(parse_qsl(parts.query)).get('page', 1))
+        interaction = None
+        if server.page_size is None:
+            interaction = server.cassette.find(self.command, self.path, body)
+        if interaction is None:
+            # fall back to the unpaged recording, split into pages of page_size if set
+            interaction = server.cassette.find(self.command, self.path, body, ignore_params=frozenset(['page']))
+        if interaction is None:
+            return self._send(404, server.error_limit_headers(is_error=True), b'{"error": "not recorded"}')
+
+        headers = dict(interaction['headers'])
+        payload = interaction['body'].encode('utf-8')
+        if server.page_size is not None and interaction['status'] == 200:
+            records = server.parsed_body(interaction)
+            if isinstance(records, list):
+                page_count = max(1, (len(records) + server.page_size - 1) // server.page_size)
+                headers['X-Pages'] = str(page_count)
+                payload = json.dumps(records[(page - 1) * server.page_size: page * server.page_size]).encode('utf-8')
+        headers.update(server.error_limit_headers(is_error=interaction['status'] >= 400))
+        self._send(interaction['status'], headers, payload)
+
+    def _send(self, status: int, headers: dict, payload: bytes):
+        self.send_response(status)
+        for k, v in headers.items():
+            if k.lower() not in _transfer_headers:
+                self.send_header(k, v)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeEsiServer(ThreadingHTTPServer):
+    """
+    Local HTTP server replaying a cassette as ESI, the XML api and the SSO token endpoint.
+
+    latency     seconds added to every response
+    page_size   re-paginate recorded JSON arrays into pages of this size (with X-Pages), None to replay as recorded
+    error_rate  fraction of requests answered with an injected 502, decided by a seeded random generator
+    error_limit the error budget reported in X-Esi-Error-Limit-Remain, reduced by every error response and restored
+                every error_window
+    """
+    daemon_threads = True
+
+    def __init__(self, cassette: Cassette, latency=0.0, page_size=None, error_rate=0.0, seed=0, error_limit=100,
+                 error_window=timedelta(seconds=60), port=0):
+        super().__init__(('127.0.0.1', port), FakeEsiHandler)
+        self.cassette = cassette
+        self.latency = latency
+        self.page_size = page_size
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.error_limit = error_limit
+        self.error_window = error_window
+        self.errors_remaining = error_limit
+        self.window_start = time.monotonic()
+        self.request_count = 0
+        self.parsed = {}
+        self.lock = threading.Lock()
+        self.url = 'http://127.0.0.1:{}'.format(self.server_address[1])
+        self.thread = None  # type: threading.Thread
+
+    def configure(self, api):
+        """ point an ESI_Api (and its TokenManager) at this server """
+        api.esi_api_url = self.url + '/latest'
+        api.xml_api_url = self.url
+        api.token_manager.oauth_url = self.url + '/oauth'
+
+    def parsed_body(self, interaction: dict):
+        """ the decoded json of a recorded response, decoded once for re-pagination """
+        with self.lock:
+            key = id(interaction)
+            if key not in self.parsed:
+                try:
+                    self.parsed[key] = json.loads(interaction['body'])
+                except ValueError:
+                    self.parsed[key] = None
+            return self.parsed[key]
+
+    def count_request(self):
+        with self.lock:
+            self.request_count += 1
+
+    def inject_error(self) -> bool:
+        with self.lock:
+            return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    def error_limit_headers(self, is_error: bool) -> dict:
+        with self.lock:
+            now = time.monotonic()
+            window = self.error_window.total_seconds()
+            if now - self.window_start >= window:
+                self.window_start = now
+                self.errors_remaining = self.error_limit
+            if is_error:
+                self.errors_remaining = max(0, self.errors_remaining - 1)
+            return {'X-Esi-Error-Limit-Remain': str(self.errors_remaining),
+                    'X-Esi-Error-Limit-Reset': str(max(1, int(window - (now - self.window_start))))}
+
+    def start(self) -> 'FakeEsiServer':
+        self.thread = threading.Thread(target=self.serve_forever, name='FakeEsiServer', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,76 @@
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+_unresolved = -2
+_on_path = -3
+
+
+class LocationTree:
+    """
+    Index of which asset holds which: an asset's location_id is the item_id of its ship or container when it is inside
+    one.  Built in one pass over the asset list, for each asset (by position in the list):
+      parent  index of the immediate container, -1 if the asset is directly in a station, structure or space
+      root    index of the outermost container holding it, the asset itself when it has no parent
+      ship    index of the nearest ship it is inside, -1 if none
+    Each asset's chain is walked once and the results reused by everything below it, so lookups are O(1) and nesting
+    depth does not matter.  A location loop in bad data is cut where it is found
+    """
+
+    def __init__(self, assets: Sequence[dict], is_ship: Callable[[dict], bool]):
+        self.assets = assets
+        index = {a['item_id']: i for i, a in enumerate(assets)}
+        parent = [index.get(a['location_id'], -1) for a in assets]
+        root = [_unresolved] * len(assets)
+        ship = [-1] * len(assets)
+        order = []  # containers before their contents
+        for i in range(len(assets)):
+            path = []
+            j = i
+            while root[j] == _unresolved:
+                root[j] = _on_path
+                path.append(j)
+                p = parent[j]
+                if p == -1:
+                    break
+                if root[p] == _on_path:
+                    parent[j] = -1
+                    break
+                j = p
+            for j in reversed(path):
+                p = parent[j]
+                if p == -1:
+                    root[j] = j
+                else:
+                    root[j] = root[p]
+                    ship[j] = p if is_ship(assets[p]) else ship[p]
+                order.append(j)
+        self.parent = np.array(parent, dtype=np.int64)
+        self.root = np.array(root, dtype=np.int64)
+        self.ship = np.array(ship, dtype=np.int64)
+        self.order = order  # type: List[int]
+
+    def __len__(self):
+        return len(self.assets)
+
+    def container(self, i: int) -> Optional[dict]:
+        p = self.parent[i]
+        return self.assets[p] if p >= 0 else None
+
+    def owning_ship(self, i: int) -> Optional[dict]:
+        s = self.ship[i]
+        return self.assets[s] if s >= 0 else None
+
+    def root_asset(self, i: int) -> dict:
+        return self.assets[self.root[i]]
+
+    def root_station_id(self, i: int) -> Optional[int]:
+        """ the station the asset is in, at any depth, None if it is not in a station """
+        r = self.assets[self.root[i]]
+        return r['location_id'] if r['location_type'] == 'station' else None
+
+    def root_station_ids(self) -> np.ndarray:
+        """ root_station_id of every asset, -1 where there is none """
+        top_stations = np.fromiter((a['location_id'] if a['location_type'] == 'station' else -1 for a in self.assets),
+                                   dtype=np.int64, count=len(self.assets))
+        return top_stations[self.root] if len(self.assets) else top_stations
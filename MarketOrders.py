@@ -0,0 +1,77 @@
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import BinaryIO, Iterable, Iterator, List
+
+from DataTypes import MarketOrderData
+from NameResolver import NameResolver
+
+# ESI order range names, as the numeric ranges used by the XML api
+_esi_ranges = {'station': -1, 'solarsystem': 0, 'region': 32767}
+
+
+def iter_xml_orders(stream: BinaryIO, character_name: str) -> Iterator[MarketOrderData]:
+    """ incrementally parse a MarketOrders.xml.aspx response.  Rows are converted (with integer keys) and discarded
+        as they are read, also from their rowset, station_name and type_name are left as None """
+    parents = []  # the open elements, the last one is the parent of the element that ends
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            parents.append(elem)
+            continue
+        parents.pop()
+        if elem.tag != 'row':
+            continue
+        a = elem.attrib
+        yield MarketOrderData(int(a['orderID']),  # order_id
+                              int(a['charID']),  # character_id
+                              character_name,  # character_name
+                              int(a['stationID']),  # station_id
+                              None,  # station_name
+                              int(a['volEntered']),  # vol_entered
+                              int(a['volRemaining']),  # vol_remaining
+                              int(a['orderState']),  # TODO: make enum order_state
+                              int(a['typeID']),  # type_id
+                              None,  # type_name
+                              int(a['range']),  # range
+                              int(a['duration']),  # duration
+                              float(a['price']),  # price
+                              "buy" if a['bid'] == "1" else "sell",  # order_type
+                              float(a['escrow']),
+                              datetime.strptime(a['issued'], '%Y-%m-%d %H:%M:%S')  # issued
+                              )
+        elem.clear()
+        if parents:
+            parents[-1].remove(elem)
+
+
+def iter_esi_orders(records: Iterable[dict], character_id: int, character_name: str) -> Iterator[MarketOrderData]:
+    """ convert /characters/{id}/orders/ records to MarketOrderData, station_name and type_name are left as None """
+    for o in records:
+        order_range = o.get('range', 'region')
+        yield MarketOrderData(o['order_id'],
+                              character_id,
+                              character_name,
+                              o['location_id'],
+                              None,
+                              o['volume_total'],
+                              o['volume_remain'],
+                              0,  # only open orders are listed
+                              o['type_id'],
+                              None,
+                              _esi_ranges[order_range] if order_range in _esi_ranges else int(order_range),
+                              o['duration'],
+                              float(o['price']),
+                              "buy" if o.get('is_buy_order') else "sell",
+                              float(o.get('escrow', 0.0)),
+                              datetime.strptime(o['issued'], '%Y-%m-%dT%H:%M:%SZ'))
+
+
+def enrich_orders(orders: Iterable[MarketOrderData], api, static_data=None) -> List[MarketOrderData]:
+    """ resolve the stations and types of all orders in one batch, then fill in station_name and type_name """
+    orders = list(orders)
+    resolver = NameResolver(api, static_data)
+    resolver.add_station_ids(o.station_id for o in orders)
+    resolver.add_type_ids(o.type_id for o in orders)
+    resolver.resolve()
+    station_names = {x: api.get_station_data(x).station_name for x in {o.station_id for o in orders}}
+    type_names = {x: api.get_type_data(x).type_name for x in {o.type_id for o in orders}}
+    return [o._replace(station_name=station_names[o.station_id], type_name=type_names[o.type_id]) for o in orders]
@@ -1,32 +1,127 @@
-from typing import List
+from datetime import date, datetime
+from html import escape
+from pathlib import Path
+from typing import List, Sequence, Tuple
 
-from plotly.graph_objs import Scatter
-
-import CacheManager
-import TokenManager
-from plotly import plotly
-from plotly import graph_objs
+import numpy as np
 
+import Config
+import Context
 from DataTypes import AssetValues
 
+# stacked from the bottom up: (label, AssetValues field, color)
+SERIES = (('station value', 'station_value', 'rgba(227, 119, 194, 0.75)'),
+          ('orders value', 'orders_value', 'rgba(250, 25, 25, 0.75)'),
+          ('escrow value', 'escrow_value', 'rgba(50, 125, 25, 0.75)'),
+          ('ships value', 'ship_value', 'rgba(12, 12, 250, 0.75)'),
+          ('wallet balance', 'wallet_balance', 'rgba(77, 255, 72, 0.75)'))
+
+CHART_FILENAME = 'chart-{}.html'
+DASHBOARD_FILENAME = 'charts.html'
+
+_style = ('body{font-family:sans-serif;margin:2em}svg{display:block;margin-bottom:2em}'
+          'svg text{font-size:11px}svg .title{font-size:14px;font-weight:bold}')
+
+
+def stack_values(totals: Sequence[AssetValues]) -> Tuple[List[date], np.ndarray, np.ndarray]:
+    """ (dates, values, stacked), values has a row per SERIES entry and a column per date, stacked is its cumulative
+        sum down the rows, i.e. the top edge of each layer of the chart """
+    dates = [v.date if isinstance(v.date, date) else date.fromisoformat(str(v.date)[:10]) for v in totals]
+    values = np.array([[getattr(v, field) or 0.0 for v in totals] for _, field, _ in SERIES],
+                      dtype=np.float64).reshape(len(SERIES), len(totals))
+    return dates, values, np.cumsum(values, axis=0)
+
+
+def _isk(value: float) -> str:
+    for limit, suffix in ((1e12, 'T'), (1e9, 'B'), (1e6, 'M'), (1e3, 'k')):
+        if abs(value) >= limit:
+            return '{:,.1f}{}'.format(value / limit, suffix)
+    return '{:,.0f}'.format(value)
+
+
+def render_svg(title: str, totals: Sequence[AssetValues], width=900, height=320, margin=60) -> str:
+    """ self-contained SVG stacked area chart of the values, one layer per SERIES entry """
+    dates, values, stacked = stack_values(totals)
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{1}" viewBox="0 0 {0} {1}">'.format(
+        width, height), '<text class="title" x="{}" y="20">{}</text>'.format(margin, escape(title))]
+    bottom, top, right = height - margin, margin, width - 150  # legend to the right of the plot
+    if len(dates) == 0:
+        parts.append('<text x="{}" y="{}">no history</text></svg>'.format(margin, height // 2))
+        return '\n'.join(parts)
+
+    days = np.array([d.toordinal() for d in dates], dtype=np.float64)
+    span = days[-1] - days[0]
+    x = (margin + (days - days[0]) / span * (right - margin) if span > 0 else
+         np.full(len(days), (margin + right) / 2.0))
+    low = min(0.0, float(stacked.min()))
+    high = max(float(stacked.max()), low + 1.0)
+    y = bottom - (np.vstack([np.zeros(len(days)), stacked]) - low) / (high - low) * (bottom - top)
+
+    for k, (label, _, color) in enumerate(SERIES):
+        upper = ' '.join('{:.1f},{:.1f}'.format(a, b) for a, b in zip(x.tolist(), y[k + 1].tolist()))
+        lower = ' '.join('{:.1f},{:.1f}'.format(a, b) for a, b in zip(x[::-1].tolist(), y[k][::-1].tolist()))
+        parts.append('<polygon points="{} {}" fill="{}" stroke="{}" stroke-width="0.5"><title>{} {}</title>'
+                     '</polygon>'.format(upper, lower, color, color, label, _isk(values[k, -1])))
+        parts.append('<rect x="{}" y="{}" width="10" height="10" fill="{}"/><text x="{}" y="{}">{}</text>'.format(
+            right + 10, top + 16 * k, color, right + 24, top + 16 * k + 9, label))
+    for fraction in (0.0, 0.5, 1.0):
+        value = low + fraction * (high - low)
+        level = bottom - fraction * (bottom - top)
+        parts.append('<line x1="{0}" x2="{1}" y1="{2:.1f}" y2="{2:.1f}" stroke="#ccc"/>'
+                     '<text x="{3}" y="{4:.1f}" text-anchor="end">{5}</text>'.format(
+                         margin, right, level, margin - 4, level + 4, _isk(value)))
+    parts.append('<text x="{}" y="{}">{}</text><text x="{}" y="{}" text-anchor="end">{}</text>'.format(
+        margin, bottom + 16, dates[0], right, bottom + 16, dates[-1]))
+    parts.append('<text x="{}" y="{}">net worth {} isk</text>'.format(margin, bottom + 34, _isk(stacked[-1, -1])))
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def _html_page(title: str, body: str) -> str:
+    return ('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{0}</title><style>{1}</style></head><body>\n'
+            '{2}\n</body></html>\n'.format(escape(title), _style, body))
+
+
 class MoneyChart:
-    def __init__(self, cache_manager=CacheManager.CacheManager(), token_manager=TokenManager.TokenManager()):
-        self.cache_manager = cache_manager
-        self.token_manager = token_manager
+    def __init__(self, cache_manager=None, token_manager=None):
+        """ the managers default to the shared ones from Context.  plotly is only imported when a chart is uploaded """
+        self.cache_manager = cache_manager or Context.cache_manager()
+        self.token_manager = token_manager or Context.token_manager()
 
-    def get_totals_for_character(self, character_name: str) -> List[AssetValues]:
-        return self.cache_manager.get_historical_values(self.token_manager.get_character_id(character_name))
+    def get_totals_for_character(self, character_name: str, start: date = None, end: date = None,
+                                 max_points: int = None) -> List[AssetValues]:
+        """ values ordered by date, downsampled to weekly/monthly closing values if there are more than max_points """
+        return self.cache_manager.get_historical_values(self.token_manager.get_character_id(character_name),
+                                                        start, end, max_points)
 
+    def write_charts(self, character_names: Sequence[str], directory: Path = None, start: date = None,
+                     end: date = None, max_points=500) -> Path:
+        """ writes a self-contained html chart for each character (chart-{name}.html, linked from the html reports)
+            and a dashboard page with all of them, returns the dashboard's filename.  Nothing is sent over the
+            network, long histories are read as weekly or monthly values so a chart has at most max_points """
+        directory = directory or Config.dataDir / 'Reports'
+        directory.mkdir(parents=True, exist_ok=True)
+        svgs = []
+        for character_name in character_names:
+            totals = self.get_totals_for_character(character_name, start, end, max_points)
+            svg = render_svg('Asset Values for {}'.format(character_name), totals)
+            svgs.append(svg)
+            with (directory / CHART_FILENAME.format(character_name)).open('w', encoding='utf-8') as f:
+                f.write(_html_page('Asset Values for {}'.format(character_name), svg))
+        dashboard = directory / DASHBOARD_FILENAME
+        with dashboard.open('w', encoding='utf-8') as f:
+            f.write(_html_page('Asset Values, {:%Y-%m-%d %H:%M}'.format(datetime.now()), '\n'.join(svgs)))
+        print("chart filename = {}".format(dashboard))
+        return dashboard
 
-    def generate_data(self, dates, values, name: str, color, cumulative_with: Scatter = None) -> Scatter:
-        if cumulative_with is not None:
-            print(cumulative_with)
-        y_vals = values if cumulative_with is None else [sum(x) for x in zip(values, cumulative_with.get('y'))]
+    def generate_data(self, dates, values, stacked, name: str, color) -> 'Scatter':
+        """ one layer of the plotly chart, stacked is the top edge of the layer """
+        from plotly import graph_objs
         return graph_objs.Scatter(
             name=name,
             x=dates,
-            y=y_vals,
-            text=['{:,.2f}'.format(x) for x in values],
+            y=stacked.tolist(),
+            text=['{:,.2f}'.format(x) for x in values.tolist()],
             hoverinfo='x+text',
             mode='lines+markers',
             line={
@@ -42,28 +137,18 @@ class MoneyChart:
             }
         )
 
-
-    def generate_chart(self, character_name):
-        totals = self.get_totals_for_character(character_name)
-        dates = [x.date for x in totals]
-        station_val = [x.station_value for x in totals]
-        orders_val = [x.orders_value for x in totals]
-        escrow_val = [x.escrow_value for x in totals]
-        ship_val = [x.ship_value for x in totals]
-        wallet_val = [x.wallet_balance for x in totals]
-        d1 = self.generate_data(dates, station_val, 'station value', 'rgb(227,119,194,75)')
-        d2 = self.generate_data(dates, orders_val, 'orders value', 'rgb(250, 25, 25, 75)', cumulative_with=d1)
-        d3 = self.generate_data(dates, escrow_val, 'escrow value', 'rgb(50, 125, 25, 75)', cumulative_with=d2)
-        d4 = self.generate_data(dates, ship_val, 'ships value', 'rgb(12, 12, 250, 75', cumulative_with=d3)
-        d5 = self.generate_data(dates, wallet_val, 'wallet balance', 'rgb(77, 255, 72, 75', cumulative_with=d4)
-        data = [d1, d2, d3, d4, d5]
+    def generate_chart(self, character_name, start: date = None, end: date = None, max_points=500):
+        """ uploads the chart to plotly, write_charts renders the same chart locally """
+        totals = self.get_totals_for_character(character_name, start, end, max_points)
+        dates, values, stacked = stack_values(totals)
+        data = [self.generate_data(dates, values[k], stacked[k], name, color)
+                for k, (name, _, color) in enumerate(SERIES)]
+        from plotly import plotly
+        from plotly import graph_objs
         fig = graph_objs.Figure(data=data, layout={'title': 'Asset Values for {}'.format(character_name)})
         plotly.plot(fig, filename='{} Assets'.format(character_name), fileopt='overwrite')
 
 
 if __name__ == '__main__':
     mc = MoneyChart()
-
-    mc.generate_chart('Brand Wessa')
-    mc.generate_chart('Tansy Dabs')
-    mc.generate_chart('Tabash Masso')
+    mc.write_charts(['Brand Wessa', 'Tansy Dabs', 'Tabash Masso'])
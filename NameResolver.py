@@ -0,0 +1,159 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Set, Tuple
+
+from AssetRecord import AssetRecord
+from DataTypes import StationData, TypeData, SystemData
+from RequestScheduler import EsiHttpError
+
+
+class NameResolver:
+    """
+    Resolves station, type and solar system ids in bulk.  Ids are collected first (add_* methods), then resolve()
+    looks up every id that is not already cached with POST /universe/names/, up to 1000 ids per request.
+
+    /universe/names/ only returns names, so the solar system of a station and the description, group and category of a
+    type come from the static data when it is available.  Without static data stations and types are looked up with
+    the per-id endpoints only, they return the names as well, and just the systems go through /universe/names/.
+    Everything resolved is written to the CacheManager in a single transaction, ids that can't be resolved go in the
+    negative cache.  Other failures (5xx, timeouts, the error limit) are raised and nothing is negatively cached.
+    """
+
+    names_chunk_size = 1000
+
+    def __init__(self, api, static_data=None, max_workers=8):
+        """ api is an ESI_Api, static_data an optional StaticDataAccessor """
+        self.api = api
+        self.cache_manager = api.cache_manager
+        self.static_data = static_data
+        self.max_workers = max_workers
+        self.station_ids = set()  # type: Set[int]
+        self.type_ids = set()  # type: Set[int]
+        self.system_ids = set()  # type: Set[int]
+
+    def add_station_ids(self, station_ids: Iterable[int]):
+        self.station_ids.update(int(x) for x in station_ids)
+
+    def add_type_ids(self, type_ids: Iterable[int]):
+        self.type_ids.update(int(x) for x in type_ids)
+
+    def add_system_ids(self, system_ids: Iterable[int]):
+        self.system_ids.update(int(x) for x in system_ids)
+
+    def add_assets(self, asset_list: Iterable[AssetRecord]):
+        for a in asset_list:
+            if a['location_type'] == 'station':
+                self.station_ids.add(a['location_id'])
+            self.type_ids.add(a['type_id'])
+
+    def resolve(self) -> int:
+        """ look up all collected ids that are not cached yet, returns the number of ids looked up """
+        cm = self.cache_manager
+        stations = self._unknown('station', self.station_ids, cm.get_station_data)
+        types = self._unknown('type', self.type_ids, cm.get_type_data)
+        systems = self._unknown('system', self.system_ids, cm.get_system_data)
+        self.station_ids, self.type_ids, self.system_ids = set(), set(), set()
+        if len(stations) + len(types) + len(systems) == 0:
+            return 0
+
+        if self.static_data is None:
+            names = self._get_names(systems)
+            station_data = [StationData(x, json['name'], json['system_id'])
+                            for x, json in self._fetch_named('station', '/universe/stations/{}/', stations).items()]
+            type_data = [TypeData(x, json['name'], json.get('description') or 'description not found',
+                                  json.get('group_id'), json.get('category_id'), None)
+                         for x, json in self._fetch_named('type', '/universe/types/{}/', types).items()]
+        else:
+            names = self._get_names(stations + types + systems)
+            station_data = self._station_data(stations, names)
+            type_data = self._type_data(types, names)
+        system_data = []
+        for system_id in systems:
+            if ('solar_system', system_id) in names:
+                system_data.append(SystemData(system_id, names[('solar_system', system_id)]))
+            else:
+                cm.put_negative('system', system_id, 'not found by /universe/names/')
+        cm.put_many(station_data, type_data, system_data)
+        print("resolved {} stations, {} types, {} systems".format(len(stations), len(types), len(systems)))
+        return len(stations) + len(types) + len(systems)
+
+    def _unknown(self, kind: str, ids: Iterable[int], cache_lookup) -> List[int]:
+        return sorted(x for x in ids if cache_lookup(x) is None and not self.cache_manager.get_negative(kind, x))
+
+    def _get_names(self, ids: List[int]) -> Dict[Tuple[str, int], str]:
+        """ (category, id) -> name for every id /universe/names/ knows """
+        names = {}
+        for i in range(0, len(ids), self.names_chunk_size):
+            self._post_names(ids[i:i + self.names_chunk_size], names)
+        return names
+
+    def _post_names(self, ids: List[int], names: Dict[Tuple[str, int], str]):
+        """ the whole request fails with a 404 if any id is invalid, so on a 404 split the ids to isolate the bad ones
+        """
+        try:
+            result = self.api.call_post('/universe/names/', ids)
+        except EsiHttpError as e:
+            if e.status_code != 404:
+                raise
+            if len(ids) == 1:
+                print("Error resolving name for id {}: {}".format(ids[0], e))
+                return
+            middle = len(ids) // 2
+            self._post_names(ids[:middle], names)
+            self._post_names(ids[middle:], names)
+            return
+        names.update(((x['category'], x['id']), x['name']) for x in result)
+
+    def _fetch_named(self, kind: str, path: str, ids: List[int]) -> Dict[int, dict]:
+        """ call path for each id concurrently, returns the responses.  Ids ESI reports as not found go in the
+            negative cache, other failures are raised """
+        def fetch(x):
+            try:
+                return x, self.api.call(path, x)
+            except EsiHttpError as e:
+                if e.status_code != 404:
+                    raise
+                self.cache_manager.put_negative(kind, x, str(e))
+                return x, None
+        if len(ids) == 0:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return {x: json for x, json in executor.map(fetch, ids) if json is not None}
+
+    def _fetch_each(self, path: str, ids: List[int]) -> Dict[int, dict]:
+        """ call path for each id concurrently, returns the responses of the calls that succeeded """
+        def fetch(x):
+            try:
+                return x, self.api.call(path, x)
+            except Exception as e:
+                print("Error calling {} for {}: {}".format(path, x, e))
+                return x, None
+        if len(ids) == 0:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return {x: json for x, json in executor.map(fetch, ids) if json is not None}
+
+    def _station_data(self, station_ids: List[int], names: Dict[Tuple[str, int], str]) -> List[StationData]:
+        named = [x for x in station_ids if ('station', x) in names]
+        for x in set(station_ids).difference(named):
+            self.cache_manager.put_negative('station', x, 'not found by /universe/names/')
+        systems = self.static_data.get_systems_for_stations(named)
+        fetched = self._fetch_each('/universe/stations/{}/', [x for x in named if x not in systems])
+        systems.update((x, json['system_id']) for x, json in fetched.items())
+        # stations without a system are kept for this session only, so they are looked up again next time
+        self.cache_manager.put_station_data_many((StationData(x, names[('station', x)], None)
+                                                  for x in named if x not in systems), persist=False)
+        return [StationData(x, names[('station', x)], systems[x]) for x in named if x in systems]
+
+    def _type_data(self, type_ids: List[int], names: Dict[Tuple[str, int], str]) -> List[TypeData]:
+        named = [x for x in type_ids if ('inventory_type', x) in names]
+        for x in set(type_ids).difference(named):
+            self.cache_manager.put_negative('type', x, 'not found by /universe/names/')
+        details = self.static_data.get_type_details(named)
+        fetched = self._fetch_each('/universe/types/{}/', [x for x in named if x not in details])
+        details.update((x, (json.get('description') or 'description not found',
+                            json.get('group_id'),
+                            json.get('category_id', None))) for x, json in fetched.items())
+        self.cache_manager.put_type_data_many((TypeData(x, names[('inventory_type', x)], 'description not found', None,
+                                                        None, None)
+                                               for x in named if x not in details), persist=False)
+        return [TypeData(x, names[('inventory_type', x)], *details[x], None) for x in named if x in details]
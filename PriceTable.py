@@ -0,0 +1,114 @@
+import hashlib
+import os
+import struct
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from DataTypes import MarketPriceData, TypeId
+
+
+class PriceTable:
+    """
+    Market prices stored as sorted parallel arrays (type_id, average_price, adjusted_price).  Persisted as a flat
+    binary file that is memory-mapped on load, so reading the table does not need to unpickle anything.
+
+    file layout:  header (magic, version, row count, expiration as posix timestamp), then the type_id column (int64),
+    the average_price column (float64, NaN when missing) and the adjusted_price column (float64, NaN when missing)
+    """
+    __magic = b'PRCT'
+    __version = 1
+    __header = struct.Struct('<4sIqd')
+
+    def __init__(self, type_ids: np.ndarray, average_prices: np.ndarray, adjusted_prices: np.ndarray,
+                 expiration: datetime):
+        self.type_ids = type_ids
+        self.average_prices = average_prices
+        self.adjusted_prices = adjusted_prices
+        self.expiration = expiration
+        # price used for valuations: average price, falling back to the adjusted price when there is no average
+        average = np.nan_to_num(average_prices, nan=0.0)
+        self.effective_prices = np.where(average != 0.0, average, np.nan_to_num(adjusted_prices, nan=0.0))
+        self._digest = None  # type: Optional[str]
+
+    def __len__(self):
+        return len(self.type_ids)
+
+    @classmethod
+    def from_price_data(cls, price_data: Iterable[MarketPriceData], expiration: datetime) -> 'PriceTable':
+        rows = sorted(price_data, key=lambda p: p.type_id)
+        type_ids = np.fromiter((p.type_id for p in rows), dtype=np.int64, count=len(rows))
+        average = np.array([np.nan if p.average_price is None else p.average_price for p in rows], dtype=np.float64)
+        adjusted = np.array([np.nan if p.adjusted_price is None else p.adjusted_price for p in rows], dtype=np.float64)
+        return cls(type_ids, average, adjusted, expiration)
+
+    def digest(self) -> str:
+        """ sha1 of the three columns, identifies the prices independently of where and when they were fetched """
+        if self._digest is None:
+            digest = hashlib.sha1()
+            for column in (self.type_ids, self.average_prices, self.adjusted_prices):
+                digest.update(np.ascontiguousarray(column).tobytes())
+            self._digest = digest.hexdigest()
+        return self._digest
+
+    def is_expired(self) -> bool:
+        return self.expiration <= datetime.now()
+
+    def get_price(self, type_id: TypeId) -> float:
+        """ effective price of a single type, 0.0 if the type has no price """
+        i = np.searchsorted(self.type_ids, type_id)
+        if i < len(self.type_ids) and self.type_ids[i] == type_id:
+            return float(self.effective_prices[i])
+        return 0.0
+
+    def get_prices(self, type_ids) -> np.ndarray:
+        """ vectorised lookup, returns an array of effective prices aligned with type_ids (0.0 where unknown) """
+        type_ids = np.asarray(type_ids, dtype=np.int64)
+        if len(self.type_ids) == 0:
+            return np.zeros(type_ids.shape, dtype=np.float64)
+        idx = np.searchsorted(self.type_ids, type_ids)
+        np.clip(idx, 0, len(self.type_ids) - 1, out=idx)
+        found = self.type_ids[idx] == type_ids
+        return np.where(found, self.effective_prices[idx], 0.0)
+
+    def save(self, filename: Path):
+        """ written to a temporary file that then replaces filename, tables loaded from the old file keep their
+            memory map of it (truncating a mapped file in place crashes the readers) """
+        count = len(self.type_ids)
+        fd, temp_name = tempfile.mkstemp(prefix=filename.name, suffix='.tmp', dir=str(filename.parent))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(PriceTable.__header.pack(PriceTable.__magic, PriceTable.__version, count,
+                                                 self.expiration.timestamp()))
+                f.write(np.ascontiguousarray(self.type_ids, dtype='<i8').tobytes())
+                f.write(np.ascontiguousarray(self.average_prices, dtype='<f8').tobytes())
+                f.write(np.ascontiguousarray(self.adjusted_prices, dtype='<f8').tobytes())
+            os.replace(temp_name, str(filename))
+        except BaseException:
+            os.unlink(temp_name)
+            raise
+
+    @classmethod
+    def load(cls, filename: Path) -> Optional['PriceTable']:
+        """ memory-map a saved table, returns None if the file is missing, truncated or not a price table """
+        if not filename.exists():
+            return None
+        header_size = PriceTable.__header.size
+        with filename.open('rb') as f:
+            header = f.read(header_size)
+        if len(header) < header_size:
+            return None
+        magic, version, count, expiration = PriceTable.__header.unpack(header)
+        if magic != PriceTable.__magic or version != PriceTable.__version:
+            return None
+        if filename.stat().st_size < header_size + 3 * 8 * count:
+            return None
+        if count == 0:
+            empty = np.zeros(0, dtype=np.float64)
+            return cls(np.zeros(0, dtype=np.int64), empty, empty, datetime.fromtimestamp(expiration))
+        columns = np.memmap(str(filename), dtype='<f8', mode='r', offset=header_size, shape=(3, count))
+        type_ids = np.memmap(str(filename), dtype='<i8', mode='r', offset=header_size, shape=(count,))
+        return cls(type_ids, columns[1], columns[2], datetime.fromtimestamp(expiration))
@@ -0,0 +1,203 @@
+"""
+Regional price model: prices from the order books and trade history of a region instead of CCP's global average.
+
+modes
+    global   the global average price from /markets/prices/ (what get_market_price has always used)
+    sell     volume-weighted low percentile of the region's sell orders, what the goods can be bought for
+    buy      volume-weighted high percentile of the region's buy orders, what they can be sold for right away
+    split    halfway between sell and buy
+    history  volume-weighted average of the daily average prices over the history window
+Types without a regional price fall back to the global price.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, date
+from typing import Iterable, Tuple
+
+import numpy as np
+
+import RunProfile
+from PriceTable import PriceTable
+from RequestScheduler import EsiHttpError
+
+PRICING_MODES = ('global', 'sell', 'buy', 'split', 'history')
+
+
+def order_arrays(orders: Iterable[dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """ (type_id, is_buy_order, price, volume_remain) columns of ESI market order records """
+    orders = orders if isinstance(orders, list) else list(orders)
+    n = len(orders)
+    return (np.fromiter((o['type_id'] for o in orders), dtype=np.int64, count=n),
+            np.fromiter((o['is_buy_order'] for o in orders), dtype=bool, count=n),
+            np.fromiter((o['price'] for o in orders), dtype=np.float64, count=n),
+            np.fromiter((o['volume_remain'] for o in orders), dtype=np.float64, count=n))
+
+
+def weighted_percentile(type_ids: np.ndarray, prices: np.ndarray, volumes: np.ndarray,
+                        q: float) -> Tuple[np.ndarray, np.ndarray]:
+    """ per type, the price at which the cumulative volume (cheapest first) reaches fraction q of the type's total
+        volume.  Returns (sorted distinct type ids, prices) """
+    if len(type_ids) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    order = np.lexsort((prices, type_ids))
+    type_ids, prices, volumes = type_ids[order], prices[order], volumes[order]
+    types, starts, counts = np.unique(type_ids, return_index=True, return_counts=True)
+    group = np.repeat(np.arange(len(types)), counts)
+    cumulative = np.cumsum(volumes)
+    before_group = np.concatenate(([0.0], cumulative))[starts]
+    totals = np.add.reduceat(volumes, starts)
+    # fraction of the group's volume at or below each order, offset by the group number so one sorted search
+    # finds the first order reaching q in every group
+    fraction = (cumulative - before_group[group]) / np.where(totals > 0, totals, 1.0)[group]
+    idx = np.searchsorted(group + np.minimum(fraction, 1.0), np.arange(len(types)) + q)
+    idx = np.minimum(idx, starts + counts - 1)
+    return types, prices[idx]
+
+
+def order_book_prices(type_ids: np.ndarray, is_buy: np.ndarray, prices: np.ndarray, volumes: np.ndarray,
+                      q=0.05) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ (type ids, sell price, buy price) from an order book.  The sell price is the q percentile of sell orders by
+        volume from the cheapest, the buy price the q percentile of buy orders from the highest; a few units listed
+        far below or above the market do not move them.  NaN where a type has no orders on that side """
+    sell_types, sell_prices = weighted_percentile(type_ids[~is_buy], prices[~is_buy], volumes[~is_buy], q)
+    buy_types, buy_prices = weighted_percentile(type_ids[is_buy], -prices[is_buy], volumes[is_buy], q)
+    types = np.union1d(sell_types, buy_types)
+    sell = np.full(len(types), np.nan)
+    buy = np.full(len(types), np.nan)
+    sell[np.searchsorted(types, sell_types)] = sell_prices
+    buy[np.searchsorted(types, buy_types)] = -buy_prices
+    return types, sell, buy
+
+
+def history_vwap(type_ids: np.ndarray, averages: np.ndarray, volumes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ (type ids, volume-weighted average price) over daily history rows """
+    types, codes = np.unique(type_ids, return_inverse=True)
+    traded = np.bincount(codes, weights=volumes, minlength=len(types))
+    turnover = np.bincount(codes, weights=averages * volumes, minlength=len(types))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return types, np.where(traded > 0, turnover / traded, np.nan)
+
+
+def model_prices(mode: str, order_book: Tuple[np.ndarray, np.ndarray, np.ndarray] = None,
+                 history: Tuple[np.ndarray, np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """ (type ids, price) for the pricing mode, NaN where there is no regional price """
+    if mode == 'history':
+        return history
+    types, sell, buy = order_book
+    if mode == 'sell':
+        return types, sell
+    if mode == 'buy':
+        return types, buy
+    if mode == 'split':
+        return types, np.where(np.isnan(buy), sell, np.where(np.isnan(sell), buy, (sell + buy) / 2))
+    raise ValueError("unknown pricing mode {}".format(mode))
+
+
+def pricing_region_id(api, region_name: str) -> int:
+    """ the id of the named region, checked before a run so a misspelled name fails up front """
+    region_id = api.get_region_id(region_name)
+    if region_id is None:
+        raise ValueError("unknown pricing region {!r}".format(region_name))
+    return region_id
+
+
+class RegionalPrices:
+    """
+    Builds and caches a PriceTable per region and pricing mode.  The order book pages are downloaded concurrently and
+    history per type in a thread pool, all through the api's response cache so repeated runs only revalidate what
+    expired.  The table itself is kept by the CacheManager for max_age
+    """
+
+    def __init__(self, api, history_days=30, q=0.05, max_age=timedelta(hours=1), max_workers=8):
+        self.api = api
+        self.history_days = history_days
+        self.q = q
+        self.max_age = max_age
+        self.max_workers = max_workers
+
+    def get_price_table(self, mode: str, region_id: int = 10000002, type_ids: Iterable[int] = ()) -> PriceTable:
+        """ the price table for mode in the region (default The Forge).  type_ids lists the types that need history,
+            only used by the history mode: the history of types not in the cached table is fetched and merged in """
+        if mode not in PRICING_MODES:
+            raise ValueError("unknown pricing mode {}, expected one of {}".format(mode, PRICING_MODES))
+        if region_id is None and mode != 'global':
+            raise ValueError("no region for pricing mode {}".format(mode))
+        with RunProfile.phase('pricing'):
+            global_prices = self.api.get_price_table()
+            if mode == 'global':
+                return global_prices
+            name = '{}-{}'.format(region_id, mode)
+            price_table = self.api.cache_manager.get_price_table(name)
+            if mode == 'history':
+                return self._history_table(name, price_table, region_id, type_ids, global_prices)
+            if price_table is not None:
+                return price_table
+            order_book = order_book_prices(*self.order_arrays(region_id), q=self.q)
+            types, prices = model_prices(mode, order_book=order_book)
+            price_table = self._with_fallback(types, prices, global_prices)
+            self.api.cache_manager.put_price_table(price_table, name)
+            return price_table
+
+    def _history_table(self, name: str, price_table: PriceTable, region_id: int, type_ids: Iterable[int],
+                       global_prices: PriceTable) -> PriceTable:
+        """ every type whose history was fetched has an average price in the table, its global price if it has no
+            history in the window, so the types still to fetch are those without one.  The merged table keeps the
+            expiration of the cached one """
+        missing = np.fromiter(set(type_ids), dtype=np.int64)
+        if price_table is not None:
+            known = ~np.isnan(price_table.average_prices)
+            missing = np.setdiff1d(missing, price_table.type_ids[known])
+            if len(missing) == 0:
+                return price_table
+        missing = np.unique(missing)
+        types, prices = model_prices('history', history=history_vwap(*self.history_arrays(region_id,
+                                                                                             missing.tolist())))
+        missing_prices = global_prices.get_prices(missing)
+        priced = ~np.isnan(prices)
+        missing_prices[np.searchsorted(missing, types[priced])] = prices[priced]
+        if price_table is None:
+            types, prices, expiration = missing, missing_prices, None
+        else:
+            types = np.concatenate((price_table.type_ids[known], missing))
+            prices = np.concatenate((price_table.average_prices[known], missing_prices))
+            expiration = price_table.expiration
+        order = np.argsort(types)
+        price_table = self._with_fallback(types[order], prices[order], global_prices, expiration)
+        self.api.cache_manager.put_price_table(price_table, name)
+        return price_table
+
+    def order_arrays(self, region_id: int):
+        print("getting market orders for region {}".format(region_id))
+        columns = [order_arrays(page) for page in self.api.iter_pages('/markets/{}/orders/', region_id,
+                                                                       max_workers=self.max_workers)]
+        return tuple(np.concatenate(c) for c in zip(*columns)) if columns else order_arrays([])
+
+    def history_arrays(self, region_id: int, type_ids: Iterable[int]):
+        """ (type_id, average, volume) columns of the daily history of the types within history_days """
+        since = (date.today() - timedelta(days=self.history_days)).isoformat()
+
+        def history(type_id):
+            try:
+                rows = self.api.call('/markets/{}/history/', region_id, params={'type_id': type_id})
+            except EsiHttpError as e:  # types that are not traded on the market
+                print("no market history for type {}: {}".format(type_id, e.status_code))
+                return type_id, []
+            return type_id, [r for r in rows if r['date'] >= since]
+
+        type_ids = sorted(set(type_ids))
+        print("getting market history for {} types in region {}".format(len(type_ids), region_id))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(history, type_ids))
+        n = sum(len(rows) for _, rows in results)
+        return (np.fromiter((t for t, rows in results for _ in rows), dtype=np.int64, count=n),
+                np.fromiter((r['average'] for _, rows in results for r in rows), dtype=np.float64, count=n),
+                np.fromiter((r['volume'] for _, rows in results for r in rows), dtype=np.float64, count=n))
+
+    def _with_fallback(self, types: np.ndarray, prices: np.ndarray, global_prices: PriceTable,
+                       expiration: datetime = None) -> PriceTable:
+        """ regional prices as the average column and global prices as the adjusted column, so the effective price
+            is the regional one where there is one """
+        all_types = np.union1d(types, global_prices.type_ids)
+        regional = np.full(len(all_types), np.nan)
+        regional[np.searchsorted(all_types, types)] = prices
+        return PriceTable(all_types, regional, global_prices.get_prices(all_types),
+                          expiration or datetime.now() + self.max_age)
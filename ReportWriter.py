@@ -0,0 +1,331 @@
+"""
+Writes the asset report in any of text, csv, json and html from one pass over the valued locations.  Each format is
+a sink that writes as the locations are fed to it, so nothing is assembled in memory beyond one location's items.
+"""
+import csv
+import heapq
+import html
+import json
+import webbrowser
+from collections import namedtuple
+from operator import attrgetter
+from pathlib import Path
+from urllib.parse import quote
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from AssetRecord import AssetRecord
+from AssetSnapshot import AssetDiff
+from MoneyChart import CHART_FILENAME
+
+FORMATS = ('txt', 'csv', 'json', 'html')
+
+ReportOptions = namedtuple('ReportOptions', 'formats top_n summary_only open_browser')
+ReportOptions.__new__.__defaults__ = (('txt',), None, False, False)
+
+_total_value = attrgetter('total_value')
+
+
+def _quantity(a: AssetRecord) -> int:
+    return -1 if a.quantity is None else a.quantity
+
+
+def top_items(items: Sequence[AssetRecord], top_n: Optional[int]) -> List[AssetRecord]:
+    """ items by total_value, highest first, only the top_n highest when top_n is set """
+    if top_n is None:
+        return sorted(items, key=_total_value, reverse=True)
+    return heapq.nlargest(top_n, items, key=_total_value)
+
+
+def write_changes(f, diff: AssetDiff, type_name, max_items=20):
+    """ the "what changed since last run" section: counts, value change by location, and the largest added, removed,
+        changed and moved items """
+    previous, current = diff.previous, diff.current
+    f.write('Changes since {:%Y-%m-%d %H:%M}\n'.format(previous.taken))
+    if not diff:
+        f.write('  no changes\n\n')
+        return
+    f.write('  Added items       = {:>8,d}\n'.format(len(diff.added)))
+    f.write('  Removed items     = {:>8,d}\n'.format(len(diff.removed)))
+    f.write('  Quantity changes  = {:>8,d}\n'.format(len(diff.quantity_changed)))
+    f.write('  Moved items       = {:>8,d}\n'.format(len(diff.moved)))
+    for location, before, after in diff.location_changes()[:max_items]:
+        f.write('{:>+16,.0f}  {} ({:,.0f} -> {:,.0f})\n'.format(after - before, location, before, after))
+
+    def largest(rows, snapshot):
+        return sorted(rows.tolist(), key=lambda i: snapshot.value[i], reverse=True)[:max_items]
+
+    if len(diff.added):
+        f.write('     Added:\n')
+        for i in largest(diff.added, current):
+            f.write('{:>13,.0f}  {:>8,d} x {} in {}\n'.format(
+                current.value[i], current.quantity[i], type_name(int(current.type_id[i])), current.location[i]))
+    if len(diff.removed):
+        f.write('     Removed:\n')
+        for i in largest(diff.removed, previous):
+            f.write('{:>13,.0f}  {:>8,d} x {} from {}\n'.format(
+                previous.value[i], previous.quantity[i], type_name(int(previous.type_id[i])), previous.location[i]))
+    if len(diff.quantity_changed):
+        f.write('     Quantity changed:\n')
+        for i in largest(diff.quantity_changed, current):
+            before = diff.matched[i]
+            f.write('{:>13,.0f}  {:>8,d} -> {:,d} x {} in {}\n'.format(
+                current.value[i] - previous.value[before], previous.quantity[before], current.quantity[i],
+                type_name(int(current.type_id[i])), current.location[i]))
+    if len(diff.moved):
+        f.write('     Moved:\n')
+        for i in largest(diff.moved, current):
+            f.write('{:>13,.0f}  {:>8,d} x {} {} -> {}\n'.format(
+                current.value[i], current.quantity[i], type_name(int(current.type_id[i])),
+                previous.location[diff.matched[i]], current.location[i]))
+    f.write('\n')
+
+
+class ReportSink:
+    """ one output format.  Gets the summary, optionally the changes, then each location and each ship in turn """
+
+    def __init__(self, f):
+        self.f = f
+
+    def summary(self, character_name: str, totals: List[Tuple[str, float]], net_worth: List[Tuple[str, float]]):
+        pass
+
+    def changes(self, diff, type_name):
+        pass
+
+    def location(self, name: str, totals: List[Tuple[str, float]], assets: List[AssetRecord], orders: List[AssetRecord]):
+        pass
+
+    def ship(self, name: str, value: float, items: List[AssetRecord]):
+        pass
+
+    def close(self):
+        pass
+
+
+class TextSink(ReportSink):
+
+    def __init__(self, f):
+        super().__init__(f)
+        self.ships_started = False
+
+    def summary(self, character_name, totals, net_worth):
+        self.f.write("Asset Report for {}\n".format(character_name))
+        for group in (totals, net_worth):
+            for label, value in group:
+                self.f.write('  {:<17} = {:>16,.0f} isk\n'.format(label, value))
+            self.f.write('\n')
+
+    def changes(self, diff, type_name):
+        write_changes(self.f, diff, type_name)
+
+    def location(self, name, totals, assets, orders):
+        self.f.write('{}\n'.format(name))
+        for label, value in totals:
+            self.f.write('  {:<17} = {:>13,.0f}{}\n'.format(label, value, ' m^2' if label == 'Total volume' else ''))
+        if assets:
+            self.f.write('     Asset Items:\n')
+            for a in assets:
+                self.f.write("{:>13,.0f} [{:10,.1f} m^2] {:>8,d} x {}\n".format(
+                    a.total_value, a.total_volume, _quantity(a), a.type_name))
+        if orders:
+            self.f.write('     Open Order Items:\n')
+            for a in orders:
+                self.f.write("{:>13,.0f} [{:10,.1f} m^2]  {:>8,d} x {}\n".format(
+                    a.total_value, a.total_volume, _quantity(a), a.type_name))
+        self.f.write('\n')
+
+    def ship(self, name, value, items):
+        if not self.ships_started:
+            self.f.write('Ships\n\n')
+            self.ships_started = True
+        self.f.write('{}\n'.format(name))
+        self.f.write('  Ship value        = {:>13,.0f}\n'.format(value))
+        if items:
+            self.f.write('     Items:\n')
+            for a in items:
+                self.f.write("{:>13,.0f}  {:>8,d} x {}\n".format(a.total_value, _quantity(a), a.type_name))
+        self.f.write('\n')
+
+
+class CsvSink(ReportSink):
+    """ one row per item, plus a row per location and ship total with an empty type """
+
+    def __init__(self, f):
+        super().__init__(f)
+        self.writer = csv.writer(f)
+        self.writer.writerow(['section', 'location', 'kind', 'type_name', 'quantity', 'value', 'volume'])
+
+    def summary(self, character_name, totals, net_worth):
+        for label, value in totals + net_worth:
+            self.writer.writerow(['summary', character_name, label, '', '', round(value, 2), ''])
+
+    def location(self, name, totals, assets, orders):
+        totals = dict(totals)
+        self.writer.writerow(['location', name, 'total', '', '', round(totals['Total value'], 2),
+                              round(totals['Total volume'], 2)])
+        for kind, items in (('asset', assets), ('order', orders)):
+            for a in items:
+                self.writer.writerow(['location', name, kind, a.type_name, _quantity(a),
+                                      round(a.total_value, 2), round(a.total_volume, 2)])
+
+    def ship(self, name, value, items):
+        self.writer.writerow(['ship', name, 'total', '', '', round(value, 2), ''])
+        for a in items:
+            self.writer.writerow(['ship', name, 'item', a.type_name, _quantity(a),
+                                  round(a.total_value, 2), round(a.total_volume, 2)])
+
+
+def _json_item(a: AssetRecord) -> dict:
+    return {'type_id': a.type_id, 'type_name': a.type_name, 'quantity': _quantity(a),
+            'value': a.total_value, 'volume': a.total_volume}
+
+
+class JsonSink(ReportSink):
+    """ {"character": .., "summary": {..}, "locations": [..], "ships": [..]}, written one location at a time """
+
+    def __init__(self, f):
+        super().__init__(f)
+        self.section = None
+
+    def _enter(self, section: str):
+        if self.section == section:
+            self.f.write(',\n')
+        else:
+            self.f.write(']' if self.section else '')
+            self.f.write(',\n"{}": [\n'.format(section))
+            self.section = section
+
+    def summary(self, character_name, totals, net_worth):
+        self.f.write('{{"character": {}, "summary": {}'.format(json.dumps(character_name),
+                                                                 json.dumps(dict(totals + net_worth))))
+
+    def location(self, name, totals, assets, orders):
+        self._enter('locations')
+        json.dump({'name': name, 'totals': dict(totals), 'assets': [_json_item(a) for a in assets],
+                   'orders': [_json_item(a) for a in orders]}, self.f)
+
+    def ship(self, name, value, items):
+        self._enter('ships')
+        json.dump({'name': name, 'value': value, 'items': [_json_item(a) for a in items]}, self.f)
+
+    def close(self):
+        self.f.write(']}\n' if self.section else '}\n')
+
+
+class _HtmlEscapingWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, s: str):
+        self.f.write(html.escape(s))
+
+
+class HtmlSink(ReportSink):
+    __style = ('body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;margin-bottom:1em}'
+               'td,th{padding:2px 8px;text-align:right}td.name,th.name{text-align:left}'
+               'tr:nth-child(even){background:#f4f4f4}h2{margin-top:1.5em}')
+
+    def _table(self, header: Iterable[str], rows: Iterable[Iterable]):
+        self.f.write('<table><tr>{}</tr>\n'.format(''.join(
+            '<th class="name">{}</th>'.format(html.escape(h)) if i == len(header) - 1 else
+            '<th>{}</th>'.format(html.escape(h)) for i, h in enumerate(header))))
+        for row in rows:
+            cells = []
+            for i, value in enumerate(row):
+                if isinstance(value, str):
+                    cells.append('<td class="name">{}</td>'.format(html.escape(value)))
+                elif isinstance(value, float):
+                    cells.append('<td>{:,.0f}</td>'.format(value))
+                else:
+                    cells.append('<td>{:,}</td>'.format(value))
+            self.f.write('<tr>{}</tr>\n'.format(''.join(cells)))
+        self.f.write('</table>\n')
+
+    def summary(self, character_name, totals, net_worth):
+        title = html.escape('Asset Report for {}'.format(character_name))
+        self.f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{0}</title><style>{1}</style>'
+                     '</head><body>\n<h1>{0}</h1>\n'.format(title, HtmlSink.__style))
+        self._table(['isk', ''], ((value, label) for label, value in totals + net_worth))
+        self.f.write('<p><a href="{}">Asset value history</a></p>\n'.format(
+            html.escape(quote(CHART_FILENAME.format(character_name)))))
+
+    def changes(self, diff, type_name):
+        self.f.write('<pre>')
+        write_changes(_HtmlEscapingWriter(self.f), diff, type_name)
+        self.f.write('</pre>\n')
+
+    def location(self, name, totals, assets, orders):
+        self.f.write('<h2>{}</h2>\n'.format(html.escape(name)))
+        self._table(['', ''], ((value, label) for label, value in totals))
+        if assets:
+            self._table(['value', 'm^3', 'quantity', 'asset'],
+                        ((a.total_value, a.total_volume, _quantity(a), a.type_name) for a in assets))
+        if orders:
+            self._table(['value', 'm^3', 'quantity', 'open order'],
+                        ((a.total_value, a.total_volume, _quantity(a), a.type_name) for a in orders))
+
+    def ship(self, name, value, items):
+        self.f.write('<h2>{}</h2>\n<p>Ship value {:,.0f} isk</p>\n'.format(html.escape(name), value))
+        if items:
+            self._table(['value', 'quantity', 'item'],
+                        ((a.total_value, _quantity(a), a.type_name) for a in items))
+
+    def close(self):
+        self.f.write('</body></html>\n')
+
+
+_sinks = {'txt': TextSink, 'csv': CsvSink, 'json': JsonSink, 'html': HtmlSink}
+
+
+class ReportWriter:
+    """
+    Opens one file per format (base_filename with the format's suffix) and feeds each section to all of them.
+    Use as a context manager; the files are complete when it exits
+    """
+
+    def __init__(self, base_filename: Path, options: ReportOptions = ReportOptions()):
+        unknown = set(options.formats) - set(FORMATS)
+        if unknown:
+            raise ValueError("unknown report formats {}, expected some of {}".format(sorted(unknown), FORMATS))
+        self.options = options
+        self.filenames = [base_filename.with_suffix('.' + fmt) for fmt in options.formats]
+        self.files = []
+        self.sinks = []  # type: List[ReportSink]
+
+    def __enter__(self) -> 'ReportWriter':
+        for filename, fmt in zip(self.filenames, self.options.formats):
+            filename.parent.mkdir(parents=True, exist_ok=True)
+            f = filename.open('w', encoding='utf-8', newline='' if fmt == 'csv' else None)
+            self.files.append(f)
+            self.sinks.append(_sinks[fmt](f))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for sink in self.sinks:
+            sink.close()
+        for f in self.files:
+            f.close()
+        if exc_type is None and self.options.open_browser and 'html' in self.options.formats:
+            webbrowser.open(self.filenames[self.options.formats.index('html')].resolve().as_uri())
+
+    def summary(self, character_name: str, totals: List[Tuple[str, float]], net_worth: List[Tuple[str, float]]):
+        for sink in self.sinks:
+            sink.summary(character_name, totals, net_worth)
+
+    def changes(self, diff, type_name):
+        for sink in self.sinks:
+            sink.changes(diff, type_name)
+
+    def location(self, name: str, totals: List[Tuple[str, float]], assets: Sequence[AssetRecord], orders: Sequence[AssetRecord]):
+        """ assets and orders are cut to the top_n most valuable (or left out in summary_only mode) here """
+        assets, orders = self._items(assets), self._items(orders)
+        for sink in self.sinks:
+            sink.location(name, totals, assets, orders)
+
+    def ship(self, name: str, value: float, items: Sequence[AssetRecord]):
+        items = self._items(items)
+        for sink in self.sinks:
+            sink.ship(name, value, items)
+
+    def _items(self, items: Sequence[AssetRecord]) -> List[AssetRecord]:
+        return [] if self.options.summary_only else top_items(items, self.options.top_n)
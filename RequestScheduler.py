@@ -0,0 +1,208 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Dict
+
+import requests
+
+
+class EsiError(RuntimeError):
+    pass
+
+
+class EsiHttpError(EsiError):
+    """ ESI answered with an error status that was not retried (or still failed after the retries) """
+
+    def __init__(self, status_code: int, method: str, url: str, text: str = ''):
+        super().__init__("{} for {} {} {}".format(status_code, method, url, text[:200]))
+        self.status_code = status_code
+        self.url = url
+
+
+class EsiTimeoutError(EsiError):
+    """ no response from ESI after the retries """
+
+
+class EsiErrorLimitError(EsiError):
+    """ ESI reports the error limit is exhausted (status 420) and retrying was not allowed """
+
+
+class TokenBucket:
+    """ allows rate requests per second on average, with bursts of up to capacity requests """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class EndpointMetrics:
+    __slots__ = ['requests', 'errors', 'retries', 'total_latency', 'max_latency']
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def as_dict(self) -> dict:
+        return {'requests': self.requests,
+                'errors': self.errors,
+                'retries': self.retries,
+                'mean_latency': self.total_latency / self.requests if self.requests else 0.0,
+                'max_latency': self.max_latency}
+
+
+class RequestScheduler:
+    """
+    Sends ESI requests through a token bucket and a concurrency limit that adapts to ESI's error limit.
+
+    ESI allows a fixed number of error responses per window (X-Esi-Error-Limit-Remain / X-Esi-Error-Limit-Reset
+    headers) and bans clients that exceed it.  When the remaining errors drop below low_water the concurrency limit is
+    halved, and when they drop below stop_water new requests wait for the window to reset.  The limit grows back one
+    step at a time while the error budget is healthy.
+
+    5xx responses and timeouts are retried with jittered exponential backoff, a 420 (error limited) waits for the
+    window to reset before retrying, error_reset seconds when the 420 does not say when the window resets.  Other
+    responses are returned to the caller.
+    """
+
+    retry_statuses = frozenset([500, 502, 503, 504])
+
+    def __init__(self, rate=50.0, burst=50, max_concurrency=20, min_concurrency=1, max_retries=3,
+                 backoff=0.5, timeout=30.0, low_water=50, stop_water=10, error_reset=60.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency_limit = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.low_water = low_water
+        self.stop_water = stop_water
+        self.error_reset = error_reset
+        self.condition = threading.Condition()
+        self.active = 0
+        self.error_limit_remain = None  # type: int  # from the last response
+        self.error_limit_reset_at = 0.0  # monotonic time the error window resets
+        self.metrics = defaultdict(EndpointMetrics)  # type: Dict[str, EndpointMetrics]
+
+    def request(self, session: requests.Session, method: str, url: str, endpoint: str = None,
+                **kwargs) -> requests.Response:
+        """ send the request, retrying as described above.  endpoint (e.g. the unformatted path) groups the metrics """
+        metrics = self.metrics[endpoint or url]
+        attempt = 0
+        while True:
+            self._wait_for_error_window()
+            self.bucket.acquire()
+            self._acquire_slot()
+            start = time.perf_counter()
+            try:
+                r = session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                self._release_slot()
+                self._record(metrics, start, is_error=True)
+                if attempt >= self.max_retries:
+                    raise EsiTimeoutError("no response for {} {} after {} attempts: {}".format(
+                        method, url, attempt + 1, e)) from e
+                attempt = self._retry(metrics, attempt)
+                continue
+            self._release_slot()
+            self._update_error_limit(r.headers)
+            self._record(metrics, start, is_error=r.status_code >= 400)
+            if r.status_code == 420:
+                self._error_limited(r.headers)
+                if attempt >= self.max_retries:
+                    raise EsiErrorLimitError("error limited calling {} {}".format(method, url))
+                attempt += 1
+                metrics.retries += 1
+                continue  # _wait_for_error_window waits for the reset
+            if r.status_code in RequestScheduler.retry_statuses and attempt < self.max_retries:
+                attempt = self._retry(metrics, attempt)
+                continue
+            return r
+
+    def _retry(self, metrics: EndpointMetrics, attempt: int) -> int:
+        metrics.retries += 1
+        time.sleep(random.uniform(0, self.backoff * 2 ** attempt))  # full jitter
+        return attempt + 1
+
+    def _record(self, metrics: EndpointMetrics, start: float, is_error: bool):
+        latency = time.perf_counter() - start
+        with self.condition:
+            metrics.requests += 1
+            metrics.errors += is_error
+            metrics.total_latency += latency
+            metrics.max_latency = max(metrics.max_latency, latency)
+
+    def _acquire_slot(self):
+        with self.condition:
+            while self.active >= self.concurrency_limit:
+                self.condition.wait()
+            self.active += 1
+
+    def _release_slot(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def _update_error_limit(self, headers):
+        remain = headers.get('X-Esi-Error-Limit-Remain')
+        reset = headers.get('X-Esi-Error-Limit-Reset')
+        if remain is None:
+            return
+        with self.condition:
+            self.error_limit_remain = int(remain)
+            if reset is not None:
+                self.error_limit_reset_at = time.monotonic() + int(reset)
+            if self.error_limit_remain < self.low_water:
+                self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit // 2)
+            elif self.concurrency_limit < self.max_concurrency:
+                self.concurrency_limit += 1
+            self.condition.notify_all()
+
+    def _error_limited(self, headers):
+        """ a 420 without the error limit headers still means the budget is spent """
+        if headers.get('X-Esi-Error-Limit-Remain') is not None:
+            return
+        with self.condition:
+            self.error_limit_remain = 0
+            self.error_limit_reset_at = time.monotonic() + self.error_reset
+
+    def _wait_for_error_window(self):
+        with self.condition:
+            if self.error_limit_remain is None or self.error_limit_remain >= self.stop_water:
+                return
+            wait = self.error_limit_reset_at - time.monotonic()
+            if wait <= 0:
+                self.error_limit_remain = None  # window has reset, next response tells us the new budget
+                return
+        print("ESI error limit nearly exhausted, waiting {:.1f} seconds for reset".format(wait))
+        time.sleep(wait)
+        with self.condition:
+            self.error_limit_remain = None
+
+    def metrics_report(self) -> str:
+        lines = ['{:<45} {:>8} {:>7} {:>7} {:>10} {:>10}'.format(
+            'endpoint', 'requests', 'errors', 'retries', 'mean ms', 'max ms')]
+        for endpoint, m in sorted(self.metrics.items()):
+            d = m.as_dict()
+            lines.append('{:<45} {:>8d} {:>7d} {:>7d} {:>10.1f} {:>10.1f}'.format(
+                endpoint, d['requests'], d['errors'], d['retries'], d['mean_latency'] * 1000, d['max_latency'] * 1000))
+        return '\n'.join(lines)
@@ -0,0 +1,208 @@
+"""
+Per-phase timing for report and sweep runs.  Code marks its phases with RunProfile.phase('fetch'), which does nothing
+unless a RunProfile is active, so the phases stay in place in normal runs.  A profile can also capture cProfile and
+tracemalloc data, and is saved as JSON next to the reports so that runs can be compared over time.
+
+    with RunProfile('AssetReporter', cpu=True) as profile:
+        write_reports(...)
+    profile.save(Config.dataDir / 'Reports')
+"""
+import argparse
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional
+
+PROFILE_VERSION = 1
+PROFILE_KINDS = ('time', 'cpu', 'memory')
+
+_active = None  # type: Optional[RunProfile]
+
+
+@contextmanager
+def phase(name: str):
+    """ time the enclosed code as phase name of the active profile, if there is one """
+    profile = _active
+    if profile is None:
+        yield
+    else:
+        with profile.phase(name):
+            yield
+
+
+class RunProfile:
+    """
+    Wall time and entry count of each phase.  Phases may nest and may run on several threads at once, each entry adds
+    its own time, so a phase's seconds can be more than the elapsed time of the run.  With cpu the run is profiled with
+    cProfile: the thread that enters the profile for the whole run, other threads only while they are in a phase (on
+    Python versions where one profiler sees every thread, all of them for the whole run).  With memory tracemalloc
+    records the peak and the largest allocation sites
+    """
+
+    def __init__(self, name: str, cpu=False, memory=False, top=25):
+        self.name = name
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self.phases = {}  # type: Dict[str, List]  # name -> [seconds, count]
+        self.started = None  # type: Optional[datetime]
+        self.elapsed = None  # type: Optional[float]
+        self.functions = []  # type: List[dict]
+        self.allocations = []  # type: List[dict]
+        self.memory_peak = None  # type: Optional[int]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profilers = []
+        self._start = None
+
+    @contextmanager
+    def phase(self, name: str):
+        profiler = self._thread_profiler()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self._local.profiling = False
+            with self._lock:
+                entry = self.phases.setdefault(name, [0.0, 0])
+                entry[0] += seconds
+                entry[1] += 1
+
+    def _thread_profiler(self):
+        """ a profiler for the current thread if cpu profiling is on and the thread is not being profiled, the caller
+            disables it again at the end of its phase """
+        if not self.cpu or getattr(self._local, 'profiling', False):
+            return None
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # a single profiler already sees every thread
+            return None
+        self._local.profiling = True
+        with self._lock:
+            self._profilers.append(profiler)
+        return profiler
+
+    def __enter__(self) -> 'RunProfile':
+        global _active
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+        self.started = datetime.now()
+        self._start = time.perf_counter()
+        self._thread_profiler()
+        _active = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _active
+        _active = None
+        self.elapsed = time.perf_counter() - self._start
+        if self.cpu:
+            import pstats
+            for profiler in self._profilers:
+                profiler.disable()
+            self._local.profiling = False
+            if self._profilers:
+                self.functions = _top_functions(pstats.Stats(*self._profilers), self.top)
+        if self.memory:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            self.memory_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.allocations = [{'where': '{}:{}'.format(s.traceback[0].filename, s.traceback[0].lineno),
+                                 'size': s.size, 'count': s.count}
+                                for s in snapshot.statistics('lineno')[:self.top]]
+
+    def to_dict(self) -> dict:
+        result = {'version': PROFILE_VERSION, 'name': self.name,
+                  'started': self.started.isoformat(timespec='seconds') if self.started else None,
+                  'elapsed': self.elapsed,
+                  'phases': {name: {'seconds': seconds, 'count': count}
+                             for name, (seconds, count) in sorted(self.phases.items())}}
+        if self.cpu:
+            result['functions'] = self.functions
+        if self.memory:
+            result['memory'] = {'peak': self.memory_peak, 'allocations': self.allocations}
+        return result
+
+    def save(self, directory: Path, print_report=True) -> Path:
+        """ write the profile to directory as profile-{name}-{date}.json, and print it against the previous one """
+        previous = latest_profile(directory, self.name)
+        filename = directory / 'profile-{}-{:%Y-%m-%d-%H-%M-%S}.json'.format(self.name, self.started)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        with filename.open('w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        if print_report:
+            print("profile filename = {}".format(filename))
+            print(self.report(previous))
+        return filename
+
+    def report(self, previous: dict = None) -> str:
+        """ phase times, with the change from a previous profile if given """
+        before = previous['phases'] if previous else {}
+        lines = ['{:<20} {:>10} {:>8} {:>10}'.format('phase', 'seconds', 'count', 'change')]
+        rows = [(name, seconds, count) for name, (seconds, count) in self.phases.items()]
+        rows.append(('elapsed', self.elapsed or 0.0, 1))
+        for name, seconds, count in rows:
+            if name == 'elapsed':
+                old = previous.get('elapsed') if previous else None
+            else:
+                old = before[name]['seconds'] if name in before else None
+            change = '' if old is None else '{:+10.3f}'.format(seconds - old)
+            lines.append('{:<20} {:>10.3f} {:>8d} {:>10}'.format(name, seconds, count, change))
+        if self.memory_peak is not None:
+            lines.append('memory peak {:,d} bytes'.format(self.memory_peak))
+        for f in self.functions[:10]:
+            lines.append('{:>10.3f} {:>10.3f} {:>9d}  {}'.format(f['cumtime'], f['tottime'], f['calls'], f['function']))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def add_argument(parser):
+        """ the --profile option of the command line tools """
+        parser.add_argument('--profile', nargs='?', const=frozenset(['time']), type=profile_kinds,
+                            metavar='time,cpu,memory',
+                            help='time the phases of the run and save a JSON profile next to the reports, '
+                                 'optionally with cProfile (cpu) or tracemalloc (memory) data')
+
+    @classmethod
+    def from_args(cls, name: str, args) -> Optional['RunProfile']:
+        """ the profile asked for by --profile, or None """
+        if args.profile is None:
+            return None
+        return cls(name, cpu='cpu' in args.profile, memory='memory' in args.profile)
+
+
+def profile_kinds(value: str) -> FrozenSet[str]:
+    """ the kinds listed in a --profile value, a usage error for an unknown kind """
+    kinds = frozenset(value.split(','))
+    unknown = kinds - set(PROFILE_KINDS)
+    if unknown:
+        raise argparse.ArgumentTypeError("unknown profile kinds {}, expected some of {}".format(
+            ', '.join(sorted(unknown)), ', '.join(PROFILE_KINDS)))
+    return kinds
+
+
+def latest_profile(directory: Path, name: str) -> Optional[dict]:
+    """ the most recent saved profile of the run called name, None if there is none """
+    filenames = sorted(directory.glob('profile-{}-*.json'.format(name)))
+    if not filenames:
+        return None
+    with filenames[-1].open() as f:
+        return json.load(f)
+
+
+def _top_functions(stats, top: int) -> List[dict]:
+    rows = []
+    for (filename, line, function), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({'function': '{}:{}({})'.format(filename, line, function), 'calls': calls,
+                     'tottime': tottime, 'cumtime': cumtime})
+    rows.sort(key=lambda r: r['cumtime'], reverse=True)
+    return rows[:top]
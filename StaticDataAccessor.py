@@ -1,5 +1,6 @@
 import pickle
 import sqlite3
+import threading
 from datetime import datetime, timedelta, date
 
 import itertools
@@ -8,18 +9,21 @@ from operator import itemgetter
 
 import Config
 
-from typing import Dict, Optional, List, FrozenSet
+from typing import Dict, Optional, List, FrozenSet, Iterable, Tuple
 from DataTypes import StationData, TypeData, MarketPriceData, TypeId, AssetValues
 
 
 class StaticDataAccessor:
     """
-    Reads from the static data dump database to get information like type, station, and solar system data
+    Reads from the static data dump database to get information like type, station, and solar system data.
+    One accessor can be shared between threads
     """
     def __init__(self, data_dir=Config.dataDir):
         self.data_dir = data_dir
         self.db_filename = data_dir / "sqlite-latest.sqlite3"
-        self.db_conn = sqlite3.connect(str(self.db_filename))
+        self.db_conn = sqlite3.connect(str(self.db_filename), check_same_thread=False)
+        self.db_lock = threading.RLock()
+        self.volume_table = None
         tables = self.db_conn.execute("select name from sqlite_master where type='table'").fetchall()
         if len(tables) == 0:
             raise Exception('no tables found in db file ' + self.db_filename)
@@ -29,8 +33,9 @@ class StaticDataAccessor:
 
 
     def get_system_jumps(self) -> Dict[int, FrozenSet[int]]:
-        rows = self.db_conn.execute(
-            'select fromSolarSystemID, toSolarSystemID from mapSolarSystemJumps order by fromSolarSystemID').fetchall()
+        with self.db_lock:
+            rows = self.db_conn.execute(
+                'select fromSolarSystemID, toSolarSystemID from mapSolarSystemJumps order by fromSolarSystemID').fetchall()
         result = {}
         for from_system, grouped_results in itertools.groupby(rows, itemgetter(0)):
             result[from_system] = frozenset(x[1] for x in grouped_results)
@@ -38,26 +43,60 @@ class StaticDataAccessor:
 
     def get_type_volume(self, type_id: int):
         try:
-            row = self.db_conn.execute(
-                'select volume from invTypes where typeID=?', (type_id,)).fetchone()
+            with self.db_lock:
+                row = self.db_conn.execute(
+                    'select volume from invTypes where typeID=?', (type_id,)).fetchone()
             return row[0]
         except:
             print("unknown type {}".format(type_id))
             return 0
 
+    def get_volume_table(self):
+        """ invTypes.volume of all types as an AssetValuation.VolumeTable, read once """
+        with self.db_lock:
+            if self.volume_table is None:
+                from AssetValuation import VolumeTable  # numpy is only loaded by the callers that value assets
+                self.volume_table = VolumeTable.from_rows(
+                    self.db_conn.execute('select typeID, volume from invTypes').fetchall())
+            return self.volume_table
+
+    def get_type_details(self, type_ids: Iterable[int]) -> Dict[int, Tuple[str, int, int]]:
+        """ bulk lookup of (description, group_id, category_id) by type_id, types not in the static data are left out """
+        return {row[0]: row[1:] for row in self._select_in(
+            'select t.typeID, t.description, t.groupID, g.categoryID from invTypes t'
+            ' left join invGroups g on g.groupID = t.groupID where t.typeID in ({})', type_ids)}
+
+    def get_systems_for_stations(self, station_ids: Iterable[int]) -> Dict[int, int]:
+        """ bulk lookup of solar system id by station id """
+        return dict(self._select_in('select stationID, solarSystemID from staStations where stationID in ({})',
+                                    station_ids))
+
+    def _select_in(self, sql: str, ids: Iterable[int], chunk_size=500) -> List[tuple]:
+        """ run sql, which has a single 'in ({})' clause, over ids in chunks that stay under the sqlite variable limit """
+        ids = list(ids)
+        rows = []
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            with self.db_lock:
+                rows += self.db_conn.execute(sql.format(','.join('?' * len(chunk))), chunk).fetchall()
+        return rows
+
     def get_system_for_station(self, station_id: int):
-        row = self.db_conn.execute(
-            'select solarSystemID from staStations where stationID=?', (station_id,)).fetchone()
+        with self.db_lock:
+            row = self.db_conn.execute(
+                'select solarSystemID from staStations where stationID=?', (station_id,)).fetchone()
         return row[0]
 
     def get_station_name(self, station_id: int):
-        row = self.db_conn.execute(
-            'select stationName from staStations where stationID=?', (station_id,)).fetchone()
+        with self.db_lock:
+            row = self.db_conn.execute(
+                'select stationName from staStations where stationID=?', (station_id,)).fetchone()
         return row[0]
 
     def get_system_name(self, solar_system_id):
-        row = self.db_conn.execute(
-            'select solarSystemName from mapSolarSystems where solarSystemID=?', (solar_system_id,)).fetchone()
+        with self.db_lock:
+            row = self.db_conn.execute(
+                'select solarSystemName from mapSolarSystems where solarSystemID=?', (solar_system_id,)).fetchone()
         return row[0]
 
 
@@ -13,7 +13,9 @@ from typing import Dict, List, Iterable, NewType, Tuple, T
 from typing import FrozenSet
 
 import StaticDataAccessor
-from ESI_Api import ESI_Api
+
+if typing.TYPE_CHECKING:
+    from ESI_Api import ESI_Api  # imported by the __main__ block only, the api pulls in requests and numpy
 
 SystemId = int
 SystemList = List[SystemId]
@@ -261,7 +263,7 @@ def _search_path(allowed_jumps, path, required, remaining, max_depth, visit_coun
     return best_path
 
 
-def _get_station_info(api: ESI_Api, sda: StaticDataAccessor.StaticDataAccessor) -> List[StationInfo]:
+def _get_station_info(api: 'ESI_Api', sda: StaticDataAccessor.StaticDataAccessor) -> List[StationInfo]:
     station_key = itemgetter('station_id')
     assets_by_station = groupby(sorted(api.assets(), key=station_key), key=station_key)
     result = []
@@ -296,7 +298,7 @@ def print_solution_info(solution: SolutionInfo):
         solution.value_per_jump), flush=True)
 
 
-def get_solution_path(solution: SolutionInfo, api: ESI_Api, sda: StaticDataAccessor.StaticDataAccessor) -> Iterable[str]:
+def get_solution_path(solution: SolutionInfo, api: 'ESI_Api', sda: StaticDataAccessor.StaticDataAccessor) -> Iterable[str]:
     """ print the path with system and station names. Since this is a loop it does not matter which direction we travel.
       TODO: Choose the path that minimizes the amount of jumps goods are carried to minimize the chance of being ganked.
       To acheive this pick up the item the last time though a system if it is visited multiple times.  Can also try both
@@ -328,6 +330,7 @@ def time_is_up():
     raise TimesUpException()
 
 if __name__ == '__main__':
+    from ESI_Api import ESI_Api
     sda = StaticDataAccessor.StaticDataAccessor()
     jumps = sda.get_system_jumps()
 
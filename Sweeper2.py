@@ -6,13 +6,16 @@ from operator import itemgetter, attrgetter
 import itertools
 from pprint import pprint
 
-from typing import Dict, List, Iterable, NewType, Tuple, T, Set, Union
+from typing import Dict, List, Iterable, NewType, Tuple, T, Set, Union, TYPE_CHECKING
 from typing import FrozenSet
 
 from datetime import datetime, timedelta
 
+import RunProfile
 import StaticDataAccessor
-from ESI_Api import ESI_Api
+
+if TYPE_CHECKING:
+    from ESI_Api import ESI_Api  # imported by the __main__ block only, the api pulls in requests and numpy
 
 SystemId = int
 SystemList = List[SystemId]
@@ -245,26 +248,39 @@ class Sweeper2:
         return distances
 
 
-def _get_station_info(api: ESI_Api, sda: StaticDataAccessor.StaticDataAccessor) -> List[StationInfo]:
-    station_key = itemgetter('station_id')
-    assets_by_station = groupby(sorted(api.assets(), key=station_key), key=station_key)
+def _get_station_info(api: 'ESI_Api', sda: StaticDataAccessor.StaticDataAccessor, pricing_mode='global',
+                      pricing_region='The Forge') -> List[StationInfo]:
+    """ value and volume of the items that can be hauled from each station.  Ships, drones, large objects like station
+        containers and the items inside those are left out.  pricing_mode is one of RegionalPrices.PRICING_MODES """
+    import numpy as np
+    from AssetValuation import ValuationEngine, factorize
+    from RegionalPrices import RegionalPrices, pricing_region_id
+
+    region_id = pricing_region_id(api, pricing_region)
+    all_assets, tree = api.assets_and_tree()
+    root_station_ids = tree.root_station_ids()
+    assets = [a for a, station_id in zip(all_assets, root_station_ids.tolist()) if station_id >= 0]
+    price_table = RegionalPrices(api).get_price_table(pricing_mode, region_id,
+                                                      {a.type_id for a in assets})
+    with RunProfile.phase('valuation'):
+        engine = ValuationEngine(price_table, sda.get_volume_table())
+        type_ids = np.fromiter((a.type_id for a in assets), dtype=np.int64, count=len(assets))
+        quantities = np.fromiter((a.quantity or 1 for a in assets), dtype=np.int64, count=len(assets))
+        categories = np.fromiter((a.category_id or -1 for a in assets), dtype=np.int64, count=len(assets))
+        in_station = np.fromiter((a.location_type == 'station' for a in assets), dtype=bool, count=len(assets))
+        values, volumes = engine.value(type_ids, quantities)
+        haulable = in_station & ~np.isin(categories, [6, 18]) & (engine.volume_table.get_volumes(type_ids) < 3000)
+
+        codes, station_ids = factorize(root_station_ids[root_station_ids >= 0].tolist())
+        station_values = np.bincount(codes, weights=np.where(haulable, values, 0.0), minlength=len(station_ids))
+        station_volumes = np.bincount(codes, weights=np.where(haulable, volumes, 0.0), minlength=len(station_ids))
+    system_by_station = sda.get_systems_for_stations(station_ids)
     result = []
-    for station_id, asset_list in assets_by_station:
-        station_value = 0.0
-        station_volume = 0.0
-        system_id = sda.get_system_for_station(station_id)
-        for asset in asset_list:
-            type_id = asset['type_id']
-            category = asset['category_id']
-            volume = sda.get_type_volume(type_id)
-            if category in {6, 18} or volume >= 3000 or asset['location_type'] != 'station':
-                # exclude ships, drones, and large objects like station containers or items in those
-                continue
-            price = api.get_market_price(type_id)
-            quantity = max(asset.get('quantity', 1), 1)
-            station_value += price * quantity
-            station_volume += volume * quantity
-        result.append(StationInfo(system_id, station_id, station_value, station_volume))
+    for station_id, value, volume in zip(station_ids, station_values.tolist(), station_volumes.tolist()):
+        if station_id not in system_by_station:
+            print("station {} not in static data, skipped".format(station_id))
+            continue
+        result.append(StationInfo(system_by_station[station_id], station_id, value, volume))
     return result
 
 
@@ -303,6 +319,14 @@ def powerset(iterable: Iterable) -> Iterable[List]:
 
 
 if __name__ == '__main__':
+    import argparse
+    from contextlib import nullcontext
+
+    import Config
+    import Context
+    from ESI_Api import ESI_Api
+    from TokenManager import TokenRefresher
+
     def run_test():
         sda = StaticDataAccessor.StaticDataAccessor()
         jumps = sda.get_system_jumps()
@@ -322,38 +346,48 @@ if __name__ == '__main__':
                            volume,  # max volume
                            60)  # duration in seconds
 
-        sweeper.get_plan_v2()
-        total_value_solution = None
-        value_per_jump_solution = None
-        for jump_count, solution in sweeper.best_by_jump_count.items():
-            print("{:2d}  {:3d} jumps,  {:2d} stations,  {:16,.0f} total_value {:12,.1f} value_per_jump".format(
-                jump_count,
-                len(solution.shortest_path),
-                len(solution.station_list),
-                solution.total_value,
-                solution.value_per_jump))
-            if total_value_solution is None or solution.total_value > total_value_solution.total_value:
-                total_value_solution = solution
-            if value_per_jump_solution is None or solution.value_per_jump > value_per_jump_solution.value_per_jump:
-                value_per_jump_solution = solution
-
-        print()
-        print("Total Value Solution")
-        print("{} jumps, {} stations, value={:,.0f},  valuePerJump={:,.1f}"
-              .format(len(total_value_solution.shortest_path),
-                      len(total_value_solution.station_list),
-                      total_value_solution.total_value,
-                      total_value_solution.value_per_jump))
-        print('\n'.join(get_solution_path(total_value_solution, sda)))
-        print()
-        print("Value Per Jump Solution")
-        print("{} jumps, {} stations, value={:,.0f},  valuePerJump={:,.1f}"
-              .format(len(value_per_jump_solution.shortest_path),
-                      len(value_per_jump_solution.station_list),
-                      value_per_jump_solution.total_value,
-                      value_per_jump_solution.value_per_jump))
-        print('\n'.join(get_solution_path(value_per_jump_solution, sda)))
-
-
-    run_test()
+        with RunProfile.phase('search'):
+            sweeper.get_plan_v2()
+        with RunProfile.phase('output'):
+            total_value_solution = None
+            value_per_jump_solution = None
+            for jump_count, solution in sweeper.best_by_jump_count.items():
+                print("{:2d}  {:3d} jumps,  {:2d} stations,  {:16,.0f} total_value {:12,.1f} value_per_jump".format(
+                    jump_count,
+                    len(solution.shortest_path),
+                    len(solution.station_list),
+                    solution.total_value,
+                    solution.value_per_jump))
+                if total_value_solution is None or solution.total_value > total_value_solution.total_value:
+                    total_value_solution = solution
+                if value_per_jump_solution is None or solution.value_per_jump > value_per_jump_solution.value_per_jump:
+                    value_per_jump_solution = solution
+
+            print()
+            print("Total Value Solution")
+            print("{} jumps, {} stations, value={:,.0f},  valuePerJump={:,.1f}"
+                  .format(len(total_value_solution.shortest_path),
+                          len(total_value_solution.station_list),
+                          total_value_solution.total_value,
+                          total_value_solution.value_per_jump))
+            print('\n'.join(get_solution_path(total_value_solution, sda)))
+            print()
+            print("Value Per Jump Solution")
+            print("{} jumps, {} stations, value={:,.0f},  valuePerJump={:,.1f}"
+                  .format(len(value_per_jump_solution.shortest_path),
+                          len(value_per_jump_solution.station_list),
+                          value_per_jump_solution.total_value,
+                          value_per_jump_solution.value_per_jump))
+            print('\n'.join(get_solution_path(value_per_jump_solution, sda)))
+
+
+    parser = argparse.ArgumentParser(description='plan a pickup round trip for the assets of a character')
+    RunProfile.RunProfile.add_argument(parser)
+    args = parser.parse_args()
+
+    profile = RunProfile.RunProfile.from_args('Sweeper2', args)
+    with profile or nullcontext(), TokenRefresher(Context.token_manager()):
+        run_test()
+    if profile is not None:
+        profile.save(Config.dataDir / 'Reports')
 
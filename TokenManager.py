@@ -1,15 +1,18 @@
 from datetime import datetime
 import json
 import pickle
+import sqlite3
+import threading
 import webbrowser
 from base64 import b64encode
 from collections import namedtuple
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 from urllib.parse import urlencode
-import requests
 from datetime import timedelta
 
 import Config
+import RunProfile
 
 TokenData = namedtuple("TokenData", "character_name character_id refresh_token access_token expiration")
 
@@ -28,30 +31,78 @@ class TokenManager:
         'Host': 'login.eveonline.com'
     }
 
-    def __init__(self, data_dir=Config.dataDir):
-        self.token_filename = data_dir / "tokens.pickle"
-        if self.token_filename.exists():
-            with self.token_filename.open('rb') as f:
-                self.character_tokens = pickle.load(f)  # type: Dict[str, TokenData]
-        else:
-            self.character_tokens = {}  # type: Dict[str, TokenData]
+    __create_tables = '''
+    CREATE TABLE IF NOT EXISTS tokens
+    (  character_name TEXT PRIMARY KEY,
+       character_id INTEGER,
+       refresh_token TEXT,
+       access_token TEXT,
+       expiration TIMESTAMP
+    );
+    '''
+
+    def __init__(self, data_dir=Config.dataDir, oauth_url='https://login.eveonline.com/oauth'):
+        self.oauth_url = oauth_url
+        self._session = None
+        self.lock = threading.RLock()  # guards character_tokens and db_conn, which are shared with TokenRefresher
+        self.refresh_locks = {}  # type: Dict[str, threading.Lock]
+        self.db_conn = sqlite3.connect(str(data_dir / "tokens.sqlite3"), check_same_thread=False)
+        self.db_conn.executescript(TokenManager.__create_tables)
+        self.character_tokens = {row[0]: TokenData(row[0], row[1], row[2], row[3], _parse_expiration(row[4]))
+                                 for row in self.db_conn.execute('SELECT * FROM tokens')}  # type: Dict[str, TokenData]
+        pickle_filename = data_dir / "tokens.pickle"
+        if len(self.character_tokens) == 0 and pickle_filename.exists():
+            # one time migration from the pickle file used by earlier versions
+            with pickle_filename.open('rb') as f:
+                for token in pickle.load(f).values():
+                    self.persist_token(token)
+
+    @property
+    def session(self):
+        """ the http session for the SSO server.  requests is imported on first use, reading cached tokens needs none """
+        with self.lock:
+            if self._session is None:
+                import requests
+                self._session = requests.Session()
+            return self._session
 
     def persist_token(self, token: TokenData):
-        self.character_tokens[token.character_name] = token
-        with self.token_filename.open('wb') as f:
-            pickle.dump(self.character_tokens, f)
-            f.flush()
+        """ update the in-memory token and upsert its row """
+        with self.lock:
+            self.character_tokens[token.character_name] = token
+            with self.db_conn as conn:  # auto commit or rollback
+                conn.execute('INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?, ?)',
+                             (token.character_name,
+                              token.character_id,
+                              token.refresh_token,
+                              token.access_token,
+                              token.expiration.isoformat() if token.expiration else None))
 
     def get_access_token(self, character_name: str, refresh=False) -> str:
         return self.get_token_data(character_name, refresh).access_token
 
+    def get_cached_access_token(self, character_name: str) -> str:
+        """ access token without a network call as long as the cached token is still valid, which is always the case
+            while a TokenRefresher is running. Falls back to a synchronous refresh otherwise """
+        t = self.character_tokens.get(character_name)
+        if (t is not None and t.access_token is not None and t.expiration is not None
+                and t.expiration > datetime.now()):
+            return t.access_token
+        return self.get_access_token(character_name)
+
     def get_token_data(self, character_name: str, refresh=False) -> TokenData:
         try:
             t = self.character_tokens[character_name]  # type: TokenData
         except KeyError:
             raise TokenError("No access token found for character %s" % (character_name,))
-        if t.access_token is None or t.expiration <= datetime.now() or refresh:
-            t = self._load_new_token(t)
+        if t.access_token is None or t.expiration is None or t.expiration <= datetime.now() or refresh:
+            with self.lock:
+                refresh_lock = self.refresh_locks.setdefault(character_name, threading.Lock())
+            with refresh_lock:  # one refresh per character at a time, different characters refresh concurrently
+                current = self.character_tokens[character_name]
+                if current is not t and not refresh:
+                    return current  # another thread refreshed it while we waited for the lock
+                t = self._load_new_token(current)
         return t
 
     def get_character_id(self, character_name: str):
@@ -65,8 +116,10 @@ class TokenManager:
             'grant_type': 'refresh_token',
             'refresh_token': token.refresh_token
         }
-        r = requests.post('https://login.eveonline.com/oauth/token', payload, headers=self.__headers)
-        # todo: check response status
+        with RunProfile.phase('token refresh'):
+            r = self.session.post(self.oauth_url + '/token', payload, headers=self.__headers)
+        if r.status_code != 200:
+            raise TokenError("error refreshing token for %s: %s %s" % (token.character_name, r.status_code, r.text))
         response_dict = json.loads(r.text)
         request_time = datetime.now()
         new_token = token._replace(refresh_token=response_dict['refresh_token'],
@@ -85,8 +138,8 @@ class TokenManager:
             'code': access_code
         }
         request_time = datetime.now()
-        r = requests.post('https://login.eveonline.com/oauth/token', payload, headers=self.__headers)
-        print("https://login.eveonline.com/oauth/token payload=%s headers=%s" % (payload, self.__headers))
+        r = self.session.post(self.oauth_url + '/token', payload, headers=self.__headers)
+        print("%s/token payload=%s headers=%s" % (self.oauth_url, payload, self.__headers))
 
         print(r.text)
         print(r.headers)
@@ -98,7 +151,7 @@ class TokenManager:
                           character_id=character_id,
                           refresh_token=response_dict['refresh_token'],
                           access_token=response_dict['access_token'],
-                          expiration=request_time + timedelta(response_dict['expires_in'])
+                          expiration=request_time + timedelta(seconds=response_dict['expires_in'])
                           )
         self.persist_token(token)
         return token.access_token
@@ -108,7 +161,7 @@ class TokenManager:
             'Authorization': b'Bearer ' + access_token.encode('utf-8'),
             'Host': 'login.eveonline.com'
         }
-        verify_result = requests.get('https://login.eveonline.com/oauth/verify', headers=verify_headers)
+        verify_result = self.session.get(self.oauth_url + '/verify', headers=verify_headers)
         verify_dict = json.loads(verify_result.text)
         print("verify_dict")
         print(verify_dict)
@@ -140,11 +193,86 @@ class TokenManager:
                 "esi-ui.write_waypoint.v1"
             ])
                 })
-        code_request_url = "https://login.eveonline.com/oauth/authorize/?" + query_string
+        code_request_url = self.oauth_url + "/authorize/?" + query_string
         print(code_request_url)
         webbrowser.open(code_request_url)
 
 
+class TokenRefresher:
+    """
+    Refreshes the access tokens of all characters in a background thread shortly before they expire, so callers of
+    TokenManager.get_cached_access_token never wait on the SSO server.  Tokens due at the same time are refreshed
+    concurrently.  Used as a context manager it runs for the duration of the block:
+        with TokenRefresher(token_manager): ...
+    """
+
+    def __init__(self, token_manager: TokenManager, refresh_margin=timedelta(minutes=2), max_workers=4,
+                 retry_delay=timedelta(seconds=30)):
+        self.token_manager = token_manager
+        self.refresh_margin = refresh_margin
+        self.max_workers = max_workers
+        self.retry_delay = retry_delay
+        self.stop_event = threading.Event()
+        self.thread = None  # type: threading.Thread
+
+    def start(self):
+        """ refresh anything already due, then keep refreshing in a daemon thread.  A failed refresh is printed, the
+            token is then refreshed on demand as without a refresher """
+        try:
+            self.refresh_due()
+        except Exception as e:
+            print("Error refreshing tokens: {}".format(e))
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='TokenRefresher', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self) -> 'TokenRefresher':
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def refresh_due(self) -> List[str]:
+        """ refresh every token expiring within refresh_margin, returns the names of the refreshed characters """
+        refresh_before = datetime.now() + self.refresh_margin
+        due = [t for t in list(self.token_manager.character_tokens.values())
+               if t.refresh_token is not None and (t.expiration is None or t.expiration <= refresh_before)]
+        if len(due) == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(lambda t: self.token_manager.get_token_data(t.character_name, refresh=True), due))
+        return [t.character_name for t in due]
+
+    def next_refresh_time(self) -> datetime:
+        expirations = [t.expiration for t in list(self.token_manager.character_tokens.values())
+                       if t.refresh_token is not None and t.expiration is not None]
+        if len(expirations) == 0:
+            return datetime.now() + self.retry_delay
+        return min(expirations) - self.refresh_margin
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            wait_seconds = max((self.next_refresh_time() - datetime.now()).total_seconds(), 0.0)
+            if self.stop_event.wait(wait_seconds):
+                break
+            try:
+                self.refresh_due()
+            except Exception as e:
+                print("Error refreshing tokens: {}".format(e))
+                self.stop_event.wait(self.retry_delay.total_seconds())
+
+
+def _parse_expiration(value):
+    return datetime.fromisoformat(value) if value else None
+
+
 if __name__ == '__main__':
     # #####  Adding new character ######
     #    uncomment the following and run the function:
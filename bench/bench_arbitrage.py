@@ -0,0 +1,39 @@
+""" building an order book and matching it for arbitrage, on random orders shaped like several regions' markets
+
+usage: python bench/bench_arbitrage.py [order_count]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from Arbitrage import OrderBook, ArbitrageFinder
+from AssetValuation import VolumeTable
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3000000
+    rnd = np.random.RandomState(1)
+    type_count = 20000
+    base_price = rnd.lognormal(8, 2, type_count)
+    type_id = rnd.randint(0, type_count, n)
+    is_buy = rnd.rand(n) < 0.4
+    price = base_price[type_id] * np.where(is_buy, rnd.normal(0.9, 0.08, n), rnd.normal(1.1, 0.08, n))
+    system_id = rnd.randint(30000001, 30000200, n)
+    jumps = {s: frozenset(x for x in (s - 1, s + 1) if 30000001 <= x < 30000200) for s in range(30000001, 30000200)}
+    volumes = VolumeTable.from_rows((t, float(v)) for t, v in enumerate(rnd.lognormal(0, 2, type_count)))
+
+    start = time.perf_counter()
+    book = OrderBook(type_id, is_buy, price, rnd.randint(1, 10000, n), system_id + 30000000, system_id)
+    built = time.perf_counter()
+    found = ArbitrageFinder(book, volumes, jumps).find(max_results=50)
+    done = time.perf_counter()
+    print('{:,} orders: book {:.2f}s, matching and scoring {:.2f}s, {} opportunities'.format(
+        n, built - start, done - built, len(found)))
+
+
+if __name__ == '__main__':
+    main()
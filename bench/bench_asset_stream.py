@@ -0,0 +1,94 @@
+""" peak memory and time of loading a large asset response: json.loads plus the separate index dicts the report
+used to build, versus the streaming parser with interning and a single-pass container index.  Then the memory held
+once names and totals are filled in, with the assets as dicts and as AssetRecords
+
+usage: python bench/bench_asset_stream.py [asset_count]
+"""
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from AssetStream import iter_json_array, index_assets
+
+FLAGS = ['Hangar', 'Cargo', 'DroneBay', 'HiSlot0', 'LoSlot1', 'Unlocked', 'Locked']
+LOCATION_TYPES = ['station', 'other', 'solar_system']
+
+
+def make_payload(count: int) -> bytes:
+    rnd = random.Random(1)
+    return json.dumps([{'item_id': 1000000000000 + i,
+                        'type_id': rnd.randrange(1, 40000),
+                        'location_id': rnd.choice([60003760, 60008494, 60011866, 1000000000000 + rnd.randrange(count)]),
+                        'location_type': rnd.choice(LOCATION_TYPES),
+                        'location_flag': rnd.choice(FLAGS),
+                        'is_singleton': rnd.random() < 0.1,
+                        'quantity': rnd.randrange(1, 1000)} for i in range(count)]).encode('utf-8')
+
+
+def load_whole(payload: bytes):
+    asset_list = json.loads(payload.decode('utf-8'))
+    singletons = {x['item_id']: x for x in asset_list if x['is_singleton']}
+    assets_by_id = {a['item_id']: a for a in asset_list}
+    return asset_list, singletons, assets_by_id
+
+
+def load_streaming(payload: bytes):
+    chunks = (payload[i:i + 65536] for i in range(0, len(payload), 65536))
+    return index_assets(iter_json_array(chunks))
+
+
+def locate(asset_list):
+    """ the fields locate_assets and the valuation add, the location names differ per container as they do there """
+    for a in asset_list:
+        a['type_name'] = 'Type {}'.format(a['type_id'] % 500)
+        a['category_id'] = 4
+        a['group_id'] = 18
+        a['location_name'] = 'Station {}'.format(a['location_id'] % 1000)
+        a['station_id'] = a['location_id']
+        a['total_value'] = 1.5 * a['quantity']
+        a['total_volume'] = 0.01 * a['quantity']
+    return asset_list
+
+
+def located_dicts(payload: bytes):
+    chunks = (payload[i:i + 65536] for i in range(0, len(payload), 65536))
+    return locate(list(iter_json_array(chunks)))
+
+
+def located_records(payload: bytes):
+    asset_list = locate(load_streaming(payload)[0])
+    for a in asset_list:
+        a.set_names(a.type_name, a.location_name)
+    return asset_list
+
+
+def measure(name, fn, payload):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(payload)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('  {:<10} {:8.0f} ms   retained {:7.1f} MB   peak {:7.1f} MB'.format(
+        name, elapsed * 1000, current / 2 ** 20, peak / 2 ** 20))
+    return result
+
+
+def run(count=100000):
+    payload = make_payload(count)
+    print('{:,d} assets, {:.1f} MB payload'.format(count, len(payload) / 2 ** 20))
+    measure('json.loads', load_whole, payload)
+    measure('streaming', load_streaming, payload)
+    measure('dicts', located_dicts, payload)
+    measure('records', located_records, payload)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,42 @@
+""" time to chart many characters locally: history for each character is stored daily for a few years, then
+write_charts renders a page per character and the dashboard
+
+usage: python bench/bench_money_chart.py [character_count] [days]
+"""
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from CacheManager import CacheManager
+from MoneyChart import MoneyChart
+from TokenManager import TokenManager, TokenData
+
+
+def run(character_count=15, days=5 * 365):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = Path(temp_dir)
+        cache_manager = CacheManager(data_dir)
+        token_manager = TokenManager(data_dir)
+        start = date.today() - timedelta(days=days)
+        names = ['Character {}'.format(i) for i in range(character_count)]
+        for character_id, name in enumerate(names, 1):
+            token_manager.persist_token(TokenData(name, character_id, 'refresh', 'access',
+                                                  datetime.now() + timedelta(hours=1)))
+            for day in range(days):
+                cache_manager.put_historical_values(character_id, 1e9 + day * 1e6, 2e8, 5e7, 3e8, 1e8,
+                                                    value_date=start + timedelta(days=day))
+        print('{} characters, {:,d} days of history each'.format(character_count, days))
+        chart = MoneyChart(cache_manager, token_manager)
+        for max_points in (None, 500):
+            begin = time.perf_counter()
+            chart.write_charts(names, data_dir / 'Reports', max_points=max_points)
+            print('  max_points={:<5} {:8.0f} ms'.format(str(max_points), (time.perf_counter() - begin) * 1000))
+        cache_manager.close()
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 15, int(sys.argv[2]) if len(sys.argv) > 2 else 5 * 365)
@@ -0,0 +1,43 @@
+""" time loading the memory-mapped price table and pricing a large asset list
+
+usage: python bench/bench_price_table.py
+"""
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from DataTypes import MarketPriceData
+from PriceTable import PriceTable
+
+
+def run(type_count=15000, asset_count=50000):
+    rng = np.random.default_rng(1)
+    type_ids = rng.choice(60000, size=type_count, replace=False)
+    table = PriceTable.from_price_data((MarketPriceData(int(t), float(t) * 1.5, float(t)) for t in type_ids),
+                                       datetime.now() + timedelta(hours=1))
+    asset_type_ids = rng.choice(type_ids, size=asset_count)
+    with tempfile.TemporaryDirectory() as d:
+        filename = Path(d) / 'market_prices.bin'
+        table.save(filename)
+
+        start = time.perf_counter()
+        loaded = PriceTable.load(filename)
+        loaded_at = time.perf_counter()
+        prices = loaded.get_prices(asset_type_ids)
+        priced_at = time.perf_counter()
+
+        print('{:,d} prices, {:,d} assets'.format(type_count, asset_count))
+        print('  load   {:8.2f} ms'.format((loaded_at - start) * 1000))
+        print('  price  {:8.2f} ms'.format((priced_at - loaded_at) * 1000))
+        print('  total value {:,.0f}'.format(prices.sum()))
+        del loaded
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,95 @@
+""" paged asset download against the fake ESI server: the same synthetic recording replayed with per-request latency
+and a page size, fetched sequentially and with the concurrent pager.  A recorded cassette can be given instead, with
+the name of the character it was recorded for the replayed AssetReporter report and Sweeper2 station valuation are
+timed as well (these read the static data in Config.dataDir, reports and snapshots go to a temp directory)
+
+record:  cassette = Cassette(); record_api(api, cassette); write_report(name, api); _get_station_info(api, sda)
+         cassette.save(path)
+usage: python bench/bench_replay.py [asset_count] [latency_seconds] [cassette_file] [character_name]
+"""
+import json
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import Config
+import Context
+from CacheManager import CacheManager
+from ESI_Api import ESI_Api
+from EsiReplay import Cassette, FakeEsiServer
+from TokenManager import TokenManager, TokenData
+
+CHARACTER_ID = 90000001
+
+
+def make_cassette(count: int) -> Cassette:
+    rnd = random.Random(1)
+    assets = [{'item_id': 1000000000000 + i, 'type_id': rnd.randrange(1, 40000), 'location_id': 60003760,
+               'location_type': 'station', 'location_flag': 'Hangar', 'is_singleton': False,
+               'quantity': rnd.randrange(1, 1000)} for i in range(count)]
+    cassette = Cassette()
+    cassette.add('GET', 'https://esi.tech.ccp.is/latest/characters/{}/assets/?datasource=tranquility'.format(
+        CHARACTER_ID), None, 200, {'Content-Type': 'application/json'}, json.dumps(assets), 0.0)
+    return cassette
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    cassette = Cassette.load(Path(sys.argv[3])) if len(sys.argv) > 3 else make_cassette(count)
+    character_name = sys.argv[4] if len(sys.argv) > 4 else None
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with FakeEsiServer(cassette, latency=latency, page_size=1000) as server:
+            api = make_api(Path(temp_dir), 'Bench', server)
+            character_id = CHARACTER_ID if character_name is None else next(
+                int(m.group(1)) for m in (re.search(r'/characters/(\d+)/assets/', i['path'])
+                                          for i in cassette.interactions) if m)
+            for workers in (1, 8):
+                start = time.perf_counter()
+                pages = list(api.iter_pages('/characters/{}/assets/', character_id, max_workers=workers))
+                print('{} workers: {} pages, {} assets in {:.2f}s'.format(
+                    workers, len(pages), sum(len(p) for p in pages), time.perf_counter() - start))
+            print(api.scheduler.metrics_report())
+            api.cache_manager.close()
+        if character_name is not None:
+            bench_report_and_sweep(Path(temp_dir), cassette, latency, character_name, character_id)
+
+
+def make_api(data_dir: Path, character_name: str, server: FakeEsiServer, character_id=CHARACTER_ID) -> ESI_Api:
+    """ api with its own token and cold caches in data_dir, answered by the server """
+    token_manager = TokenManager(data_dir)
+    token_manager.persist_token(TokenData(character_name, character_id, 'refresh', 'access',
+                                          datetime.now() + timedelta(hours=1)))
+    api = ESI_Api(character_name, token_manager=token_manager, cache_manager=CacheManager(data_dir))
+    server.configure(api)
+    api.use_response_cache = False
+    return api
+
+
+def bench_report_and_sweep(temp_dir: Path, cassette: Cassette, latency: float, character_name: str,
+                           character_id: int):
+    """ the report and the sweep valuation as recorded, each with cold caches """
+    from AssetReporter import write_report
+    from Sweeper2 import _get_station_info
+    sda = Context.static_data()
+    Config.dataDir = temp_dir  # reports and snapshots, the static data is already open
+    for name, run in (('report', lambda api: write_report(character_name, api, sda, print_stats=False)),
+                      ('sweep', lambda api: _get_station_info(api, sda))):
+        data_dir = temp_dir / name
+        data_dir.mkdir()
+        with FakeEsiServer(cassette, latency=latency) as server:
+            api = make_api(data_dir, character_name, server, character_id)
+            start = time.perf_counter()
+            run(api)
+            print('replayed {}: {:.2f}s, {} requests'.format(name, time.perf_counter() - start, server.request_count))
+            api.cache_manager.close()
+
+
+if __name__ == '__main__':
+    main()
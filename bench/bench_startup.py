@@ -0,0 +1,51 @@
+""" import cost of the entry point modules, from python -X importtime in a fresh interpreter per module.
+Shows the total and the most expensive imports pulled in, so a heavy dependency creeping back into a module's import
+path is easy to spot
+
+usage: python bench/bench_startup.py [module ...]
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+MODULES = ['TokenManager', 'StaticDataAccessor', 'Sweeper2', 'ESI_Api', 'MoneyChart', 'AssetReporter']
+
+
+def import_times(module: str):
+    """ (total microseconds, [(cumulative microseconds, module)] for the imports made directly by module) """
+    r = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                       cwd=str(PACKAGE_DIR), capture_output=True, text=True)
+    if r.returncode != 0:
+        raise RuntimeError(r.stderr.strip().splitlines()[-1])
+    entries = []
+    for line in r.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        entries.append((int(cumulative), name[1:]))  # the indent of name gives the nesting depth
+    # children are listed before their parent, the module's own imports are the indented lines just above it
+    end = next(i for i, (_, name) in enumerate(entries) if name == module)
+    children = []
+    for cumulative, name in reversed(entries[:end]):
+        if not name.startswith(' '):
+            break
+        if not name.startswith('   '):
+            children.append((cumulative, name.strip()))
+    return entries[end][0], children
+
+
+def main():
+    for module in sys.argv[1:] or MODULES:
+        try:
+            total, children = import_times(module)
+        except RuntimeError as e:
+            print('{:<20} failed: {}'.format(module, e))
+            continue
+        heavy = sorted(children, reverse=True)[:4]
+        print('{:<20} {:>8.1f} ms   {}'.format(module, total / 1000,
+                                                ', '.join('{} {:.0f}'.format(n, t / 1000) for t, n in heavy)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+""" valuing an asset list: the per-asset loop the report used (a price lookup and a volume query per asset, then
+dict sums per location) versus the columnar engine with grouped sums
+
+usage: python bench/bench_valuation.py [asset_count]
+"""
+import random
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from AssetValuation import ValuationEngine, VolumeTable, group_sums
+from DataTypes import MarketPriceData
+from PriceTable import PriceTable
+
+TYPE_COUNT = 40000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rnd = random.Random(1)
+    price_table = PriceTable.from_price_data(
+        (MarketPriceData(t, rnd.random() * 1e6, rnd.random() * 1e6) for t in range(1, TYPE_COUNT)),
+        datetime.now() + timedelta(hours=1))
+    volume_rows = [(t, rnd.random() * 100) for t in range(1, TYPE_COUNT)]
+    db = sqlite3.connect(':memory:')
+    db.execute('create table invTypes (typeID integer primary key, volume float)')
+    db.executemany('insert into invTypes values (?, ?)', volume_rows)
+    assets = [{'type_id': rnd.randrange(1, TYPE_COUNT), 'quantity': rnd.randrange(1, 1000),
+               'location_name': 'station {}'.format(rnd.randrange(200))} for _ in range(count)]
+
+    start = time.perf_counter()
+    by_location = defaultdict(list)
+    for a in assets:
+        quantity = max(1, a['quantity'])
+        a['total_value'] = price_table.get_price(a['type_id']) * quantity
+        a['total_volume'] = db.execute('select volume from invTypes where typeID=?', (a['type_id'],)).fetchone()[0] \
+            * quantity
+        by_location[a['location_name']].append(a)
+    loop_values = {loc: sum(i['total_value'] for i in items) for loc, items in by_location.items()}
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = ValuationEngine(price_table, VolumeTable.from_rows(volume_rows))
+    values, volumes = engine.value_items(assets)
+    engine_values = group_sums([a['location_name'] for a in assets], values)
+    engine_time = time.perf_counter() - start
+
+    assert all(abs(loop_values[k] - engine_values[k]) <= 1e-6 * abs(loop_values[k]) for k in loop_values)
+    print('{} assets: per-asset loop {:.3f}s, columnar {:.3f}s'.format(count, loop_time, engine_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+""" local stand-in for the ESI server used by the api tests """
+import json
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+from CacheManager import CacheManager
+from ESI_Api import ESI_Api
+from TokenManager import TokenManager, TokenData
+
+CHARACTER_ID = 90000001
+
+ASSETS = [
+    {'item_id': 1, 'type_id': 670, 'location_id': 60000001, 'location_type': 'station', 'is_singleton': True,
+     'location_flag': 'Hangar', 'quantity': 1},
+    {'item_id': 2, 'type_id': 34, 'location_id': 1, 'location_type': 'other', 'is_singleton': False,
+     'location_flag': 'Cargo', 'quantity': 100},
+    {'item_id': 3, 'type_id': 35, 'location_id': 60000002, 'location_type': 'station', 'is_singleton': False,
+     'location_flag': 'Hangar', 'quantity': 10},
+    {'item_id': 4, 'type_id': 34, 'location_id': 60000002, 'location_type': 'station', 'is_singleton': False,
+     'location_flag': 'Hangar', 'quantity': 5},
+    {'item_id': 5, 'type_id': 999, 'location_id': 60000003, 'location_type': 'station', 'is_singleton': False,
+     'location_flag': 'Hangar', 'quantity': 1},
+]
+
+
+class StubEsiHandler(BaseHTTPRequestHandler):
+    """ assets (split into server.page_size pages), wallet, orders, market prices, stations and types.  Type 999 and station 60000003 do not exist.
+        Optionally sends ETag (answering 304 to a matching If-None-Match), Expires and error limit headers, and can
+        fail a path with given statuses a number of times """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        server = self.server
+        if url.path == '/char/MarketOrders.xml.aspx':
+            return self.xml_orders()
+        with server.lock:
+            server.requests[url.path] += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            with server.lock:
+                failures = server.failures.get(url.path)
+                status = failures.pop(0) if failures else None
+            if status is not None:
+                body, headers = None, {}
+            else:
+                body, headers = self.route(url.path, int(query.get('page', ['1'])[0]))
+        finally:
+            with server.lock:
+                server.active -= 1
+        if server.error_limit_remain is not None:
+            headers['X-Esi-Error-Limit-Remain'] = str(server.error_limit_remain)
+            headers['X-Esi-Error-Limit-Reset'] = str(server.error_limit_reset)
+        if body is not None and server.etags:
+            headers['ETag'] = '"{}"'.format(hash(json.dumps(body)))
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                self.send_response(304)
+                self.send_header('ETag', headers['ETag'])
+                self.end_headers()
+                return
+        if body is not None and server.expires_in is not None:
+            headers['Expires'] = formatdate(time.time() + server.expires_in, usegmt=True)
+        if body is None:
+            self.send_response(status or 404)
+            payload = b'{"error": "not found"}' if status is None else b'{"error": "stub failure"}'
+        else:
+            self.send_response(200)
+            payload = json.dumps(body).encode('utf-8')
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        ids = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+        with self.server.lock:
+            self.server.requests['POST ' + url.path] += 1
+            failures = self.server.failures.get('POST ' + url.path)
+            status = failures.pop(0) if failures else None
+        names = [self.name_of(x) for x in ids] if url.path == '/universe/names/' else [None]
+        if status is not None:
+            self.send_response(status)
+            payload = b'{"error": "stub failure"}'
+        elif None in names:
+            self.send_response(404)
+            payload = b'{"error": "Ensure all IDs are valid before resolving."}'
+        else:
+            self.send_response(200)
+            payload = json.dumps(names).encode('utf-8')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def xml_orders(self):
+        """ the XML api's market orders, none """
+        with self.server.lock:
+            self.server.requests['/char/MarketOrders.xml.aspx'] += 1
+        payload = b'<eveapi version="2"><result><rowset name="orders" key="orderID"></rowset></result></eveapi>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    @staticmethod
+    def name_of(id):
+        if id in (999, 60000003):
+            return None
+        if 60000000 <= id < 70000000:
+            return {'id': id, 'category': 'station', 'name': 'Station {}'.format(id)}
+        if 30000000 <= id < 40000000:
+            return {'id': id, 'category': 'solar_system', 'name': 'System {}'.format(id)}
+        return {'id': id, 'category': 'inventory_type', 'name': 'Type {}'.format(id)}
+
+    def route(self, path, page):
+        m = re.match(r'/characters/(\d+)/(\w+)/', path)
+        if m and int(m.group(1)) not in self.server.character_ids:
+            return None, {}
+        if m and m.group(2) == 'assets':
+            size = self.server.page_size
+            page_count = (len(self.server.assets) + size - 1) // size
+            return self.server.assets[(page - 1) * size: page * size], {'X-Pages': str(page_count)}
+        if m and m.group(2) == 'wallet':
+            return self.server.wallet, {}
+        if m and m.group(2) == 'orders':
+            return self.server.orders, {}
+        if path == '/markets/prices/':
+            return self.server.prices, {}
+        m = re.match(r'/universe/stations/(\d+)/', path)
+        if m and m.group(1) != '60000003':
+            return {'name': 'Station {}'.format(m.group(1)), 'system_id': 30000001}, {}
+        m = re.match(r'/universe/types/(\d+)/', path)
+        if m and m.group(1) != '999':
+            return {'name': 'Type {}'.format(m.group(1)), 'description': 'd', 'group_id': 1}, {}
+        return None, {}
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubEsi:
+    """ runs the stub server and builds an ESI_Api for it, with tokens and caches in a temp directory """
+
+    def __init__(self, delay=0.0, page_size=1000, assets=ASSETS, etags=False, expires_in=None):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self.temp_dir.name)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubEsiHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = Counter()
+        self.server.active = 0
+        self.server.max_active = 0
+        self.server.delay = delay
+        self.server.page_size = page_size
+        self.server.assets = assets
+        self.server.character_ids = {CHARACTER_ID}  # characters with assets, wallet and orders, 404 for others
+        self.server.wallet = 1000.0
+        self.server.orders = []
+        self.server.prices = [{'type_id': 34, 'average_price': 5.0, 'adjusted_price': 5.0},
+                              {'type_id': 35, 'average_price': 10.0, 'adjusted_price': 9.0}]
+        self.server.etags = etags
+        self.server.expires_in = expires_in
+        self.server.failures = {}  # path ('POST ' + path for posts) -> statuses to answer before answering normally
+        self.server.error_limit_remain = None
+        self.server.error_limit_reset = 60
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+        self.token_manager = TokenManager(self.data_dir)
+        self.token_manager.persist_token(TokenData('Test', CHARACTER_ID, 'refresh', 'access',
+                                                   datetime.now() + timedelta(hours=1)))
+        self.cache_manager = CacheManager(self.data_dir)
+
+    def api(self) -> ESI_Api:
+        api = ESI_Api('Test', token_manager=self.token_manager, cache_manager=self.cache_manager)
+        api.esi_api_url = self.url
+        return api
+
+    def close(self):
+        self.cache_manager.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
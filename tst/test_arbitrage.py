@@ -0,0 +1,97 @@
+from unittest import TestCase
+
+import numpy as np
+
+from Arbitrage import OrderBook, ArbitrageFinder, match_orders, jump_distances, station_info_for_route, \
+    profit_per_m3
+from AssetValuation import VolumeTable
+
+HUB, HUB_SYSTEM = 60011866, 1
+FAR, FAR_SYSTEM = 60000001, 3
+NEAR, NEAR_SYSTEM = 60000002, 2
+JUMPS = {1: frozenset([2]), 2: frozenset([1, 3]), 3: frozenset([2]), 9: frozenset()}
+
+
+def order(type_id, is_buy, price, volume, location_id, system_id):
+    return {'type_id': type_id, 'is_buy_order': is_buy, 'price': price, 'volume_remain': volume,
+            'location_id': location_id, 'system_id': system_id}
+
+
+ORDERS = [
+    # type 34 sells cheap at FAR and NEAR, the hub buys 150 units at two prices
+    order(34, False, 10.0, 100, FAR, FAR_SYSTEM),
+    order(34, False, 11.0, 100, NEAR, NEAR_SYSTEM),
+    order(34, False, 30.0, 100, NEAR, NEAR_SYSTEM),  # too expensive to trade
+    order(34, True, 20.0, 120, HUB, HUB_SYSTEM),
+    order(34, True, 15.0, 30, HUB, HUB_SYSTEM),
+    order(34, True, 5.0, 1000, FAR, FAR_SYSTEM),  # below every sell
+    # type 35 has no profitable match
+    order(35, False, 100.0, 10, HUB, HUB_SYSTEM),
+    order(35, True, 101.0, 10, FAR, FAR_SYSTEM),
+    # type 36 only sells
+    order(36, False, 1.0, 10, FAR, FAR_SYSTEM),
+]
+
+
+class TestArbitrage(TestCase):
+
+    def setUp(self):
+        self.book = OrderBook.from_pages([ORDERS[:4], ORDERS[4:]])
+        self.finder = ArbitrageFinder(self.book, VolumeTable.from_rows([(34, 0.5)]), JUMPS, min_margin=0.05,
+                                      sales_tax=0.0)
+
+    def test_match_walks_depth(self):
+        fills = match_orders(self.book, min_margin=0.05, sales_tax=0.0)
+        self.assertEqual([34, 34, 34], fills['type_id'].tolist())
+        self.assertEqual([100, 20, 30], fills['quantity'].tolist())
+        self.assertEqual([10.0 * 100, 11.0 * 20, 11.0 * 30], fills['cost'].tolist())
+        self.assertEqual([20.0 * 100, 20.0 * 20, 15.0 * 30], fills['revenue'].tolist())
+
+    def test_sales_tax_and_margin(self):
+        fills = match_orders(self.book, min_margin=0.4, sales_tax=0.1)
+        # 15 * 0.9 = 13.5 is less than 1.4 times 11 or 10, 20 * 0.9 = 18 is at least 1.4 * 11
+        self.assertEqual([100, 20], fills['quantity'].tolist())
+
+    def test_no_orders(self):
+        book = OrderBook.from_pages([])
+        self.assertEqual(0, len(match_orders(book)['quantity']))
+        self.assertEqual([], ArbitrageFinder(book, VolumeTable.from_rows([]), JUMPS).find())
+
+    def test_find_combines_fills_and_scores(self):
+        found = self.finder.find(min_profit=0)
+        # 1000 profit over 2 jumps beats 300 in 1 jump
+        self.assertEqual([(FAR, HUB, 100, 2), (NEAR, HUB, 50, 1)],
+                         [(o.source_location_id, o.destination_location_id, o.quantity, o.jumps) for o in found])
+        near = found[1]
+        self.assertEqual(11.0 * 50, near.cost)
+        self.assertEqual(20.0 * 20 + 15.0 * 30, near.revenue)
+        self.assertEqual(near.revenue - near.cost, near.profit)
+        self.assertEqual(25.0, near.volume)
+        self.assertAlmostEqual(near.profit / 25.0, profit_per_m3(near))
+
+    def test_find_limits(self):
+        self.assertEqual([FAR], [o.source_location_id for o in self.finder.find(min_profit=500)])
+        self.assertEqual([NEAR], [o.source_location_id for o in self.finder.find(min_profit=0, max_volume=30)])
+        self.assertEqual([], self.finder.find(min_profit=0, destination_station_id=FAR))
+
+    def test_jump_distances(self):
+        self.assertEqual({1: 0, 2: 1, 3: 2}, jump_distances(JUMPS, 1))
+        self.assertIsNone(self.finder.jumps(1, 9))
+
+    def test_station_info_for_route(self):
+        info = station_info_for_route(self.finder.find(min_profit=0), HUB)
+        self.assertEqual({(NEAR_SYSTEM, NEAR), (FAR_SYSTEM, FAR)}, {(s.system_id, s.station_id) for s in info})
+        self.assertEqual(1000.0, next(s.total_value for s in info if s.station_id == FAR))
+
+    def test_large_book(self):
+        rnd = np.random.RandomState(1)
+        n = 200000
+        book = OrderBook(rnd.randint(1, 5000, n), rnd.rand(n) < 0.5, rnd.lognormal(3, 1, n), rnd.randint(1, 1000, n),
+                         rnd.randint(1, 50, n) + 60000000, rnd.randint(1, 50, n))
+        fills = match_orders(book, min_margin=0.05, sales_tax=0.02)
+        self.assertTrue(np.all(fills['revenue'] >= fills['cost'] * 1.05 - 1e-6))
+        # a fill never takes more than either order has
+        sold = np.bincount(fills['sell'], weights=fills['quantity'], minlength=len(book.sell.volume))
+        bought = np.bincount(fills['buy'], weights=fills['quantity'], minlength=len(book.buy.volume))
+        self.assertTrue(np.all(sold <= book.sell.volume))
+        self.assertTrue(np.all(bought <= book.buy.volume))
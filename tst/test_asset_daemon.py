@@ -0,0 +1,100 @@
+import json
+import time
+from datetime import datetime, timedelta
+from unittest import TestCase
+from urllib.request import urlopen
+
+from AssetDaemon import AssetDaemon
+from DataTypes import AssetValues
+from stub_esi import StubEsi, CHARACTER_ID
+
+
+class TestAssetDaemon(TestCase):
+
+    def setUp(self):
+        self.stub = StubEsi(etags=True, expires_in=300)
+        self.server = self.stub.server
+        self.reports = []
+        self.daemon = AssetDaemon([self.stub.api()], sda=object(), report=self.report, account_summary=None,
+                                  min_interval=timedelta(seconds=0.2))
+
+    def tearDown(self):
+        self.daemon.stop()
+        self.stub.close()
+
+    def report(self, character_name, api, sda, print_stats, pricing_mode, pricing_region, options, esi_orders=False):
+        self.reports.append(character_name)
+        self.inputs = api.assets(), api.esi_market_orders() if esi_orders else []
+        return AssetValues(datetime.now(), api.character_id, 1.0, 2.0, 3.0, api.wallet_balance(), 4.0)
+
+    def test_report_only_when_changed(self):
+        self.daemon.start()
+        self.assertEqual(['Test'], self.reports)
+        self.assertFalse(self.daemon.check('Test'))
+        self.assertEqual(1, self.server.requests['/characters/{}/wallet/'.format(CHARACTER_ID)])  # served from cache
+        # the report read the watched assets and ESI orders from the responses the check fetched
+        self.assertEqual(1, self.server.requests['/characters/{}/assets/'.format(CHARACTER_ID)])
+        self.assertEqual(1, self.server.requests['/characters/{}/orders/'.format(CHARACTER_ID)])
+        self.assertEqual(len(self.server.assets), len(self.inputs[0]))
+        self.assertEqual(len(self.server.orders), len(self.inputs[1]))
+
+        self.assertTrue(self.daemon.check('Test', force=True))
+        self.assertEqual(['Test', 'Test'], self.reports)
+
+    def test_schedules_checks_at_expiry(self):
+        self.daemon.start()
+        next_check = self.daemon.next_check[('Test', 'wallet')]
+        self.assertAlmostEqual(300, (next_check - datetime.now()).total_seconds(), delta=5)
+        self.assertIn((None, 'prices'), self.daemon.next_check)
+
+    def test_refetches_expired_and_regenerates_on_change(self):
+        self.server.expires_in = -10  # already expired, rechecked every min_interval
+        self.daemon.start()
+        wallet_path = '/characters/{}/wallet/'.format(CHARACTER_ID)
+        time.sleep(0.5)
+        self.assertGreater(self.server.requests[wallet_path], 1)
+        self.assertEqual(1, len(self.reports))  # revalidated but unchanged
+
+        self.server.wallet = 2000.0
+        deadline = time.time() + 5
+        while len(self.reports) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(2, len(self.reports))
+        self.assertEqual(2000.0, self.daemon.values['Test'].wallet_balance)
+
+    def test_price_change_regenerates(self):
+        self.server.expires_in = -10  # prices are fetched again on every check
+        self.daemon.min_interval = timedelta(minutes=1)
+        self.daemon.start()
+        self.assertFalse(self.daemon.check_prices())
+        self.assertFalse(self.daemon.check('Test', endpoints=[]))
+
+        self.server.prices[0]['average_price'] = 6.0
+        self.assertTrue(self.daemon.check_prices())
+        self.assertTrue(self.daemon.check('Test', endpoints=[]))
+        self.assertEqual(2, len(self.reports))
+
+    def test_failed_price_check_is_retried(self):
+        self.server.failures['/markets/prices/'] = [404]
+        self.daemon.start()
+        self.assertEqual(['Test'], self.reports)
+        self.assertNotIn((None, 'prices'), self.daemon.fingerprints)
+        deadline = time.time() + 5
+        while (None, 'prices') not in self.daemon.fingerprints and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertIn((None, 'prices'), self.daemon.fingerprints)
+
+    def test_http_interface(self):
+        self.daemon.start(port=0)
+        url = 'http://127.0.0.1:{}'.format(self.daemon.server.server_address[1])
+        status = json.loads(urlopen(url + '/status').read())
+        self.assertEqual(1, status['reports'])
+        self.assertEqual(1000.0, status['characters']['Test']['values']['wallet_balance'])
+
+        reply = json.loads(urlopen(url + '/report/Test').read())
+        self.assertFalse(reply['written'])
+        reply = json.loads(urlopen(url + '/report/Test?force=1').read())
+        self.assertTrue(reply['written'])
+        with self.assertRaises(Exception) as e:
+            urlopen(url + '/report/Nobody')
+        self.assertEqual(404, e.exception.code)
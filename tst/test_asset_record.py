@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+from AssetRecord import AssetRecord
+from DataTypes import MarketOrderData
+
+
+class TestAssetRecord(TestCase):
+
+    def test_from_json(self):
+        a = AssetRecord.from_json({'item_id': 1, 'type_id': 34, 'quantity': 5, 'location_id': 60000001,
+                                   'location_type': 'station', 'location_flag': 'Hangar', 'is_singleton': False})
+        self.assertEqual((1, 34, 5, 'station'), (a.item_id, a.type_id, a['quantity'], a['location_type']))
+        self.assertIsNone(a.type_name)
+        self.assertEqual(0.0, a.total_value)
+
+    def test_item_access(self):
+        a = AssetRecord(1, 34, None, 60000001, 'station', 'Hangar', False)
+        a['type_name'] = 'Tritanium'
+        self.assertEqual('Tritanium', a.type_name)
+        self.assertEqual(1, a.get('quantity', 1))
+        self.assertNotIn('station_id', a)
+        a.station_id = 60000001
+        self.assertIn('station_id', a)
+        with self.assertRaises(KeyError):
+            a['no_such_field']
+        with self.assertRaises(KeyError):
+            a['no_such_field'] = 1
+        self.assertFalse(hasattr(a, '__dict__'))
+
+    def test_names_are_interned(self):
+        a = AssetRecord(1, 34, 1, 2, 'other', 'Cargo', False)
+        b = AssetRecord(2, 34, 1, 2, 'other', 'Cargo', False)
+        a.set_names('Tritanium', '{}@{}'.format('Rifter', 'Jita IV'))
+        b.set_names('Tritanium', '{}@{}'.format('Rifter', 'Jita IV'))
+        self.assertIs(a.location_name, b.location_name)
+
+    def test_from_order(self):
+        o = MarketOrderData(9, 90000001, 'Test', 60000001, 'Jita IV', 100, 40, 'open', 34, 'Tritanium', 'station', 90,
+                            5.0, 'sell', 0.0, None)
+        a = AssetRecord.from_order(o)
+        self.assertEqual((9, 34, 40, 'Tritanium', 'Jita IV', 60000001),
+                         (a.item_id, a.type_id, a.quantity, a.type_name, a.location_name, a.station_id))
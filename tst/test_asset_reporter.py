@@ -0,0 +1,84 @@
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+import Config
+from AssetReporter import write_reports, write_account_summary
+from AssetValuation import VolumeTable
+from DataTypes import AssetValues
+from ESI_Api import ESI_Api
+from TokenManager import TokenData
+from stub_esi import StubEsi, CHARACTER_ID
+
+ALT_ID = CHARACTER_ID + 1
+
+
+class FakeSda:
+    def get_volume_table(self):
+        return VolumeTable.from_rows([(34, 0.01), (35, 0.01), (670, 1000.0)])
+
+
+class TestWriteReports(TestCase):
+
+    def setUp(self):
+        self.stub = StubEsi()
+        self.stub.server.character_ids.add(ALT_ID)
+        expiration = datetime.now() + timedelta(hours=1)
+        self.stub.token_manager.persist_token(TokenData('Alt', ALT_ID, 'refresh', 'access', expiration))
+        self.stub.token_manager.persist_token(TokenData('Broken', 1, 'refresh', 'access', expiration))  # no assets
+        self.data_dir = Config.dataDir
+        Config.dataDir = self.stub.data_dir
+        self.reports_dir = self.stub.data_dir / 'Reports'
+
+    def tearDown(self):
+        Config.dataDir = self.data_dir
+        self.stub.close()
+
+    def apis(self, names):
+        apis = [ESI_Api(name, token_manager=self.stub.token_manager, cache_manager=self.stub.cache_manager)
+                for name in names]
+        for api in apis:
+            api.esi_api_url = api.xml_api_url = self.stub.url
+        return apis
+
+    def test_reports_in_parallel(self):
+        names = ['Test', 'Alt', 'Broken']
+        values = write_reports(names, apis=self.apis(names), sda=FakeSda())
+        self.assertEqual({'Test', 'Alt'}, set(values))  # the failed character is left out
+        self.assertEqual(values['Test'][2:], values['Alt'][2:])  # same assets, wallet and orders
+        self.assertEqual(1000.0, values['Alt'].wallet_balance)
+        self.assertEqual(1, self.stub.server.requests['/markets/prices/'])  # fetched once for all reports
+
+        reports = sorted(p.name for p in self.reports_dir.glob('assets-*.txt'))
+        self.assertEqual(2, len(reports))
+        self.assertTrue(reports[0].startswith('assets-Alt-'))
+        summary = next(self.reports_dir.glob('account-summary-*.txt')).read_text().splitlines()
+        self.assertEqual(['Character', 'Alt', 'Test', 'Account'], [line.split()[0] for line in summary])
+
+    def test_no_characters(self):
+        self.assertEqual({}, write_reports([], apis=[], sda=FakeSda()))
+        self.assertFalse(self.reports_dir.exists())
+
+
+class TestAccountSummary(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = Config.dataDir
+        Config.dataDir = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        Config.dataDir = self.data_dir
+        self.temp_dir.cleanup()
+
+    def test_totals(self):
+        now = datetime.now()
+        write_account_summary({'B': AssetValues(now, 2, 100.0, 20.0, 3.0, 1000.0, 5.0),
+                               'A': AssetValues(now, 1, 1.0, 2.0, 3.0, 4.0, 5.0)})
+        lines = next((Config.dataDir / 'Reports').glob('account-summary-*.txt')).read_text().splitlines()
+        self.assertEqual(4, len(lines))
+        # columns: assets, open orders, escrow, ships, wallet, net worth
+        self.assertEqual(['A', '1', '2', '5', '3', '4', '15'], lines[1].split())
+        self.assertEqual(['B', '100', '20', '5', '3', '1,000', '1,128'], lines[2].split())
+        self.assertEqual(['Account', 'total', '101', '22', '10', '6', '1,004', '1,143'], lines[3].split())
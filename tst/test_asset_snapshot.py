@@ -0,0 +1,103 @@
+import io
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from ReportWriter import write_changes
+from AssetSnapshot import AssetSnapshot, AssetDiff, SnapshotStore
+from test_asset_valuation import make_engine
+
+PRICES = 'digest-1'
+
+
+def asset(item_id, type_id, quantity, location_id):
+    return {'item_id': item_id, 'type_id': type_id, 'quantity': quantity, 'location_id': location_id}
+
+
+def snapshot(assets, taken, price_digest=PRICES) -> AssetSnapshot:
+    return AssetSnapshot.from_assets(assets, ['loc-{}'.format(a['location_id']) for a in assets], price_digest,
+                                     taken)
+
+
+class CountingEngine:
+    """ records how many items were valued """
+    def __init__(self):
+        self.engine = make_engine()
+        self.valued = 0
+
+    def value(self, type_ids, quantities):
+        self.valued += len(type_ids)
+        return self.engine.value(type_ids, quantities)
+
+
+class TestAssetSnapshot(TestCase):
+
+    def setUp(self):
+        self.before = snapshot([asset(1, 34, 100, 10), asset(2, 35, 5, 10), asset(3, 670, 1, 20)],
+                               datetime(2026, 10, 18, 12, 0))
+        self.before.revalue(make_engine())
+        self.after = snapshot([asset(1, 34, 100, 10), asset(2, 35, 7, 10), asset(3, 670, 1, 30), asset(4, 34, 1, 20)],
+                              datetime(2026, 10, 19, 12, 0))
+
+    def test_diff(self):
+        diff = AssetDiff(self.before, self.after)
+        self.assertEqual([0, 1, 2, -1], diff.matched.tolist())
+        self.assertEqual([3], diff.added.tolist())
+        self.assertEqual([], diff.removed.tolist())
+        self.assertEqual([1], diff.quantity_changed.tolist())
+        self.assertEqual([2], diff.moved.tolist())
+        self.assertTrue(diff)
+        self.assertFalse(AssetDiff(self.before, self.before))
+
+    def test_removed(self):
+        diff = AssetDiff(self.after, self.before)
+        self.assertEqual([3], diff.removed.tolist())
+
+    def test_revalue_only_changed_rows(self):
+        engine = CountingEngine()
+        self.after.revalue(engine, self.before, AssetDiff(self.before, self.after))
+        self.assertEqual(2, engine.valued)  # the quantity change and the added item
+        full = snapshot([asset(1, 34, 100, 10), asset(2, 35, 7, 10), asset(3, 670, 1, 30), asset(4, 34, 1, 20)],
+                        self.after.taken)
+        full.revalue(make_engine())
+        np.testing.assert_allclose(full.value, self.after.value)
+        np.testing.assert_allclose(full.volume, self.after.volume)
+
+    def test_revalue_all_with_new_prices(self):
+        engine = CountingEngine()
+        later = snapshot([asset(1, 34, 100, 10)], self.after.taken, 'digest-2')
+        later.revalue(engine, self.before, AssetDiff(self.before, later))
+        self.assertEqual(1, engine.valued)
+
+    def test_location_changes(self):
+        self.after.revalue(make_engine())
+        changes = AssetDiff(self.before, self.after).location_changes()
+        self.assertEqual(['loc-30', 'loc-20', 'loc-10'], [c[0] for c in changes])
+        self.assertEqual(('loc-20', 1000.0, 5.0), changes[1])
+
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = SnapshotStore(Path(temp_dir), keep=1)
+            self.assertIsNone(store.latest(1))
+            store.put(1, self.before)
+            self.after.revalue(make_engine())
+            store.put(1, self.after)
+            self.assertEqual(1, len(list((Path(temp_dir) / '1').iterdir())))
+            loaded = store.latest(1)
+            self.assertEqual(self.after.taken, loaded.taken)
+            self.assertEqual(PRICES, loaded.price_digest)
+            self.assertEqual(self.after.item_id.tolist(), loaded.item_id.tolist())
+            self.assertEqual(self.after.location.tolist(), loaded.location.tolist())
+            np.testing.assert_allclose(self.after.value, loaded.value)
+
+    def test_write_changes(self):
+        self.after.revalue(make_engine())
+        f = io.StringIO()
+        write_changes(f, AssetDiff(self.before, self.after), lambda type_id: 'type-{}'.format(type_id))
+        report = f.getvalue()
+        self.assertIn('Changes since 2026-10-18 12:00', report)
+        self.assertIn('5 -> 7 x type-35 in loc-10', report)
+        self.assertIn('type-670 loc-20 -> loc-30', report)
@@ -0,0 +1,46 @@
+import json
+from unittest import TestCase
+
+from AssetStream import iter_json_array, index_assets
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestAssetStream(TestCase):
+
+    def setUp(self):
+        self.records = [{'item_id': i, 'type_id': 34 + i, 'location_id': 60000001, 'location_flag': 'Hangar',
+                         'location_type': 'station', 'quantity': i, 'is_singleton': i % 3 == 0,
+                         'name': 'café ☃ {}'.format(i), 'price': i * 1.25}
+                        for i in range(50)]
+        self.payload = json.dumps(self.records, indent=1).encode('utf-8')
+
+    def test_any_chunk_size(self):
+        for size in (1, 2, 3, 7, 64, 100000):
+            self.assertEqual(self.records, list(iter_json_array(chunked(self.payload, size))), size)
+
+    def test_numbers_split_across_chunks(self):
+        self.assertEqual([12345, 6.5, 'x'], list(iter_json_array([b'[123', b'45, 6', b'.5 ,"x"', b']'])))
+        self.assertEqual([12345], list(iter_json_array([b'[12345', b']'])))
+
+    def test_empty_array(self):
+        self.assertEqual([], list(iter_json_array([b' [ ', b' ]'])))
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'{"a": 1}']))
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'[{"a": 1}, {"b"']))
+
+    def test_strings_are_interned(self):
+        parsed = list(iter_json_array(chunked(self.payload, 10)))
+        self.assertIs(parsed[0]['location_flag'], parsed[1]['location_flag'])
+        self.assertIs(next(iter(parsed[0])), next(iter(parsed[1])))  # keys shared as well
+
+    def test_index_assets(self):
+        asset_list, containers = index_assets(iter_json_array([self.payload]))
+        self.assertEqual(50, len(asset_list))
+        self.assertEqual(list(range(0, 50, 3)), sorted(containers.keys()))
+        self.assertIs(asset_list[3], containers[3])
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+import numpy as np
+
+from AssetRecord import AssetRecord
+from AssetValuation import VolumeTable, ValuationEngine, factorize, group_sums
+from DataTypes import MarketPriceData
+from LocationTree import LocationTree
+from PriceTable import PriceTable
+from Sweeper2 import _get_station_info, StationInfo
+
+
+def make_engine() -> ValuationEngine:
+    prices = PriceTable.from_price_data([MarketPriceData(34, 5.0, 4.0), MarketPriceData(35, None, 10.0),
+                                         MarketPriceData(670, 1000.0, None), MarketPriceData(3000, 1.0, None)],
+                                        datetime.now() + timedelta(hours=1))
+    volumes = VolumeTable.from_rows([(670, 1000.0), (35, 0.01), (34, 0.01), (3000, 5000.0)])
+    return ValuationEngine(prices, volumes)
+
+
+class FakeSda:
+    def __init__(self, volume_table):
+        self.volume_table = volume_table
+
+    def get_volume_table(self):
+        return self.volume_table
+
+    def get_systems_for_stations(self, station_ids):
+        return {s: s // 10 for s in station_ids if s != 99}
+
+
+class FakeApi:
+    def __init__(self, engine, assets):
+        self.engine = engine
+        self._assets = []
+        for a in assets:
+            record = AssetRecord.from_json(dict(a, is_singleton=a['category_id'] == 6))
+            record.category_id = a['category_id']
+            self._assets.append(record)
+
+    def get_price_table(self):
+        return self.engine.price_table
+
+    def get_region_id(self, region_name):
+        return 10000002
+
+    def assets_and_tree(self):
+        return self._assets, LocationTree(self._assets, lambda a: a.category_id == 6)
+
+
+class TestAssetValuation(TestCase):
+
+    def test_value(self):
+        values, volumes = make_engine().value([34, 35, 670, 12345], [100, 0, 1, 5])
+        np.testing.assert_allclose([500.0, 10.0, 1000.0, 0.0], values)
+        np.testing.assert_allclose([1.0, 0.01, 1000.0, 0.0], volumes)
+
+    def test_value_items_sets_totals(self):
+        orders = [{'type_id': 34, 'vol_remaining': 10}, {'type_id': 35, 'vol_remaining': 2}]
+        make_engine().value_items(orders, 'vol_remaining')
+        self.assertEqual([50.0, 20.0], [o['total_value'] for o in orders])
+        self.assertAlmostEqual(0.1, orders[0]['total_volume'])
+
+    def test_empty(self):
+        values, volumes = make_engine().value_items([])
+        self.assertEqual(0, len(values))
+        self.assertEqual({}, group_sums([], values))
+
+    def test_factorize(self):
+        codes, labels = factorize(['b', 'a', 'b', None])
+        self.assertEqual([0, 1, 0, 2], codes.tolist())
+        self.assertEqual(['b', 'a', None], labels)
+
+    def test_group_sums_skips_none(self):
+        sums = group_sums(['a', None, 'b', 'a'], np.array([1.0, 2.0, 3.0, 4.0]))
+        self.assertEqual({'a': 5.0, 'b': 3.0}, sums)
+
+    def test_station_info(self):
+        engine = make_engine()
+        assets = [
+            {'item_id': 1, 'type_id': 34, 'quantity': 100, 'location_id': 10, 'location_type': 'station',
+             'category_id': 4},
+            {'item_id': 2, 'type_id': 670, 'quantity': 1, 'location_id': 10, 'location_type': 'station',
+             'category_id': 6},
+            {'item_id': 3, 'type_id': 35, 'quantity': 10, 'location_id': 2, 'location_type': 'other',
+             'category_id': 4},
+            {'item_id': 4, 'type_id': 3000, 'quantity': 1, 'location_id': 20, 'location_type': 'station',
+             'category_id': 2},
+            {'item_id': 5, 'type_id': 35, 'quantity': 3, 'location_id': 20, 'location_type': 'station',
+             'category_id': 4},
+            {'item_id': 6, 'type_id': 35, 'quantity': 3, 'location_id': 30000001, 'location_type': 'solar_system',
+             'category_id': 4},
+            {'item_id': 7, 'type_id': 35, 'quantity': 3, 'location_id': 99, 'location_type': 'station',
+             'category_id': 4},
+        ]
+        result = _get_station_info(FakeApi(engine, assets), FakeSda(engine.volume_table))
+        self.assertEqual([StationInfo(1, 10, 500.0, 1.0), StationInfo(2, 20, 30.0, 0.03)],
+                         [StationInfo(s.system_id, s.station_id, round(s.total_value, 6), round(s.total_volume, 6))
+                          for s in result])
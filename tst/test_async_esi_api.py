@@ -0,0 +1,66 @@
+import asyncio
+import time
+from unittest import TestCase
+
+from AsyncESI_Api import AsyncESI_Api
+from stub_esi import StubEsi, ASSETS
+
+
+class TestAsyncESI_Api(TestCase):
+
+    def setUp(self):
+        self.stub = StubEsi(delay=0.05)
+        self.server = self.stub.server
+        self.cache_manager = self.stub.cache_manager
+        self.api = AsyncESI_Api(self.stub.api(), max_concurrency=3)
+
+    def tearDown(self):
+        self.api.close()
+        self.stub.close()
+
+    def test_assets_resolves_names(self):
+        asset_list = asyncio.run(self.api.assets())
+        by_id = {a['item_id']: a for a in asset_list}
+        self.assertEqual('Station 60000001', by_id[1]['location_name'])
+        self.assertEqual('Type 670@Station 60000001', by_id[2]['location_name'])
+        self.assertEqual(60000001, by_id[2]['station_id'])
+        self.assertEqual('Type 34', by_id[4]['type_name'])
+        self.assertEqual('unknown-999', by_id[5]['type_name'])
+        self.assertEqual('unknown-60000003', by_id[5]['location_name'])
+        # each id requested once, never more than max_concurrency at a time
+        self.assertEqual(1, max(self.server.requests.values()))
+        self.assertEqual(8, sum(self.server.requests.values()))
+        self.assertLessEqual(self.server.max_active, 3)
+        self.assertIsNotNone(self.cache_manager.get_negative('type', 999))
+
+    def test_concurrent_requests_for_same_id_are_deduplicated(self):
+        async def lookups():
+            return await asyncio.gather(*(self.api.get_type_data(34) for _ in range(5)))
+        results = asyncio.run(lookups())
+        self.assertEqual({'Type 34'}, {td.type_name for td in results})
+        self.assertEqual(1, self.server.requests['/universe/types/34/'])
+
+    def test_lookups_overlap(self):
+        start = time.perf_counter()
+        asyncio.run(self.api.resolve_types(range(100, 106)))
+        elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 6 * self.server.delay)
+        self.assertEqual(3, self.server.max_active)
+
+    def test_paged_assets(self):
+        self.server.page_size = 2
+        asset_list = asyncio.run(self.api.call_paged('/characters/{}/assets/', self.api.api.character_id))
+        self.assertEqual([a['item_id'] for a in ASSETS], [a['item_id'] for a in asset_list])
+        self.assertEqual(3, sum(self.server.requests.values()))
+
+    def test_pages_download_while_page_1_is_processed(self):
+        self.server.page_size = 2
+
+        async def slow_consumer():
+            requested = []
+            async for _ in self.api.iter_pages('/characters/{}/assets/', self.api.api.character_id):
+                if not requested:
+                    await asyncio.sleep(0.3)
+                    requested.append(sum(self.server.requests.values()))
+            return requested
+        self.assertEqual([3], asyncio.run(slow_consumer()))
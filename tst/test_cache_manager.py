@@ -0,0 +1,128 @@
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+from CacheManager import CacheManager
+from DataTypes import StationData, TypeData
+
+
+class TestCacheManager(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def count_rows(self, table):
+        cm = CacheManager(self.data_dir)
+        count = cm.db_conn.execute('select count(*) from {}'.format(table)).fetchone()[0]
+        cm.close()
+        return count
+
+    def test_put_many_replaces_duplicates(self):
+        cm = CacheManager(self.data_dir)
+        cm.put_station_data(StationData(1, 'old name', 10))
+        cm.put_station_data_many([StationData(1, 'new name', 10), StationData(2, 'other', 20)])
+        cm.put_type_data_many([TypeData(5, 'a', 'desc', 1, 2, None), TypeData(5, 'a', 'desc', 1, 2, None)])
+        cm.close()
+
+        cm = CacheManager(self.data_dir)
+        self.assertEqual(StationData(1, 'new name', 10), cm.get_station_data(1))
+        self.assertEqual(StationData(2, 'other', 20), cm.get_station_data(2))
+        self.assertEqual('a', cm.get_type_data(5).type_name)
+        cm.close()
+
+    def test_write_behind_flushes_on_size(self):
+        cm = CacheManager(self.data_dir, write_behind=True, flush_size=3, flush_interval=timedelta(hours=1))
+        cm.put_station_data(StationData(1, 's1', 10))
+        cm.put_station_data(StationData(2, 's2', 10))
+        self.assertEqual(0, self.count_rows('stations'))
+        self.assertEqual('s2', cm.get_station_data(2).station_name)  # served from memory while pending
+        cm.put_type_data(TypeData(5, 'a', 'desc', 1, 2, None))
+        self.assertEqual(2, self.count_rows('stations'))
+        self.assertEqual(1, self.count_rows('types'))
+        cm.close()
+
+    def test_write_behind_flushes_on_close(self):
+        cm = CacheManager(self.data_dir, write_behind=True, flush_size=100, flush_interval=timedelta(hours=1))
+        cm.put_station_data_many(StationData(i, 's{}'.format(i), 10) for i in range(10))
+        self.assertEqual(0, self.count_rows('stations'))
+        cm.close()
+        self.assertEqual(10, self.count_rows('stations'))
+
+    def test_write_behind_flushes_on_interval(self):
+        cm = CacheManager(self.data_dir, write_behind=True, flush_size=100, flush_interval=timedelta(0))
+        cm.put_station_data(StationData(1, 's1', 10))
+        self.assertEqual(1, self.count_rows('stations'))
+        cm.close()
+
+    def test_write_behind_flushes_after_interval_without_more_puts(self):
+        cm = CacheManager(self.data_dir, write_behind=True, flush_size=100, flush_interval=timedelta(seconds=0.2))
+        cm.put_station_data(StationData(1, 's1', 10))
+        self.assertEqual(0, self.count_rows('stations'))
+        time.sleep(0.5)
+        self.assertEqual(1, self.count_rows('stations'))
+        cm.close()
+
+    def test_historical_values_rollups(self):
+        cm = CacheManager(self.data_dir)
+        start = date(2017, 1, 2)  # a Monday
+        for day in range(70):
+            cm.put_historical_values(1, float(day), 0.0, 0.0, 0.0, 0.0, value_date=start + timedelta(days=day))
+        cm.put_historical_values(2, 5.0, 0.0, 0.0, 0.0, 0.0, value_date=start)
+
+        daily = cm.get_historical_values(1)
+        self.assertEqual(70, len(daily))
+        self.assertEqual(sorted(x.date for x in daily), [x.date for x in daily])
+
+        weekly = cm.get_historical_values_rollup(1, 'weekly')
+        self.assertEqual(10, len(weekly))
+        self.assertEqual([6.0 + 7 * i for i in range(10)], [x.station_value for x in weekly])  # closing values
+
+        monthly = cm.get_historical_values_rollup(1, 'monthly')
+        self.assertEqual(['2017-01-31', '2017-02-28', '2017-03-12'], [x.date for x in monthly])
+
+        ranged = cm.get_historical_values(1, start=date(2017, 1, 10), end=date(2017, 1, 12))
+        self.assertEqual([8.0, 9.0, 10.0], [x.station_value for x in ranged])
+        cm.close()
+
+    def test_historical_values_max_points(self):
+        cm = CacheManager(self.data_dir)
+        start = date(2017, 1, 2)
+        for day in range(400):
+            cm.put_historical_values(1, float(day), 0.0, 0.0, 0.0, 0.0, value_date=start + timedelta(days=day))
+        self.assertEqual(58, len(cm.get_historical_values(1, max_points=60)))  # weekly
+        self.assertEqual(14, len(cm.get_historical_values(1, max_points=20)))  # monthly
+        thinned = cm.get_historical_values(1, max_points=5)
+        self.assertEqual(5, len(thinned))
+        self.assertEqual(399.0, thinned[-1].station_value)
+        cm.close()
+
+    def test_rollups_filled_for_existing_history(self):
+        cm = CacheManager(self.data_dir)
+        cm.put_historical_values(1, 1.0, 0.0, 0.0, 0.0, 0.0, value_date=date(2017, 1, 2))
+        cm.db_conn.executescript('DROP TABLE historical_values_weekly; DROP TABLE historical_values_monthly;')
+        cm.close()
+        cm = CacheManager(self.data_dir)
+        self.assertEqual(1, len(cm.get_historical_values_rollup(1, 'weekly')))
+        self.assertEqual(1, len(cm.get_historical_values_rollup(1, 'monthly')))
+        cm.close()
+
+    def test_negative_cache(self):
+        cm = CacheManager(self.data_dir)
+        self.assertIsNone(cm.get_negative('type', 1))
+        cm.put_negative('type', 1, '404 Not Found')
+        cm.put_negative('station', 2, 'timeout', ttl=timedelta(seconds=-1))  # already expired
+        cm.close()
+
+        cm = CacheManager(self.data_dir)
+        self.assertEqual('404 Not Found', cm.get_negative('type', 1))
+        self.assertEqual('404 Not Found', cm.get_negative('type', 1))
+        self.assertIsNone(cm.get_negative('station', 2))
+        self.assertEqual(1, cm.negative_hits['type'])  # counted once per id
+        self.assertIn('1 api calls saved', cm.negative_cache_report())
+        cm.close()
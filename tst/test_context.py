@@ -0,0 +1,48 @@
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import Context
+from CacheManager import CacheManager
+from TokenManager import TokenManager
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+
+
+def run_python(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, '-c', code], cwd=str(PACKAGE_DIR), capture_output=True, text=True)
+
+
+class TestContext(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        Context.close()
+        self.temp_dir.cleanup()
+
+    def test_registered_instances_are_shared(self):
+        tm = TokenManager(self.data_dir)
+        cm = CacheManager(self.data_dir)
+        Context.register(token_manager=tm, cache_manager=cm)
+        self.assertIs(tm, Context.token_manager())
+        self.assertIs(cm, Context.cache_manager())
+
+    def test_register_rejects_unknown_names(self):
+        with self.assertRaises(ValueError):
+            Context.register(tokens=None)
+
+    def test_import_has_no_side_effects(self):
+        r = run_python('import ESI_Api, MoneyChart, AssetReporter, Context; print(sorted(Context._instances))')
+        self.assertEqual(0, r.returncode, r.stderr)
+        self.assertEqual('[]', r.stdout.strip())
+
+    def test_standalone_modules_skip_heavy_imports(self):
+        r = run_python('import sys, Sweeper2, TokenManager; '
+                       'print(sorted(m for m in ("requests", "numpy", "plotly") if m in sys.modules))')
+        self.assertEqual(0, r.returncode, r.stderr)
+        self.assertEqual('[]', r.stdout.strip())
@@ -0,0 +1,146 @@
+import time
+from unittest import TestCase
+
+from CacheManager import CacheManager
+from ESI_Api import ESI_Api
+from stub_esi import StubEsi, CHARACTER_ID
+
+
+def make_assets(count):
+    return [{'item_id': i, 'type_id': 34, 'location_id': 60000001, 'location_type': 'station', 'is_singleton': False,
+             'location_flag': 'Hangar', 'quantity': i} for i in range(count)]
+
+
+class TestESI_Api(TestCase):
+
+    def setUp(self):
+        self.stub = StubEsi(page_size=10, assets=make_assets(45))
+        self.server = self.stub.server
+        self.api = self.stub.api()
+
+    def tearDown(self):
+        self.stub.close()
+
+    def test_call_paged_merges_pages_in_order(self):
+        asset_list = self.api.call_paged('/characters/{}/assets/', CHARACTER_ID)
+        self.assertEqual(list(range(45)), [a['item_id'] for a in asset_list])
+        self.assertEqual(5, self.server.requests['/characters/{}/assets/'.format(CHARACTER_ID)])
+
+    def test_iter_pages_downloads_concurrently(self):
+        self.server.delay = 0.1
+        start = time.perf_counter()
+        pages = list(self.api.iter_pages('/characters/{}/assets/', CHARACTER_ID))
+        elapsed = time.perf_counter() - start
+        self.assertEqual([10, 10, 10, 10, 5], [len(p) for p in pages])
+        self.assertLess(elapsed, 0.35)  # page 1, then pages 2-5 together
+        self.assertEqual(4, self.server.max_active)
+
+    def test_iter_pages_downloads_while_page_1_is_processed(self):
+        requested = []
+        for page in self.api.iter_pages('/characters/{}/assets/', CHARACTER_ID):
+            if not requested:
+                time.sleep(0.2)  # a slow consumer
+                requested.append(self.server.requests['/characters/{}/assets/'.format(CHARACTER_ID)])
+        self.assertEqual([5], requested)
+
+    def test_single_page_without_header(self):
+        self.server.page_size = 100
+        self.assertEqual(45, len(self.api.call_paged('/characters/{}/assets/', CHARACTER_ID)))
+        self.assertEqual(45, len(self.api.assets()))
+
+    def test_iter_records_streams_pages_in_order(self):
+        records = list(self.api.iter_records('/characters/{}/assets/', CHARACTER_ID, chunk_size=100))
+        self.assertEqual(list(range(45)), [a['item_id'] for a in records])
+        self.assertEqual(5, self.server.requests['/characters/{}/assets/'.format(CHARACTER_ID)])
+
+    def test_assets_and_containers(self):
+        self.server.assets[0]['is_singleton'] = True
+        asset_list, containers = self.api.assets_and_containers()
+        self.assertEqual(45, len(asset_list))
+        self.assertEqual([0], list(containers.keys()))
+        self.assertEqual('Station 60000001', asset_list[44]['location_name'])
+
+
+class TestResponseCache(TestCase):
+
+    def setUp(self):
+        self.stub = StubEsi(etags=True, expires_in=300)
+        self.server = self.stub.server
+        self.api = self.stub.api()
+        self.stats = self.stub.cache_manager.response_stats
+
+    def tearDown(self):
+        self.stub.close()
+
+    def test_served_locally_until_expired(self):
+        first = self.api.call('/universe/types/{}/', 34)
+        second = self.stub.api().call('/universe/types/{}/', 34)
+        self.assertEqual(first, second)
+        self.assertEqual(1, self.server.requests['/universe/types/34/'])
+        self.assertEqual({'miss': 1, 'hit': 1}, dict(self.stats))
+
+    def test_revalidated_after_expiration(self):
+        self.server.expires_in = -10
+        first = self.api.call_response('/universe/types/{}/', 34)
+        second = self.api.call_response('/universe/types/{}/', 34)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first.headers['ETag'], second.headers['ETag'])
+        self.assertEqual(2, self.server.requests['/universe/types/34/'])
+        self.assertEqual({'miss': 1, 'revalidated': 1}, dict(self.stats))
+
+    def test_pages_cached_separately(self):
+        self.server.page_size = 2
+        self.assertEqual(5, len(self.api.call_paged('/characters/{}/assets/', CHARACTER_ID)))
+        self.assertEqual(5, len(self.api.call_paged('/characters/{}/assets/', CHARACTER_ID)))
+        self.assertEqual(3, self.server.requests['/characters/{}/assets/'.format(CHARACTER_ID)])
+        self.assertEqual(3, self.stats['hit'])
+
+    def test_cache_disabled(self):
+        self.api.use_response_cache = False
+        self.api.call('/universe/types/{}/', 34)
+        self.api.call('/universe/types/{}/', 34)
+        self.assertEqual(2, self.server.requests['/universe/types/34/'])
+
+
+class TestNegativeCache(TestCase):
+
+    def setUp(self):
+        self.stub = StubEsi()
+        self.server = self.stub.server
+        self.api = self.stub.api()
+
+    def tearDown(self):
+        self.stub.close()
+
+    def next_session(self) -> ESI_Api:
+        """ an api with a new cache manager on the same data """
+        self.stub.cache_manager.close()
+        self.stub.cache_manager = CacheManager(self.stub.data_dir)
+        return self.stub.api()
+
+    def test_not_found_is_negatively_cached(self):
+        for _ in range(3):
+            self.assertEqual('unknown-999', self.api.get_type_data(999).type_name)
+            self.assertEqual('unknown-60000003', self.api.get_station_data(60000003).station_name)
+        self.assertEqual(1, self.server.requests['/universe/types/999/'])
+        self.assertEqual(1, self.server.requests['/universe/stations/60000003/'])
+
+        api = self.next_session()
+        cm = api.cache_manager
+        for _ in range(3):
+            self.assertEqual('unknown-999', api.get_type_data(999).type_name)
+            self.assertEqual('unknown-60000003', api.get_station_data(60000003).station_name)
+        self.assertEqual(1, self.server.requests['/universe/types/999/'])
+        self.assertEqual({'type': 1, 'station': 1}, dict(cm.negative_hits))  # one saved call per id
+
+    def test_server_errors_are_not_negatively_cached(self):
+        self.server.failures['/universe/types/34/'] = [502] * 4  # fails the retries too
+        self.server.failures['/universe/stations/60000001/'] = [502] * 4
+        self.assertEqual('unknown-34', self.api.get_type_data(34).type_name)
+        self.assertEqual('unknown-60000001', self.api.get_station_data(60000001).station_name)
+        self.assertIsNone(self.api.cache_manager.get_negative('type', 34))
+        self.assertIsNone(self.api.cache_manager.get_negative('station', 60000001))
+
+        api = self.next_session()
+        self.assertEqual('Type 34', api.get_type_data(34).type_name)
+        self.assertEqual('Station 60000001', api.get_station_data(60000001).station_name)
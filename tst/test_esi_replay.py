@@ -0,0 +1,105 @@
+import gzip
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+from CacheManager import CacheManager
+from EsiReplay import Cassette, FakeEsiServer, record_api, replay_api
+from TokenManager import TokenData
+from stub_esi import StubEsi, ASSETS, CHARACTER_ID
+
+
+class TestEsiReplay(TestCase):
+
+    def setUp(self):
+        self.stub = StubEsi(page_size=2)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cassette_file = Path(self.temp_dir.name) / 'esi.cassette.gz'
+        api = self.stub.api()
+        api.use_response_cache = False
+        cassette = Cassette()
+        record_api(api, cassette)
+        self.recorded_assets = api.call_paged('/characters/{}/assets/', api.character_id)
+        self.recorded_station = api.call('/universe/stations/{}/', 60000001)
+        cassette.save(self.cassette_file)
+
+    def tearDown(self):
+        self.stub.close()
+        self.temp_dir.cleanup()
+
+    def replay(self, api):
+        """ the api with a fresh cache, so everything is answered by the replay """
+        api.cache_manager = CacheManager(Path(self.temp_dir.name))
+        api.use_response_cache = False
+        return api
+
+    def test_cassette_round_trip(self):
+        cassette = Cassette.load(self.cassette_file)
+        self.assertEqual(4, len(cassette.interactions))  # three asset pages and a station
+        for i in cassette.interactions:
+            self.assertNotIn('accessToken', dict(i['query']))
+
+    def test_replay_adapter(self):
+        api = self.replay(self.stub.api())
+        self.stub.server.requests.clear()
+        replay_api(api, Cassette.load(self.cassette_file))
+        self.assertEqual(self.recorded_assets, api.call_paged('/characters/{}/assets/', api.character_id))
+        self.assertEqual(self.recorded_station, api.call('/universe/stations/{}/', 60000001))
+        self.assertEqual(0, sum(self.stub.server.requests.values()))
+
+    def test_find_with_different_ignore_params(self):
+        cassette = Cassette.load(self.cassette_file)
+        url = '/characters/{}/assets/?datasource=tranquility&page={}'
+        self.assertIsNotNone(cassette.find('GET', url.format(CHARACTER_ID, 1), ignore_params=frozenset(['page'])))
+        page_2 = cassette.find('GET', url.format(CHARACTER_ID, 2))
+        self.assertEqual(['2'], [v for k, v in page_2['query'] if k == 'page'])
+
+    def test_fake_server_replays_recorded_pages(self):
+        with FakeEsiServer(Cassette.load(self.cassette_file)) as server:
+            api = self.replay(self.stub.api())
+            api.esi_api_url = server.url
+            self.assertEqual(ASSETS, api.call_paged('/characters/{}/assets/', api.character_id))
+            self.assertEqual(3, server.request_count)
+
+    def test_fake_server_repaginates(self):
+        cassette = Cassette()
+        cassette.add('GET', 'http://esi/characters/1/assets/?datasource=tranquility', None, 200,
+                     {'Content-Type': 'application/json'}, '[1, 2, 3, 4, 5]', 0.1)
+        with FakeEsiServer(cassette, page_size=2) as server:
+            api = self.replay(self.stub.api())
+            api.esi_api_url = server.url
+            self.assertEqual([1, 2, 3, 4, 5], api.call_paged('/characters/{}/assets/', 1))
+            self.assertEqual(3, server.request_count)
+
+    def test_fake_server_injects_errors(self):
+        with FakeEsiServer(Cassette.load(self.cassette_file), error_rate=0.5, seed=1) as server:
+            api = self.replay(self.stub.api())
+            api.esi_api_url = server.url
+            # the scheduler retries the injected 502s
+            self.assertEqual(self.recorded_station, api.call('/universe/stations/{}/', 60000001))
+            self.assertEqual(ASSETS, api.call_paged('/characters/{}/assets/', api.character_id))
+            self.assertGreater(server.request_count, 4)
+            self.assertLess(server.errors_remaining, server.error_limit)
+
+    def test_token_refresh_is_redacted(self):
+        self.stub.token_manager.persist_token(TokenData('Test', CHARACTER_ID, 'secret-refresh', 'secret-access',
+                                                        datetime.now() + timedelta(hours=1)))
+        cassette = Cassette()
+        with FakeEsiServer(Cassette()) as server:
+            api = self.stub.api()
+            server.configure(api)
+            record_api(api, cassette)
+            self.assertEqual('replay', api.token_manager.get_access_token('Test', refresh=True))
+        cassette.save(self.cassette_file)
+        with gzip.open(str(self.cassette_file), 'rt') as f:
+            recorded = f.read()
+        self.assertIn('/oauth/token', recorded)
+        self.assertNotIn('secret-refresh', recorded)
+        self.assertNotIn('"replay"', recorded)  # the refreshed tokens of the response
+
+        # a refresh with a different refresh token still finds the recorded exchange
+        api = self.stub.api()
+        replay_api(api, Cassette.load(self.cassette_file))
+        api.token_manager.persist_token(TokenData('Test', CHARACTER_ID, 'other-refresh', None, None))
+        self.assertEqual('recorded', api.token_manager.get_access_token('Test'))
@@ -0,0 +1,69 @@
+import sys
+from unittest import TestCase
+
+from LocationTree import LocationTree
+
+CITADEL = 1020000000001
+STATION = 60000001
+
+
+def asset(item_id, location_id, location_type='other', category_id=2):
+    return {'item_id': item_id, 'location_id': location_id, 'location_type': location_type,
+            'category_id': category_id}
+
+
+def is_ship(a):
+    return a['category_id'] == 6
+
+
+class TestLocationTree(TestCase):
+
+    def setUp(self):
+        # item 5 in a container (4) in a ship (3) in a citadel; 2 in a station hangar; 6 in space
+        self.assets = [
+            asset(5, 4),
+            asset(4, 3),
+            asset(3, CITADEL, 'other', 6),
+            asset(2, STATION, 'station'),
+            asset(6, 30000001, 'solar_system'),
+            asset(7, 8),
+            asset(8, 9, 'other', 6),
+            asset(9, STATION, 'station'),
+        ]
+        self.tree = LocationTree(self.assets, is_ship)
+
+    def test_parent_root_and_ship(self):
+        self.assertEqual([1, 2, -1, -1, -1, 6, 7, -1], self.tree.parent.tolist())
+        self.assertEqual([2, 2, 2, 3, 4, 7, 7, 7], self.tree.root.tolist())
+        self.assertEqual([2, 2, -1, -1, -1, 6, -1, -1], self.tree.ship.tolist())
+        self.assertEqual(4, self.tree.container(0)['item_id'])
+        self.assertEqual(3, self.tree.owning_ship(0)['item_id'])
+        self.assertIsNone(self.tree.owning_ship(3))
+
+    def test_containers_ordered_before_contents(self):
+        position = {i: n for n, i in enumerate(self.tree.order)}
+        self.assertEqual(len(self.assets), len(position))
+        for i, p in enumerate(self.tree.parent.tolist()):
+            if p >= 0:
+                self.assertLess(position[p], position[i])
+
+    def test_root_station(self):
+        self.assertEqual([-1, -1, -1, STATION, -1, STATION, STATION, STATION], self.tree.root_station_ids().tolist())
+        self.assertEqual(STATION, self.tree.root_station_id(5))
+        self.assertIsNone(self.tree.root_station_id(0))
+
+    def test_deep_nesting(self):
+        depth = sys.getrecursionlimit() * 2
+        assets = [asset(i, i + 1) for i in range(1, depth)] + [asset(depth, STATION, 'station')]
+        tree = LocationTree(assets, is_ship)
+        self.assertEqual(depth - 1, tree.root[0])
+        self.assertEqual(STATION, tree.root_station_id(0))
+
+    def test_location_loop_is_cut(self):
+        tree = LocationTree([asset(1, 2), asset(2, 1)], is_ship)
+        self.assertEqual(1, list(tree.parent).count(-1))
+        self.assertEqual(tree.root[0], tree.root[1])
+
+    def test_empty(self):
+        tree = LocationTree([], is_ship)
+        self.assertEqual(0, len(tree.root_station_ids()))
@@ -0,0 +1,76 @@
+import io
+import tracemalloc
+from datetime import datetime
+from unittest import TestCase
+
+from MarketOrders import iter_xml_orders, iter_esi_orders, enrich_orders
+from stub_esi import StubEsi
+
+XML = b'''<?xml version='1.0' encoding='UTF-8'?>
+<eveapi version="2">
+  <currentTime>2017-03-18 10:00:00</currentTime>
+  <result>
+    <rowset name="orders" key="orderID" columns="orderID,charID,stationID">
+      <row orderID="101" charID="90000001" stationID="60000001" volEntered="10" volRemaining="4" minVolume="1"
+           orderState="0" typeID="34" range="32767" accountKey="1000" duration="90" escrow="0.00" price="5.50"
+           bid="0" issued="2017-03-01 12:30:00" />
+      <row orderID="102" charID="90000001" stationID="60000002" volEntered="100" volRemaining="100" minVolume="1"
+           orderState="0" typeID="35" range="-1" accountKey="1000" duration="30" escrow="250.00" price="2.50"
+           bid="1" issued="2017-03-02 08:00:00" />
+    </rowset>
+  </result>
+  <cachedUntil>2017-03-18 11:00:00</cachedUntil>
+</eveapi>'''
+
+ESI_ORDERS = [
+    {'order_id': 201, 'type_id': 34, 'location_id': 60000001, 'volume_total': 10, 'volume_remain': 7,
+     'range': 'station', 'duration': 90, 'price': 5.25, 'is_buy_order': False, 'issued': '2017-03-01T12:30:00Z'},
+    {'order_id': 202, 'type_id': 35, 'location_id': 60000002, 'volume_total': 5, 'volume_remain': 5,
+     'range': '5', 'duration': 30, 'price': 2.0, 'is_buy_order': True, 'escrow': 10.0,
+     'issued': '2017-03-02T08:00:00Z'},
+]
+
+
+class TestMarketOrders(TestCase):
+
+    def test_iter_xml_orders(self):
+        orders = list(iter_xml_orders(io.BytesIO(XML), 'Test'))
+        self.assertEqual([101, 102], [o.order_id for o in orders])
+        self.assertEqual(('sell', 4, 34, 60000001, 32767), (orders[0].order_type, orders[0].vol_remaining,
+                                                           orders[0].type_id, orders[0].station_id, orders[0].range))
+        self.assertEqual(('buy', 250.0, -1), (orders[1].order_type, orders[1].escrow, orders[1].range))
+        self.assertEqual(datetime(2017, 3, 2, 8, 0), orders[1].issued)
+        self.assertIsNone(orders[0].type_name)
+
+    def test_iter_xml_orders_memory(self):
+        head, rest = XML.split(b'<row ', 1)
+        row = b'<row ' + rest.split(b'/>', 1)[0] + b'/>\n'
+        tail = b'</rowset>' + XML.split(b'</rowset>', 1)[1]
+        stream = io.BytesIO(head + row * 50000 + tail)
+        tracemalloc.start()
+        try:
+            count = sum(1 for _ in iter_xml_orders(stream, 'Test'))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(50000, count)
+        self.assertLess(peak, 1000000)  # the rowset does not keep an element per row
+
+    def test_iter_esi_orders(self):
+        orders = list(iter_esi_orders(ESI_ORDERS, 90000001, 'Test'))
+        self.assertEqual([-1, 5], [o.range for o in orders])
+        self.assertEqual(['sell', 'buy'], [o.order_type for o in orders])
+        self.assertEqual([0.0, 10.0], [o.escrow for o in orders])
+        self.assertEqual(90000001, orders[0].character_id)
+
+    def test_enrich_orders_resolves_in_one_batch(self):
+        stub = StubEsi()
+        try:
+            orders = enrich_orders(iter_xml_orders(io.BytesIO(XML), 'Test'), stub.api())
+            self.assertEqual(['Station 60000001', 'Station 60000002'], [o.station_name for o in orders])
+            self.assertEqual(['Type 34', 'Type 35'], [o.type_name for o in orders])
+            # without static data each station and type is looked up once, with no /universe/names/ request
+            self.assertEqual(0, stub.server.requests['POST /universe/names/'])
+            self.assertEqual(4, sum(v for k, v in stub.server.requests.items() if k.startswith('/universe/')))
+        finally:
+            stub.close()
@@ -0,0 +1,66 @@
+import re
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from CacheManager import CacheManager
+from DataTypes import AssetValues
+from MoneyChart import MoneyChart, render_svg, stack_values, CHART_FILENAME, DASHBOARD_FILENAME
+from TokenManager import TokenManager, TokenData
+
+
+class TestMoneyChart(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self.temp_dir.name)
+        self.cache_manager = CacheManager(self.data_dir)
+        self.token_manager = TokenManager(self.data_dir)
+        start = date(2017, 1, 1)
+        for character_id, name in ((1, 'One'), (2, 'Two <b>')):
+            self.token_manager.persist_token(TokenData(name, character_id, 'refresh', 'access',
+                                                       datetime.now() + timedelta(hours=1)))
+            for day in range(1000):
+                self.cache_manager.put_historical_values(character_id, 100.0 + day, 10.0, 5.0, 50.0, 1.0,
+                                                         value_date=start + timedelta(days=day))
+        self.chart = MoneyChart(self.cache_manager, self.token_manager)
+
+    def tearDown(self):
+        self.cache_manager.close()
+        self.temp_dir.cleanup()
+
+    def test_stack_values(self):
+        totals = [AssetValues('2017-01-01', 1, 1.0, 2.0, 3.0, 4.0, 5.0),
+                  AssetValues(date(2017, 1, 2), 1, 10.0, 20.0, 30.0, 40.0, None)]
+        dates, values, stacked = stack_values(totals)
+        self.assertEqual([date(2017, 1, 1), date(2017, 1, 2)], dates)
+        self.assertEqual([1.0, 2.0, 5.0, 3.0, 4.0], values[:, 0].tolist())  # station, orders, escrow, ships, wallet
+        self.assertEqual([1.0, 3.0, 8.0, 11.0, 15.0], stacked[:, 0].tolist())
+        self.assertEqual(100.0, stacked[-1, 1])
+
+    def test_empty_history(self):
+        self.assertIn('no history', render_svg('Nobody', []))
+        self.assertEqual((5, 0), stack_values([])[2].shape)
+
+    def test_write_charts(self):
+        dashboard = self.chart.write_charts(['One', 'Two <b>'], self.data_dir / 'Reports', max_points=100)
+        self.assertEqual(DASHBOARD_FILENAME, dashboard.name)
+        page = dashboard.read_text(encoding='utf-8')
+        self.assertEqual(10, page.count('<polygon'))
+        self.assertIn('Two &lt;b&gt;', page)
+        self.assertNotIn('<script', page)
+        one = (self.data_dir / 'Reports' / CHART_FILENAME.format('One')).read_text(encoding='utf-8')
+        points = re.search(r'<polygon points="([^"]*)"', one).group(1).split()
+        self.assertLessEqual(len(points), 2 * 100)  # downsampled, upper and lower edge
+        self.assertIn('net worth 1.2k isk', one)  # 1099 + 10 + 5 + 50 + 1
+
+    def test_layers_are_stacked(self):
+        svg = render_svg('x', [AssetValues('2017-01-01', 1, 1.0, 1.0, 1.0, 1.0, 1.0),
+                               AssetValues('2017-01-02', 1, 1.0, 1.0, 1.0, 1.0, 1.0)])
+        tops = []
+        for points in re.findall(r'<polygon points="([^"]*)"', svg):
+            tops.append(float(points.split()[0].split(',')[1]))
+        self.assertTrue(np.all(np.diff(tops) < 0))  # each layer's top edge is higher on the page
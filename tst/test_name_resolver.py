@@ -0,0 +1,107 @@
+from unittest import TestCase
+
+from NameResolver import NameResolver
+from RequestScheduler import EsiHttpError
+from stub_esi import StubEsi
+
+
+class FakeStaticData:
+    def get_type_details(self, type_ids):
+        return {x: ('static description', 10, 20) for x in type_ids if x != 35}
+
+    def get_systems_for_stations(self, station_ids):
+        return {x: 30000002 for x in station_ids}
+
+
+class TestNameResolver(TestCase):
+
+    def setUp(self):
+        self.stub = StubEsi()
+        self.requests = self.stub.server.requests
+        self.cache_manager = self.stub.cache_manager
+        self.api = self.stub.api()
+
+    def tearDown(self):
+        self.stub.close()
+
+    def test_resolve_without_static_data(self):
+        resolver = NameResolver(self.api)
+        resolver.add_type_ids([34, 35, 999, 34])
+        resolver.add_station_ids([60000001, 60000003])
+        resolver.add_system_ids([30000001])
+        self.assertEqual(6, resolver.resolve())
+
+        self.assertEqual('Type 34', self.cache_manager.get_type_data(34).type_name)
+        self.assertEqual(1, self.cache_manager.get_type_data(34).group_id)  # from /universe/types/
+        self.assertEqual('Station 60000001', self.cache_manager.get_station_data(60000001).station_name)
+        self.assertEqual(30000001, self.cache_manager.get_station_data(60000001).solar_system_id)
+        self.assertEqual('System 30000001', self.cache_manager.get_system_data(30000001).solar_system_name)
+        self.assertIsNotNone(self.cache_manager.get_negative('type', 999))
+        self.assertIsNotNone(self.cache_manager.get_negative('station', 60000003))
+        # one request per station and type, the names of the systems in bulk
+        self.assertEqual(1, self.requests['POST /universe/names/'])
+        self.assertEqual(1, self.requests['/universe/types/34/'])
+        self.assertEqual(1, self.requests['/universe/types/999/'])
+        self.assertEqual(5, sum(v for k, v in self.requests.items() if k.startswith('/universe/')))
+
+        # everything is cached now
+        before = sum(self.requests.values())
+        resolver.add_type_ids([34, 35, 999])
+        self.assertEqual(0, resolver.resolve())
+        self.assertEqual(before, sum(self.requests.values()))
+
+    def test_bad_ids_are_isolated(self):
+        resolver = NameResolver(self.api, FakeStaticData())
+        resolver.add_type_ids([34, 999])
+        resolver.add_station_ids([60000001, 60000003])
+        self.assertEqual(4, resolver.resolve())
+        self.assertGreater(self.requests['POST /universe/names/'], 1)  # the failing request was split
+        self.assertEqual(0, self.requests['/universe/types/999/'])
+        self.assertIsNotNone(self.cache_manager.get_negative('type', 999))
+        self.assertIsNotNone(self.cache_manager.get_negative('station', 60000003))
+        self.assertEqual('Type 34', self.cache_manager.get_type_data(34).type_name)
+
+    def test_server_errors_are_not_split_or_negatively_cached(self):
+        self.stub.server.failures['POST /universe/names/'] = [502] * 4  # fails the retries too
+        resolver = NameResolver(self.api, FakeStaticData())
+        resolver.add_type_ids([34, 35, 999])
+        resolver.add_station_ids([60000001])
+        with self.assertRaises(EsiHttpError):
+            resolver.resolve()
+        self.assertEqual(4, self.requests['POST /universe/names/'])  # one request and its retries, no splitting
+        self.assertIsNone(self.cache_manager.get_negative('type', 34))
+        self.assertIsNone(self.cache_manager.get_negative('station', 60000001))
+
+        resolver.add_type_ids([34, 35, 999])
+        self.assertEqual(3, resolver.resolve())
+        self.assertEqual('Type 34', self.cache_manager.get_type_data(34).type_name)
+
+    def test_server_errors_without_static_data(self):
+        self.stub.server.failures['/universe/types/34/'] = [502] * 4
+        resolver = NameResolver(self.api)
+        resolver.add_type_ids([34])
+        with self.assertRaises(EsiHttpError):
+            resolver.resolve()
+        self.assertIsNone(self.cache_manager.get_negative('type', 34))
+        self.assertIsNone(self.cache_manager.get_type_data(34))
+
+    def test_resolve_with_static_data(self):
+        resolver = NameResolver(self.api, FakeStaticData())
+        resolver.add_type_ids([34, 35])
+        resolver.add_station_ids([60000001])
+        resolver.resolve()
+        self.assertEqual(1, self.requests['POST /universe/names/'])
+        self.assertEqual(('Type 34', 'static description', 10, 20),
+                         self.cache_manager.get_type_data(34)[1:5])
+        self.assertEqual(30000002, self.cache_manager.get_station_data(60000001).solar_system_id)
+        # only the field missing from the static data needs the per-id endpoint
+        self.assertEqual(1, self.requests['/universe/types/35/'])
+        self.assertEqual(1, sum(v for k, v in self.requests.items() if k.startswith('/universe/')))
+
+    def test_chunks(self):
+        resolver = NameResolver(self.api, FakeStaticData())
+        resolver.names_chunk_size = 10
+        resolver.add_type_ids(range(1, 26))
+        resolver.resolve()
+        self.assertEqual(3, self.requests['POST /universe/names/'])
+        self.assertEqual('Type 25', self.cache_manager.get_type_data(25).type_name)
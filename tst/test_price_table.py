@@ -0,0 +1,74 @@
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from DataTypes import MarketPriceData
+from PriceTable import PriceTable
+
+
+class TestPriceTable(TestCase):
+
+    def setUp(self):
+        self.expiration = datetime.now() + timedelta(hours=1)
+        self.table = PriceTable.from_price_data([
+            MarketPriceData(34, 5.5, 4.0),
+            MarketPriceData(12, None, 100.0),
+            MarketPriceData(20, 0.0, 7.0),
+            MarketPriceData(99, 1000.0, None),
+        ], self.expiration)
+
+    def test_get_price(self):
+        self.assertEqual(5.5, self.table.get_price(34))
+        self.assertEqual(100.0, self.table.get_price(12))  # falls back to adjusted price
+        self.assertEqual(7.0, self.table.get_price(20))
+        self.assertEqual(0.0, self.table.get_price(13))
+        self.assertEqual(0.0, self.table.get_price(1000))
+
+    def test_get_prices(self):
+        prices = self.table.get_prices([99, 1, 34, 34, 12, 500])
+        np.testing.assert_array_equal([1000.0, 0.0, 5.5, 5.5, 100.0, 0.0], prices)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as d:
+            filename = Path(d) / 'prices.bin'
+            self.table.save(filename)
+            loaded = PriceTable.load(filename)
+            np.testing.assert_array_equal([12, 20, 34, 99], loaded.type_ids)
+            np.testing.assert_array_equal(self.table.get_prices([12, 20, 34, 99]), loaded.get_prices([12, 20, 34, 99]))
+            self.assertAlmostEqual(self.expiration.timestamp(), loaded.expiration.timestamp(), places=3)
+            self.assertFalse(loaded.is_expired())
+            self.assertEqual(self.table.digest(), loaded.digest())
+            del loaded
+
+    def test_digest(self):
+        later = PriceTable(self.table.type_ids, self.table.average_prices, self.table.adjusted_prices,
+                           self.expiration + timedelta(hours=1))
+        self.assertEqual(self.table.digest(), later.digest())  # the prices, not the expiration
+        other = PriceTable(self.table.type_ids, self.table.average_prices * 2, self.table.adjusted_prices,
+                           self.expiration)
+        self.assertNotEqual(self.table.digest(), other.digest())
+
+    def test_load_missing_file(self):
+        self.assertIsNone(PriceTable.load(Path(tempfile.gettempdir()) / 'does-not-exist.bin'))
+
+    def test_save_over_loaded_table(self):
+        with tempfile.TemporaryDirectory() as d:
+            filename = Path(d) / 'prices.bin'
+            self.table.save(filename)
+            loaded = PriceTable.load(filename)
+            PriceTable.from_price_data([MarketPriceData(1, 1.0, 1.0)], self.expiration).save(filename)
+            self.assertEqual(1000.0, loaded.get_price(99))  # still reads the file it was loaded from
+            self.assertEqual(1.0, PriceTable.load(filename).get_price(1))
+            self.assertEqual(['prices.bin'], [p.name for p in Path(d).iterdir()])
+            del loaded
+
+    def test_load_truncated_file(self):
+        with tempfile.TemporaryDirectory() as d:
+            filename = Path(d) / 'prices.bin'
+            self.table.save(filename)
+            with filename.open('r+b') as f:
+                f.truncate(filename.stat().st_size - 8)
+            self.assertIsNone(PriceTable.load(filename))
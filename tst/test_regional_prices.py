@@ -0,0 +1,130 @@
+import tempfile
+from datetime import datetime, timedelta, date
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from CacheManager import CacheManager
+from DataTypes import MarketPriceData
+from PriceTable import PriceTable
+from RegionalPrices import RegionalPrices, weighted_percentile, order_book_prices, history_vwap, order_arrays, \
+    pricing_region_id
+from RequestScheduler import EsiHttpError
+
+THE_FORGE = 10000002
+
+
+def order(type_id, is_buy, price, volume):
+    return {'type_id': type_id, 'is_buy_order': is_buy, 'price': price, 'volume_remain': volume}
+
+
+ORDERS = [
+    # type 34: one unit listed far too cheap, the bulk of the volume at 5-6
+    order(34, False, 1.0, 1), order(34, False, 5.0, 1000), order(34, False, 6.0, 1000),
+    order(34, True, 4.5, 2000), order(34, True, 100.0, 1),
+    # type 35 only has sell orders
+    order(35, False, 20.0, 10),
+]
+
+
+class FakeApi:
+    def __init__(self, data_dir):
+        self.cache_manager = CacheManager(data_dir)
+        self.calls = 0
+        self.history_calls = []
+
+    def get_region_id(self, region_name):
+        return {'The Forge': THE_FORGE}.get(region_name)
+
+    def get_price_table(self):
+        return PriceTable.from_price_data([MarketPriceData(34, 7.0, None), MarketPriceData(36, 50.0, None)],
+                                          datetime.now() + timedelta(hours=1))
+
+    def iter_pages(self, path, region_id, max_workers=8):
+        self.calls += 1
+        yield ORDERS[:3]
+        yield ORDERS[3:]
+
+    def call(self, path, region_id, params=None):
+        self.calls += 1
+        self.history_calls.append(params['type_id'])
+        if params['type_id'] == 36:
+            raise EsiHttpError(404, 'GET', path, 'not found')
+        today = date.today()
+        return [{'date': (today - timedelta(days=400)).isoformat(), 'average': 1000.0, 'volume': 1000},
+                {'date': (today - timedelta(days=2)).isoformat(), 'average': 4.0, 'volume': 100},
+                {'date': (today - timedelta(days=1)).isoformat(), 'average': 6.0, 'volume': 300}]
+
+
+class TestRegionalPrices(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.api = FakeApi(Path(self.temp_dir.name))
+
+    def tearDown(self):
+        self.api.cache_manager.close()
+        self.temp_dir.cleanup()
+
+    def test_weighted_percentile(self):
+        types, prices = weighted_percentile(np.array([2, 1, 1, 1, 2]), np.array([9.0, 3.0, 1.0, 2.0, 8.0]),
+                                            np.array([1.0, 1.0, 1.0, 8.0, 1.0]), 0.5)
+        self.assertEqual([1, 2], types.tolist())
+        self.assertEqual([2.0, 8.0], prices.tolist())
+
+    def test_order_book_prices_ignore_outliers(self):
+        types, sell, buy = order_book_prices(*order_arrays(ORDERS))
+        self.assertEqual([34, 35], types.tolist())
+        self.assertEqual(5.0, sell[0])
+        self.assertEqual(4.5, buy[0])
+        self.assertEqual(20.0, sell[1])
+        self.assertTrue(np.isnan(buy[1]))
+
+    def test_history_vwap(self):
+        types, vwap = history_vwap(np.array([34, 34, 35]), np.array([4.0, 6.0, 2.0]), np.array([100.0, 300.0, 0.0]))
+        self.assertEqual(5.5, vwap[0])
+        self.assertTrue(np.isnan(vwap[1]))
+
+    def test_modes_fall_back_to_global_prices(self):
+        prices = RegionalPrices(self.api)
+        split = prices.get_price_table('split', THE_FORGE)
+        self.assertEqual(4.75, split.get_price(34))
+        self.assertEqual(20.0, split.get_price(35))
+        self.assertEqual(50.0, split.get_price(36))
+        self.assertEqual(4.5, prices.get_price_table('buy', THE_FORGE).get_price(34))
+        self.assertEqual(7.0, prices.get_price_table('global', THE_FORGE).get_price(34))
+
+    def test_history_mode(self):
+        table = RegionalPrices(self.api).get_price_table('history', THE_FORGE, [34, 36])
+        self.assertEqual(5.5, table.get_price(34))  # the 400 day old row is outside the window
+        self.assertEqual(50.0, table.get_price(36))
+
+    def test_history_mode_fetches_new_types(self):
+        RegionalPrices(self.api).get_price_table('history', THE_FORGE, [36])
+        table = RegionalPrices(self.api).get_price_table('history', THE_FORGE, [34, 36])
+        self.assertEqual(5.5, table.get_price(34))  # not the global 7.0
+        self.assertEqual(50.0, table.get_price(36))
+        self.assertEqual([36, 34], self.api.history_calls)  # 36 has no history but is not fetched again
+        RegionalPrices(self.api).get_price_table('history', THE_FORGE, [34, 36])
+        self.assertEqual([36, 34], self.api.history_calls)
+
+    def test_tables_are_cached(self):
+        RegionalPrices(self.api).get_price_table('sell', THE_FORGE)
+        calls = self.api.calls
+        self.assertEqual(5.0, RegionalPrices(self.api).get_price_table('sell', THE_FORGE).get_price(34))
+        self.assertEqual(calls, self.api.calls)
+        reloaded = CacheManager(Path(self.temp_dir.name))
+        self.assertEqual(5.0, reloaded.get_price_table('{}-sell'.format(THE_FORGE)).get_price(34))
+        reloaded.close()
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            RegionalPrices(self.api).get_price_table('median', THE_FORGE)
+
+    def test_unknown_region(self):
+        self.assertEqual(THE_FORGE, pricing_region_id(self.api, 'The Forge'))
+        with self.assertRaises(ValueError):
+            pricing_region_id(self.api, 'The Froge')
+        with self.assertRaises(ValueError):
+            RegionalPrices(self.api).get_price_table('sell', None)
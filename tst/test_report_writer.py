@@ -0,0 +1,85 @@
+import csv
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from AssetRecord import AssetRecord
+from ReportWriter import ReportWriter, ReportOptions, top_items
+
+
+def item(type_id, value, quantity=1):
+    record = AssetRecord(type_id, type_id, quantity, 60000001, 'station', 'Hangar', False)
+    record.set_names('Type <{}>'.format(type_id), 'Jita IV')
+    record.total_value, record.total_volume = float(value), 0.5 * quantity
+    return record
+
+
+class TestReportWriter(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.base = Path(self.temp_dir.name) / 'Reports' / 'assets-Test'
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, options):
+        with ReportWriter(self.base, options) as report:
+            report.summary('Test', [('Asset value', 600.0), ('Total value', 700.0)],
+                           [('Wallet balance', 50.0), ('Net Worth', 750.0)])
+            report.location('Jita IV', [('Asset value', 600.0), ('Open Orders value', 100.0),
+                                        ('Total value', 700.0), ('Total volume', 3.0)],
+                            [item(i, 100 * i) for i in range(1, 4)], [item(9, 100)])
+            report.ship('Rifter@Jita IV', 20.0, [item(5, 10), item(6, 1)])
+        return {fmt: self.base.with_suffix('.' + fmt).read_text(encoding='utf-8') for fmt in options.formats}
+
+    def test_top_items(self):
+        items = [item(i, v) for i, v in enumerate([5, 1, 9, 3])]
+        self.assertEqual([9, 5, 3, 1], [a['total_value'] for a in top_items(items, None)])
+        self.assertEqual([9, 5], [a['total_value'] for a in top_items(items, 2)])
+
+    def test_all_formats_in_one_pass(self):
+        out = self.write(ReportOptions(formats=('txt', 'csv', 'json', 'html')))
+        self.assertTrue(out['txt'].startswith('Asset Report for Test\n'))
+        self.assertIn('Ships\n\nRifter@Jita IV\n', out['txt'])
+        rows = list(csv.reader(out['csv'].splitlines()))
+        self.assertEqual(['section', 'location', 'kind', 'type_name', 'quantity', 'value', 'volume'], rows[0])
+        self.assertEqual(4 + 1 + 4 + 1 + 2, len(rows) - 1)
+        self.assertIn('<h2>Rifter@Jita IV</h2>', out['html'])
+        self.assertIn('Type &lt;1&gt;', out['html'])
+        self.assertIn('<a href="chart-Test.html">', out['html'])
+        self.assertTrue(out['html'].rstrip().endswith('</html>'))
+
+    def test_json_is_valid(self):
+        report = json.loads(self.write(ReportOptions(formats=('json',)))['json'])
+        self.assertEqual(750.0, report['summary']['Net Worth'])
+        self.assertEqual(['Jita IV'], [loc['name'] for loc in report['locations']])
+        self.assertEqual([300.0, 200.0, 100.0], [a['value'] for a in report['locations'][0]['assets']])
+        self.assertEqual(2, len(report['ships'][0]['items']))
+
+    def test_json_without_locations(self):
+        with ReportWriter(self.base, ReportOptions(formats=('json',))) as report:
+            report.summary('Test', [], [('Net Worth', 0.0)])
+        self.assertEqual({'character': 'Test', 'summary': {'Net Worth': 0.0}},
+                         json.loads(self.base.with_suffix('.json').read_text()))
+
+    def test_top_n(self):
+        report = json.loads(self.write(ReportOptions(formats=('json',), top_n=1))['json'])
+        self.assertEqual([300.0], [a['value'] for a in report['locations'][0]['assets']])
+        self.assertEqual([10.0], [a['value'] for a in report['ships'][0]['items']])
+
+    def test_summary_only(self):
+        out = self.write(ReportOptions(formats=('txt',), summary_only=True))['txt']
+        self.assertIn('Jita IV\n', out)
+        self.assertIn('Net Worth', out)
+        self.assertNotIn('Type', out)
+
+    def test_creates_report_directory(self):
+        self.assertFalse(self.base.parent.exists())
+        self.write(ReportOptions())
+        self.assertTrue(self.base.with_suffix('.txt').exists())
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            ReportWriter(self.base, ReportOptions(formats=('pdf',)))
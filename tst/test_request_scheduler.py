@@ -0,0 +1,88 @@
+import time
+from unittest import TestCase
+
+import requests
+
+from RequestScheduler import RequestScheduler, TokenBucket, EsiHttpError, EsiTimeoutError
+from stub_esi import StubEsi
+
+
+class TestRequestScheduler(TestCase):
+
+    def setUp(self):
+        self.stub = StubEsi()
+        self.server = self.stub.server
+        self.scheduler = RequestScheduler(backoff=0.01, max_retries=3)
+        self.api = self.stub.api()
+        self.api.scheduler = self.scheduler
+        self.api.use_response_cache = False
+
+    def tearDown(self):
+        self.stub.close()
+
+    def test_5xx_is_retried(self):
+        self.server.failures['/universe/types/34/'] = [502, 503]
+        self.assertEqual('Type 34', self.api.call('/universe/types/{}/', 34)['name'])
+        self.assertEqual(3, self.server.requests['/universe/types/34/'])
+        m = self.scheduler.metrics['/universe/types/{}/']
+        self.assertEqual((3, 2, 2), (m.requests, m.errors, m.retries))
+
+    def test_gives_up_after_max_retries(self):
+        self.server.failures['/universe/types/34/'] = [502] * 10
+        with self.assertRaises(EsiHttpError) as cm:
+            self.api.call('/universe/types/{}/', 34)
+        self.assertEqual(502, cm.exception.status_code)
+        self.assertEqual(4, self.server.requests['/universe/types/34/'])
+
+    def test_client_errors_are_not_retried(self):
+        with self.assertRaises(EsiHttpError) as cm:
+            self.api.call('/universe/types/{}/', 999)
+        self.assertEqual(404, cm.exception.status_code)
+        self.assertEqual(1, self.server.requests['/universe/types/999/'])
+
+    def test_timeout_is_retried_then_raised(self):
+        self.server.delay = 0.3
+        self.scheduler.timeout = 0.05
+        self.scheduler.max_retries = 1
+        with self.assertRaises(EsiTimeoutError):
+            self.api.call('/universe/types/{}/', 34)
+        self.assertEqual(2, self.scheduler.metrics['/universe/types/{}/'].requests)
+
+    def test_concurrency_adapts_to_error_limit(self):
+        self.server.error_limit_remain = 30
+        self.api.call('/universe/types/{}/', 34)
+        self.assertEqual(10, self.scheduler.concurrency_limit)
+        self.api.call('/universe/types/{}/', 35)
+        self.assertEqual(5, self.scheduler.concurrency_limit)
+        self.server.error_limit_remain = 100
+        self.api.call('/universe/types/{}/', 36)
+        self.assertEqual(6, self.scheduler.concurrency_limit)
+
+    def test_waits_for_error_window_reset(self):
+        self.server.error_limit_remain = 5
+        self.server.error_limit_reset = 1
+        self.server.failures['/universe/types/34/'] = [420]
+        start = time.perf_counter()
+        self.assertEqual('Type 34', self.api.call('/universe/types/{}/', 34)['name'])
+        self.assertGreaterEqual(time.perf_counter() - start, 0.9)
+        self.assertEqual(2, self.server.requests['/universe/types/34/'])
+        self.assertIn('/universe/types/{}/', self.scheduler.metrics_report())
+
+    def test_420_without_headers_waits(self):
+        self.scheduler.error_reset = 0.5
+        self.server.failures['/universe/types/34/'] = [420]
+        start = time.perf_counter()
+        self.assertEqual('Type 34', self.api.call('/universe/types/{}/', 34)['name'])
+        self.assertGreaterEqual(time.perf_counter() - start, 0.45)
+        self.assertEqual(2, self.server.requests['/universe/types/34/'])
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = time.perf_counter()
+        for _ in range(6):
+            bucket.acquire()
+        self.assertGreaterEqual(time.perf_counter() - start, 0.24)
+
+    def test_plain_request(self):
+        r = self.scheduler.request(requests.Session(), 'GET', self.stub.url + '/universe/types/34/')
+        self.assertEqual(200, r.status_code)
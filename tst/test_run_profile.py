@@ -0,0 +1,98 @@
+import argparse
+import io
+import json
+import tempfile
+import threading
+import time
+from contextlib import redirect_stderr
+from pathlib import Path
+from unittest import TestCase
+
+import RunProfile
+
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+
+class TestRunProfile(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temp_dir.name) / 'Reports'
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_phase_without_profile(self):
+        with RunProfile.phase('fetch'):
+            pass
+        self.assertIsNone(RunProfile._active)
+
+    def test_phases_accumulate(self):
+        with RunProfile.RunProfile('test') as profile:
+            for _ in range(3):
+                with RunProfile.phase('fetch'):
+                    time.sleep(0.01)
+            with RunProfile.phase('output'):
+                with RunProfile.phase('valuation'):
+                    pass
+        seconds, count = profile.phases['fetch']
+        self.assertEqual(3, count)
+        self.assertGreaterEqual(seconds, 0.03)
+        self.assertEqual({'fetch', 'output', 'valuation'}, set(profile.phases))
+        self.assertGreaterEqual(profile.elapsed, seconds)
+        self.assertIsNone(RunProfile._active)
+
+    def test_phases_on_threads(self):
+        def work():
+            with RunProfile.phase('valuation'):
+                busy(1000)
+
+        with RunProfile.RunProfile('test', cpu=True) as profile:
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(4, profile.phases['valuation'][1])
+        self.assertTrue(any('(busy)' in f['function'] for f in profile.functions))
+
+    def test_memory(self):
+        with RunProfile.RunProfile('test', memory=True) as profile:
+            data = [bytes(1000) for _ in range(1000)]
+        self.assertGreater(profile.memory_peak, 1000 * 1000)
+        self.assertTrue(profile.allocations)
+        del data
+
+    def test_save_and_compare(self):
+        with RunProfile.RunProfile('test') as first:
+            with RunProfile.phase('search'):
+                pass
+        first.save(self.directory, print_report=False)
+        self.assertEqual(first.to_dict(), RunProfile.latest_profile(self.directory, 'test'))
+        self.assertIsNone(RunProfile.latest_profile(self.directory, 'other'))
+
+        with RunProfile.RunProfile('test') as second:
+            with RunProfile.phase('search'):
+                pass
+        lines = second.report(RunProfile.latest_profile(self.directory, 'test')).splitlines()
+        search = [line for line in lines if line.startswith('search')][0]
+        self.assertEqual(4, len(search.split()))  # name, seconds, count and change
+
+        saved = json.loads(first.save(self.directory, print_report=False).read_text())
+        self.assertEqual(RunProfile.PROFILE_VERSION, saved['version'])
+        self.assertEqual({'search': {'seconds': first.phases['search'][0], 'count': 1}}, saved['phases'])
+
+    def test_from_args(self):
+        parser = argparse.ArgumentParser()
+        RunProfile.RunProfile.add_argument(parser)
+        self.assertIsNone(RunProfile.RunProfile.from_args('test', parser.parse_args([])))
+        profile = RunProfile.RunProfile.from_args('test', parser.parse_args(['--profile']))
+        self.assertEqual((False, False), (profile.cpu, profile.memory))
+        profile = RunProfile.RunProfile.from_args('test', parser.parse_args(['--profile=cpu,memory']))
+        self.assertEqual((True, True), (profile.cpu, profile.memory))
+        stderr = io.StringIO()
+        with self.assertRaises(SystemExit), redirect_stderr(stderr):
+            parser.parse_args(['--profile=disk'])
+        self.assertIn('unknown profile kinds disk', stderr.getvalue())
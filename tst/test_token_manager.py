@@ -0,0 +1,125 @@
+import json
+import pickle
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import TestCase
+from urllib.parse import parse_qs
+
+from TokenManager import TokenManager, TokenRefresher, TokenData
+
+
+class StubOAuthHandler(BaseHTTPRequestHandler):
+    """ answers refresh_token grants with a new access token, counting requests on the server """
+
+    def do_POST(self):
+        body = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.request_count += 1
+            count = self.server.request_count
+        payload = json.dumps({
+            'access_token': 'access-{}-{}'.format(body['refresh_token'][0], count),
+            'refresh_token': body['refresh_token'][0],
+            'expires_in': 1200
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestTokenManager(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self.temp_dir.name)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubOAuthHandler)
+        self.server.request_count = 0
+        self.server.delay = 0.0
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.oauth_url = 'http://127.0.0.1:{}/oauth'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def token_manager(self) -> TokenManager:
+        return TokenManager(self.data_dir, oauth_url=self.oauth_url)
+
+    def test_migrates_pickle_and_persists_rows(self):
+        expiration = datetime.now() + timedelta(minutes=10)
+        with (self.data_dir / 'tokens.pickle').open('wb') as f:
+            pickle.dump({'A': TokenData('A', 1, 'refresh-a', 'access-a', expiration)}, f)
+        tm = self.token_manager()
+        self.assertEqual('access-a', tm.get_cached_access_token('A'))
+        tm.persist_token(TokenData('B', 2, 'refresh-b', 'access-b', expiration))
+
+        tm = self.token_manager()
+        self.assertEqual({'A', 'B'}, set(tm.character_tokens.keys()))
+        self.assertEqual(expiration, tm.character_tokens['B'].expiration)
+        self.assertEqual(0, self.server.request_count)
+
+    def test_expired_token_is_refreshed(self):
+        tm = self.token_manager()
+        tm.persist_token(TokenData('A', 1, 'refresh-a', 'old', datetime.now() - timedelta(minutes=1)))
+        self.assertEqual('access-refresh-a-1', tm.get_cached_access_token('A'))
+        self.assertEqual('access-refresh-a-1', tm.get_cached_access_token('A'))
+        self.assertEqual(1, self.server.request_count)
+        self.assertEqual('access-refresh-a-1', self.token_manager().character_tokens['A'].access_token)
+
+    def test_token_without_expiration_is_refreshed(self):
+        tm = self.token_manager()
+        tm.persist_token(TokenData('A', 1, 'refresh-a', 'old', None))
+        self.assertEqual('access-refresh-a-1', tm.get_cached_access_token('A'))
+        self.assertIsNotNone(tm.character_tokens['A'].expiration)
+
+    def test_refresher_refreshes_expiring_tokens_concurrently(self):
+        self.server.delay = 0.2
+        tm = self.token_manager()
+        soon = datetime.now() + timedelta(seconds=30)
+        for i in range(4):
+            tm.persist_token(TokenData('C{}'.format(i), i, 'refresh-{}'.format(i), 'old', soon))
+        tm.persist_token(TokenData('Later', 9, 'refresh-later', 'current', datetime.now() + timedelta(hours=1)))
+
+        refresher = TokenRefresher(tm, refresh_margin=timedelta(minutes=2), max_workers=4)
+        start = time.perf_counter()
+        refreshed = refresher.refresh_due()
+        elapsed = time.perf_counter() - start
+
+        self.assertCountEqual(['C0', 'C1', 'C2', 'C3'], refreshed)
+        self.assertLess(elapsed, 0.6)  # four 0.2 second requests overlapped
+        self.assertEqual(4, self.server.request_count)
+        self.assertEqual('current', tm.get_cached_access_token('Later'))
+        self.assertGreater(refresher.next_refresh_time(), datetime.now() + timedelta(minutes=15))
+
+    def test_refresher_thread(self):
+        tm = self.token_manager()
+        tm.persist_token(TokenData('A', 1, 'refresh-a', 'old', datetime.now() + timedelta(seconds=1)))
+        refresher = TokenRefresher(tm, refresh_margin=timedelta(seconds=0.5))
+        refresher.start()
+        try:
+            deadline = time.time() + 5
+            while self.server.request_count == 0 and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            refresher.stop()
+        self.assertEqual(1, self.server.request_count)
+        self.assertEqual('access-refresh-a-1', tm.get_cached_access_token('A'))
+
+    def test_refresher_context_survives_failed_refresh(self):
+        tm = TokenManager(self.data_dir, oauth_url='http://127.0.0.1:1/oauth')  # nothing listening
+        tm.persist_token(TokenData('A', 1, 'refresh-a', 'old', datetime.now() - timedelta(minutes=1)))
+        with TokenRefresher(tm, retry_delay=timedelta(seconds=0.1)) as refresher:
+            self.assertIsNotNone(refresher.thread)
+        self.assertIsNone(refresher.thread)
+        self.assertEqual('old', tm.character_tokens['A'].access_token)